@@ -0,0 +1,133 @@
+# app/batcher.py
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+class _PendingRequest:
+    """Один вызов embed, ожидающий своей доли батча"""
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+
+
+class MicroBatcher:
+    """
+    Собирает тексты из параллельных вызовов в один батч и делает один encode.
+
+    Батч закрывается, когда набралось max_batch_size текстов или
+    с момента прихода первого запроса прошло max_wait_ms.
+    Каждый вызывающий получает обратно только свои строки матрицы.
+    max_in_flight > 1 позволяет собирать следующий батч, пока предыдущие
+    ещё считаются (например, в пуле процессов инференса).
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        max_in_flight: int = 1
+    ):
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size должен быть > 0")
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0.0) / 1000.0
+        self._queue: "queue.Queue[_PendingRequest]" = queue.Queue()
+        self._carry: Optional[_PendingRequest] = None
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._in_flight = threading.Semaphore(max(max_in_flight, 1))
+        self._executor = ThreadPoolExecutor(max_in_flight, thread_name_prefix="embed-batch") if max_in_flight > 1 else None
+
+    def submit(self, texts: List[str]) -> np.ndarray:
+        """Блокирует вызывающий поток до получения эмбеддингов его текстов"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        self._ensure_worker()
+        request = _PendingRequest(list(texts))
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="embed-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _next_request(self, timeout: Optional[float]) -> Optional[_PendingRequest]:
+        if self._carry is not None:
+            request, self._carry = self._carry, None
+            return request
+        try:
+            return self._queue.get(timeout=timeout) if timeout is not None else self._queue.get()
+        except queue.Empty:
+            return None
+
+    def _collect_batch(self) -> List[_PendingRequest]:
+        first = self._next_request(timeout=None)
+        batch = [first]
+        size = len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            request = self._next_request(timeout=remaining)
+            if request is None:
+                break
+            # Запрос не влезает — оставляем его первым в следующем батче
+            if size + len(request.texts) > self.max_batch_size:
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if self._executor is None:
+                self._process(batch)
+                continue
+            self._in_flight.acquire()
+            self._executor.submit(self._process_and_release, batch)
+
+    def _process_and_release(self, batch: List[_PendingRequest]):
+        try:
+            self._process(batch)
+        finally:
+            self._in_flight.release()
+
+    def _process(self, batch: List[_PendingRequest]):
+        texts = [t for request in batch for t in request.texts]
+        try:
+            embeddings = self.encode_fn(texts)
+        except BaseException as e:
+            for request in batch:
+                request.error = e
+                request.done.set()
+            return
+
+        offset = 0
+        for request in batch:
+            n = len(request.texts)
+            request.result = embeddings[offset:offset + n]
+            offset += n
+            request.done.set()
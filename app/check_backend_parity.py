@@ -0,0 +1,92 @@
+# check_backend_parity.py
+"""
+Сверка ONNX/int8-бэкенда с эталонным PyTorch перед переключением.
+
+Запуск: python -m app.check_backend_parity --backend onnx-int8
+Первый запуск заодно экспортирует и квантует модели (артефакты в ONNX_CACHE_DIR).
+Код выхода 1 — если бэкенд не проходит пороги.
+"""
+import argparse
+import sys
+from typing import List
+
+import numpy as np
+
+from app.embedder import Embedder
+from app.inference_backends import create_rerank_backend
+from app.settings.models import *
+
+QUERIES = [
+    "как вернуть товар",
+    "способы оплаты заказа",
+    "сколько длится гарантия",
+    "доставка в другой город",
+    "как связаться с поддержкой",
+]
+
+DOCUMENTS = [
+    "Вернуть товар можно в течение 14 дней, написав в поддержку и приложив чек.",
+    "Оплата принимается картами Visa, MasterCard, а также через Apple Pay и Google Pay.",
+    "Гарантия на технику составляет 2 года с момента покупки, сохраняйте чек.",
+    "Доставка по России занимает от 2 до 7 дней в зависимости от региона.",
+    "Служба поддержки работает круглосуточно: чат на сайте, телефон и e-mail.",
+    "Возврат средств осуществляется на карту, с которой была произведена оплата.",
+    "Курьер позвонит за час до доставки и согласует удобное время.",
+    "Расширенную гарантию можно оформить при покупке за дополнительную плату.",
+]
+
+
+def rank_agreement(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """Коэффициент Спирмена между порядками по двум наборам оценок"""
+    ref_rank = np.argsort(np.argsort(-reference))
+    cand_rank = np.argsort(np.argsort(-candidate))
+    n = len(reference)
+    if n < 2:
+        return 1.0
+    d = (ref_rank - cand_rank).astype(np.float64)
+    return float(1 - 6 * np.sum(d ** 2) / (n * (n ** 2 - 1)))
+
+
+def check_embedder(backend: str, texts: List[str]) -> float:
+    reference = Embedder(batching=False, cache=False, backend="torch").embed_array(texts, "passage")
+    candidate = Embedder(batching=False, cache=False, backend=backend).embed_array(texts, "passage")
+    # Оба набора нормализованы — скалярное произведение и есть косинус
+    cosines = np.sum(reference * candidate, axis=1)
+    print(f"Эмбеддинги: cos min={cosines.min():.5f} mean={cosines.mean():.5f}")
+    return float(cosines.min())
+
+
+def check_reranker(backend: str) -> tuple:
+    reference = create_rerank_backend("torch", reranked_model)
+    candidate = create_rerank_backend(backend, reranked_model)
+    agreements, top1 = [], 0
+    for query in QUERIES:
+        pairs = [(query, doc) for doc in DOCUMENTS]
+        ref_scores = reference.predict(pairs)
+        cand_scores = candidate.predict(pairs)
+        agreements.append(rank_agreement(ref_scores, cand_scores))
+        top1 += int(np.argmax(ref_scores) == np.argmax(cand_scores))
+        print(f"  «{query}»: spearman={agreements[-1]:.3f}, max|Δscore|={np.abs(ref_scores - cand_scores).max():.4f}")
+    print(f"Reranking: spearman min={min(agreements):.3f}, top-1 совпадений {top1}/{len(QUERIES)}")
+    return min(agreements), top1 / len(QUERIES)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="onnx-int8", choices=["onnx", "onnx-int8"])
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--min-spearman", type=float, default=0.9)
+    parser.add_argument("--skip-reranker", action="store_true")
+    args = parser.parse_args()
+
+    ok = check_embedder(args.backend, QUERIES + DOCUMENTS) >= args.min_cosine
+    if not args.skip_reranker:
+        spearman, top1 = check_reranker(args.backend)
+        ok = ok and spearman >= args.min_spearman and top1 == 1.0
+
+    print("✅ Бэкенд совпадает с PyTorch" if ok else "❌ Бэкенд расходится с PyTorch")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
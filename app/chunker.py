@@ -1,77 +1,277 @@
 # app/chunker.py - ПРОСТОЙ, НАДЕЖНЫЙ и УЧИТЫВАЮЩИЙ АБЗАЦЫ
-def semantic_chunk(text, max_chunk_size=2000, overlap=200):
+import hashlib
+from typing import Iterable, Iterator, Optional, TextIO, Tuple, Union
+
+import numpy as np
+
+SENTENCE_END = '.!?;…'
+
+
+def chunk_hash(chunk_text: str) -> str:
     """
-    Чанкинг с приоритетом:
-    1. Если текст короче max_chunk_size → один чанк
-    2. Иначе — разбивка с учётом абзацев, предложений и перекрытия
+    Хеш текста чанка (chunk_hash в payload Qdrant): по нему при обновлении документа
+    находятся неизменённые чанки, и он же — ключ чанка в кэше оценок reranker.
     """
-    if not text or max_chunk_size <= 0:
-        return []
+    return hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()
 
-    text = text.strip()
-    if not text:
-        return []
 
-    text_length = len(text)
+# === Однопроходный потоковый чанкинг ===
+class _BoundaryIndex:
+    """Отсортированные позиции границ одного типа; растёт по мере чтения текста"""
+
+    def __init__(self):
+        self._data = np.empty(1024, dtype=np.int64)
+        self._first = 0
+        self._size = 0
+
+    def extend(self, positions: np.ndarray):
+        needed = self._size - self._first + len(positions)
+        if self._size + len(positions) > len(self._data):
+            # Сначала сдвигаем живые позиции в начало, при нехватке места — удваиваем
+            data = np.empty(max(len(self._data), 2 * needed), dtype=np.int64)
+            data[:self._size - self._first] = self._data[self._first:self._size]
+            self._data, self._size, self._first = data, self._size - self._first, 0
+        self._data[self._size:self._size + len(positions)] = positions
+        self._size += len(positions)
+
+    def discard_upto(self, pos: int):
+        """Позиции <= pos больше не понадобятся"""
+        live = self._data[self._first:self._size]
+        self._first += int(live.searchsorted(pos, side="right"))
+
+    def last_in(self, lo: int, hi: int) -> Optional[int]:
+        """Наибольшая позиция в (lo, hi]"""
+        live = self._data[self._first:self._size]
+        i = int(live.searchsorted(hi, side="right")) - 1
+        if i >= 0 and live[i] > lo:
+            return int(live[i])
+        return None
+
+
+_SENTENCE_CODES = np.array([ord(c) for c in SENTENCE_END], dtype=np.uint32)
+
+
+class _TextStream:
+    """
+    Текст, который читается кусками из строки, файла или итератора строк.
+    Координаты — как у text.strip(): ведущие пробелы отбрасываются,
+    длина известна после конца источника (до последнего непробельного символа).
+    """
+
+    def __init__(self, source: Union[str, TextIO, Iterable[str]], read_size: int):
+        if isinstance(source, str):
+            pieces = (source[i:i + read_size] for i in range(0, len(source), read_size))
+        elif hasattr(source, "read"):
+            pieces = iter(lambda: source.read(read_size), "")
+        else:
+            pieces = iter(source)
+        self._pieces = pieces
+        self.read_size = read_size
+        self.buffer = ""
+        self.base = 0  # позиция buffer[0] в тексте
+        self.size = 0  # прочитано символов
+        self.last_char = -1  # позиция последнего непробельного символа
+        self.eof = False
+        self.paragraphs = _BoundaryIndex()  # pos: text[pos-1:pos+1] == '\n\n'
+        self.sentences = _BoundaryIndex()  # pos: text[pos-1] — конец предложения
+        self.words = _BoundaryIndex()  # pos: text[pos-1] == ' '
+
+    def _read(self):
+        piece = next(self._pieces, None)
+        if piece is None:
+            self.eof = True
+            return
+        if self.size == 0:
+            piece = piece.lstrip()
+        if not piece:
+            return
+
+        # Все три индекса — одним векторным проходом по новому куску
+        codes = np.frombuffer(piece.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+        new_positions = np.arange(self.size + 1, self.size + len(codes) + 1, dtype=np.int64)
+        newlines = codes == 10
+        if newlines[0] and self.buffer.endswith("\n"):
+            # Пара переводов строки на стыке кусков
+            self.paragraphs.extend(np.array([self.size], dtype=np.int64))
+        self.paragraphs.extend(new_positions[:-1][newlines[1:] & newlines[:-1]])
+        sentence_ends = codes == _SENTENCE_CODES[0]
+        for code in _SENTENCE_CODES[1:]:
+            sentence_ends |= codes == code
+        self.sentences.extend(new_positions[sentence_ends])
+        self.words.extend(new_positions[codes == 32])
+
+        stripped = len(piece.rstrip())
+        if stripped:
+            self.last_char = self.size + stripped - 1
+        self.buffer += piece
+        self.size += len(piece)
+
+    def exceeds(self, pos: int) -> bool:
+        """Длина текста больше pos (дочитывает источник, сколько нужно)"""
+        while self.last_char < pos and not self.eof:
+            self._read()
+        return self.last_char >= pos
+
+    @property
+    def length(self) -> int:
+        return self.last_char + 1
+
+    def text(self, start: int, end: int) -> str:
+        return self.buffer[start - self.base:end - self.base]
+
+    def release(self, pos: int):
+        """Текст до pos и границы <= pos больше не нужны"""
+        if pos - self.base > self.read_size:
+            for index in (self.paragraphs, self.sentences, self.words):
+                index.discard_upto(pos)
+            self.buffer = self.buffer[pos - self.base:]
+            self.base = pos
+
+
+def iter_semantic_chunks(
+    source: Union[str, TextIO, Iterable[str]],
+    max_chunk_size: int = 2000,
+    overlap: int = 200,
+    read_size: int = 1 << 16
+) -> Iterator[Tuple[str, int, int]]:
+    """
+    Потоковый вариант semantic_chunk с тем же результатом (text, start, end).
+
+    Границы абзацев, предложений и слов находятся одним проходом по тексту,
+    конец чанка выбирается бинарным поиском по ним, а не посимвольно.
+    source — строка, файловый объект или итератор строк; текст читается кусками
+    по read_size и, когда окна идут только вперёд, не держится в памяти целиком.
+    """
+    if max_chunk_size <= 0:
+        return
+
+    stream = _TextStream(source, read_size)
 
     # Короткий текст → один чанк
-    if text_length <= max_chunk_size:
-        return [(text, 0, text_length)]
+    if not stream.exceeds(max_chunk_size):
+        if stream.length > 0:
+            yield stream.text(0, stream.length), 0, stream.length
+        return
 
     # Нормализуем overlap
     if overlap >= max_chunk_size:
         overlap = max_chunk_size // 4
 
-    # ... остальной код без изменений ...
-    
-    chunks = []
-    text_length = len(text)
     step = max_chunk_size - overlap
-    
     if step <= 0:
         step = max_chunk_size // 2
-    
+
+    # Окна поиска границ не уходят левее предыдущего конца — начало чанков не убывает
+    forward_only = step >= 300
     start = 0
     iteration = 0
-    max_iterations = (text_length // step) * 2
-
-    while start < text_length and iteration < max_iterations:
-        end = min(start + max_chunk_size, text_length)
-        
-        if end < text_length:
-            best_end = end
-            
-            # 1. Ищем границу абзаца в пределах окна (приоритет!)
-            for pos in range(end, max(start, end - 300), -1):
-                if pos > start and text[pos-1:pos+1] == '\n\n':
-                    best_end = pos
+
+    # Как в semantic_chunk: while start < len(text) and iteration < (len(text) // step) * 2
+    while stream.exceeds(start) and stream.exceeds((iteration // 2 + 1) * step - 1):
+        if stream.exceeds(start + max_chunk_size):
+            end = start + max_chunk_size
+            # 1. абзац, 2. конец предложения, 3. пробел — самая правая граница в окне
+            for index, window in ((stream.paragraphs, 300), (stream.sentences, 150), (stream.words, 50)):
+                pos = index.last_in(max(start, end - window), end)
+                if pos is not None:
+                    end = pos
                     break
-            else:
-                # 2. Если нет абзаца — ищем конец предложения
-                for pos in range(end, max(start, end - 150), -1):
-                    if text[pos-1] in '.!?;…':
-                        best_end = pos
-                        break
-                else:
-                    # 3. Если нет предложения — ищем пробел (слово)
-                    for pos in range(end, max(start, end - 50), -1):
-                        if text[pos-1] == ' ':
-                            best_end = pos
-                            break
-            
-            end = best_end
-        
-        chunk_text = text[start:end].strip()
+        else:
+            end = stream.length
+
+        chunk_text = stream.text(start, end).strip()
         if chunk_text:
-            chunks.append((chunk_text, start, end))
-        
+            yield chunk_text, start, end
+
         # Сдвигаем с учётом перекрытия
         start = end - overlap
         if start < 0:
             start = 0
         if start >= end:  # защита от зацикливания
             start = end + 1
-        
+
         iteration += 1
-    
-    return chunks
\ No newline at end of file
+        if forward_only:
+            stream.release(start)
+
+
+def semantic_chunk(text, max_chunk_size=2000, overlap=200):
+    """
+    Чанкинг с приоритетом:
+    1. Если текст короче max_chunk_size → один чанк
+    2. Иначе — разбивка с учётом абзацев, предложений и перекрытия
+    """
+    if not text:
+        return []
+    return list(iter_semantic_chunks(text, max_chunk_size=max_chunk_size, overlap=overlap))
+
+
+# === Чанкинг в токенах модели ===
+
+
+def _snap_end(text, offsets, start, end, max_tokens):
+    """Сдвигает конец чанка назад к границе абзаца, предложения или слова"""
+    def gap(j):
+        # Текст между токенами j-1 и j (пробелы, переводы строк)
+        return text[offsets[j - 1][1]:offsets[j][0]]
+
+    # Окна поиска — в той же пропорции, что 300/150/50 символов у semantic_chunk
+    for j in range(end, max(start, end - max_tokens // 4), -1):
+        if '\n\n' in gap(j):
+            return j
+    for j in range(end, max(start, end - max_tokens // 8), -1):
+        if offsets[j - 1][1] > 0 and text[offsets[j - 1][1] - 1] in SENTENCE_END:
+            return j
+    for j in range(end, max(start, end - max(max_tokens // 16, 8)), -1):
+        if gap(j):
+            return j
+    return end
+
+
+def _snap_start(offsets, start, end):
+    """Начало перекрытия — на начале слова, а не посреди подслова"""
+    for j in range(start, end):
+        if j == 0 or offsets[j][0] > offsets[j - 1][1]:
+            return j
+    return start
+
+
+def token_chunk(text, tokenizer, max_tokens=512, overlap=50):
+    """
+    Чанкинг по токенизатору модели: размер и перекрытие — в токенах,
+    поэтому чанк гарантированно помещается в max_seq_length и не обрезается.
+    Границы, как в semantic_chunk: абзац → предложение → слово.
+
+    Возвращает (текст, start, end, token_ids): id без спецтокенов,
+    их можно отдать в эмбеддер без повторной токенизации.
+    """
+    if not text or max_tokens <= 0:
+        return []
+
+    text = text.strip()
+    if not text:
+        return []
+
+    encoded = tokenizer(text, add_special_tokens=False, truncation=False, return_offsets_mapping=True)
+    ids, offsets = encoded["input_ids"], encoded["offset_mapping"]
+    n = len(ids)
+
+    if overlap >= max_tokens:
+        overlap = max_tokens // 4
+
+    chunks = []
+    start = 0
+    while start < n:
+        end = min(start + max_tokens, n)
+        if end < n:
+            end = _snap_end(text, offsets, start, end, max_tokens)
+
+        chunk_start, chunk_end = offsets[start][0], offsets[end - 1][1]
+        chunks.append((text[chunk_start:chunk_end], chunk_start, chunk_end, ids[start:end]))
+        if end >= n:
+            break
+
+        # Сдвигаем с учётом перекрытия; start растёт всегда — зацикливания нет
+        start = _snap_start(offsets, max(end - overlap, start + 1), end)
+
+    return chunks
@@ -0,0 +1,110 @@
+# app/components.py
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class LazyComponent:
+    """
+    Тяжёлый компонент (модель, клиент БД), который создаётся не при импорте,
+    а в фоне при старте приложения или при первом обращении.
+
+    Состояния: pending → loading → ready | failed. После ошибки следующее
+    обращение пробует загрузить компонент заново.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self.factory = factory
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._instance = None
+        self._cond = threading.Condition()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def start(self):
+        """Запускает загрузку в фоновом потоке, не дожидаясь её"""
+        if self._begin_loading():
+            threading.Thread(target=self._load, name=f"load-{self.name}", daemon=True).start()
+
+    def get(self) -> Any:
+        if self._begin_loading(retry_failed=True):
+            self._load()
+        with self._cond:
+            while self.state == "loading":
+                self._cond.wait()
+            if self.state == "failed":
+                raise RuntimeError(f"Компонент '{self.name}' недоступен: {self.error}")
+            return self._instance
+
+    def _begin_loading(self, retry_failed: bool = False) -> bool:
+        with self._cond:
+            if self.state == "pending" or (retry_failed and self.state == "failed"):
+                self.state = "loading"
+                return True
+            return False
+
+    def _load(self):
+        started = time.monotonic()
+        try:
+            instance = self.factory()
+        except Exception as e:
+            print(f"❌ Не удалось загрузить '{self.name}': {e}")
+            with self._cond:
+                self.state = "failed"
+                self.error = str(e)
+                self._cond.notify_all()
+            return
+        with self._cond:
+            self._instance = instance
+            self.state = "ready"
+            self.error = None
+            self.load_seconds = round(time.monotonic() - started, 3)
+            self._cond.notify_all()
+
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "error": self.error, "load_seconds": self.load_seconds}
+
+
+class LazyProxy:
+    """Прозрачная обёртка: обращение к любому атрибуту загружает компонент"""
+
+    __slots__ = ("_component",)
+
+    def __init__(self, component: LazyComponent):
+        object.__setattr__(self, "_component", component)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._component.get(), name)
+
+
+class ComponentRegistry:
+    def __init__(self):
+        self.components: Dict[str, LazyComponent] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]) -> LazyProxy:
+        component = LazyComponent(name, factory)
+        self.components[name] = component
+        return LazyProxy(component)
+
+    def start_all(self):
+        """Параллельная фоновая загрузка всех компонентов (прогрев)"""
+        for component in self.components.values():
+            component.start()
+
+    def is_ready(self, name: str) -> bool:
+        return self.components[name].ready
+
+    def status(self) -> Dict[str, Any]:
+        states = {name: c.status() for name, c in self.components.items()}
+        if all(c.ready for c in self.components.values()):
+            overall = "ready"
+        elif any(c.state == "failed" for c in self.components.values()):
+            overall = "failed"
+        else:
+            overall = "loading"
+        return {"status": overall, "components": states}
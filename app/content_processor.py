@@ -130,18 +130,37 @@
 
 from app.postgres_processor import PostgresProcessor
 from app.embedder import Embedder
-from typing import List, Dict, Any, Optional, Literal
-from app.chunker import semantic_chunk
+from typing import List, Dict, Any, Optional, Literal, Tuple, Iterable, Iterator, Union
+from app.chunker import chunk_hash, semantic_chunk, iter_semantic_chunks, token_chunk
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import multiprocessing
+import threading
+import time
 import uuid
 import hashlib
 from app.qdrant_manager import QdrantManager
 from app.cluster_utils import cosine_similarity
+from app.sparse_encoder import SparseEncoder
+from app.search_cache import SearchResultCache
+from app.settings.ingest_settings import *
 
 
 class ContentProcessor:
-    def __init__(self, embedder: Embedder, postgres_processor: Optional[PostgresProcessor] = None):
+    def __init__(self, embedder: Embedder, postgres_processor: Optional[PostgresProcessor] = None,
+                 sparse_encoder: Optional[SparseEncoder] = None,
+                 search_cache: Optional[SearchResultCache] = None):
         self.embedder = embedder
         self.postgres_processor = postgres_processor
+        # Без sparse_encoder чанки сохраняются только с dense-вектором
+        self.sparse_encoder = sparse_encoder
+        # После записи кэшированные результаты поиска пользователя устаревают
+        self.search_cache = search_cache
+        self._chunk_pool: Optional[ProcessPoolExecutor] = None
+        self._chunk_pool_lock = threading.Lock()
+
+    def _sparse_vector(self, chunk_text: str) -> Optional[Dict[str, list]]:
+        return self.sparse_encoder.encode_document(chunk_text) if self.sparse_encoder is not None else None
 
     def generate_content_id(self, **kwargs) -> int:
         """
@@ -152,6 +171,44 @@ class ContentProcessor:
         content_id = int(unique_id.int % (10 ** 16))
         return content_id
 
+    def chunk(
+        self,
+        text: str,
+        chunk_size: int,
+        overlap: int,
+        chunk_unit: Literal["chars", "tokens"] = "chars",
+        emb_type: str = "passage"
+    ) -> Tuple[List[Tuple[str, int, int]], Optional[List[List[int]]]]:
+        """
+        Чанки (текст, start, end) и, для chunk_unit="tokens", их token_ids.
+        В токенах chunk_size ограничен тем, что модель примет вместе с префиксом.
+        """
+        if chunk_unit == "tokens":
+            chunks = list(self.iter_chunks(text, chunk_size, overlap, chunk_unit, emb_type))
+            return [c[:3] for c in chunks], [c[3] for c in chunks]
+        return semantic_chunk(text, max_chunk_size=chunk_size, overlap=overlap), None
+
+    def iter_chunks(
+        self,
+        source: Union[str, Iterable[str]],
+        chunk_size: int,
+        overlap: int,
+        chunk_unit: Literal["chars", "tokens"] = "chars",
+        emb_type: str = "passage"
+    ) -> Iterator[Tuple[str, int, int, Optional[List[int]]]]:
+        """
+        Чанки (текст, start, end, token_ids или None) по мере чтения source —
+        строки, файла или итератора строк. Токенизатору нужен весь текст,
+        поэтому в режиме tokens источник сначала читается целиком.
+        """
+        if chunk_unit == "tokens":
+            text = source if isinstance(source, str) else "".join(source)
+            max_tokens = min(chunk_size, self.embedder.max_chunk_tokens(emb_type))
+            yield from token_chunk(text, self.embedder.tokenizer, max_tokens=max_tokens, overlap=overlap)
+            return
+        for chunk_text, start, end in iter_semantic_chunks(source, max_chunk_size=chunk_size, overlap=overlap):
+            yield chunk_text, start, end, None
+
     def process_and_save(
         self,
         text: str,
@@ -159,6 +216,7 @@ class ContentProcessor:
         chunk_size: int = 2000,
         overlap: int = 200,
         emb_type: str = "passage",
+        chunk_unit: Literal["chars", "tokens"] = "chars",
         **kwargs
     ) -> Dict[str, Any]:
         clean_text = text.strip()
@@ -202,38 +260,24 @@ class ContentProcessor:
                 raise RuntimeError("Не удалось сохранить документ в PostgreSQL")
 
         # Чанкинг и эмбеддинги
-        chunk_tuples = semantic_chunk(clean_text, max_chunk_size=chunk_size, overlap=overlap)
+        chunk_tuples, token_ids = self.chunk(clean_text, chunk_size, overlap, chunk_unit, emb_type)
         chunks_texts = [c[0] for c in chunk_tuples]
-        embeddings = self.embedder.embed(chunks_texts, emb_type=emb_type)
+        embeddings = self.embedder.embed(chunks_texts, emb_type=emb_type, token_ids=token_ids)
 
         # Присвоение кластеров (если есть)
-        cluster_labels = [None] * len(embeddings)
-        cluster_descriptions = {}
-        if self.postgres_processor:
-            centroids = self.postgres_processor.get_cluster_centroids(user_id)
-            if centroids:
-                for i, vec in enumerate(embeddings):
-                    best_label = None
-                    best_sim = 0.3
-                    for label, data in centroids.items():
-                        sim = cosine_similarity(vec, data["centroid"])
-                        if sim > best_sim:
-                            best_sim = sim
-                            best_label = label
-                    cluster_labels[i] = best_label
-                    if best_label:
-                        cluster_descriptions[best_label] = data["description"]
+        cluster_labels, cluster_descriptions = self._assign_clusters(user_id, embeddings)
 
         # Подготовка данных для Qdrant
         chunks_for_qdrant = []
         for i, ((chunk_text, start, end), vector) in enumerate(zip(chunk_tuples, embeddings)):
             payload = {
                 "dense_vector": vector,
-                "sparse_vector": None,
+                "sparse_vector": self._sparse_vector(chunk_text),
                 "content_id": content_id,
                 "chunk_id": str(uuid.uuid4()),
                 "chunk_order": i,
                 "chunk_text": chunk_text,
+                "chunk_hash": chunk_hash(chunk_text),
                 "chunk_start": start,
                 "chunk_end": end,
                 "user_id": user_id,
@@ -248,6 +292,8 @@ class ContentProcessor:
             chunks_for_qdrant.append(payload)
 
         point_ids = qdrant_manager.save_chunks(chunks_for_qdrant)
+        if self.search_cache is not None:
+            self.search_cache.bump(user_id)
 
         return {
             "content_id": content_id,
@@ -257,4 +303,331 @@ class ContentProcessor:
             "user_id": user_id,
             "url": url,
             "header": header
-        }
\ No newline at end of file
+        }
+
+    def _chunk_executor(self) -> ProcessPoolExecutor:
+        with self._chunk_pool_lock:
+            if self._chunk_pool is None:
+                # spawn: воркеры импортируют только app.chunker, без моделей процесса
+                self._chunk_pool = ProcessPoolExecutor(max_workers=ingest_chunk_workers,
+                                                       mp_context=multiprocessing.get_context("spawn"))
+            return self._chunk_pool
+
+    def close(self):
+        """Останавливает процессы чанкинга пакетов (при завершении приложения)"""
+        with self._chunk_pool_lock:
+            pool, self._chunk_pool = self._chunk_pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def chunk_many(
+        self,
+        texts: List[str],
+        chunk_size: int,
+        overlap: int,
+        chunk_unit: Literal["chars", "tokens"] = "chars",
+        emb_type: str = "passage"
+    ) -> List[Tuple[List[Tuple[str, int, int]], Optional[List[List[int]]]]]:
+        """chunk() для пакета текстов; большой пакет в символах режется в процессах"""
+        parallel = (chunk_unit == "chars" and ingest_chunk_workers > 1 and len(texts) > 1
+                    and sum(len(text) for text in texts) >= ingest_parallel_chunk_min_chars)
+        if not parallel:
+            return [self.chunk(text, chunk_size, overlap, chunk_unit, emb_type) for text in texts]
+        chunked = self._chunk_executor().map(partial(semantic_chunk, max_chunk_size=chunk_size, overlap=overlap),
+                                             texts, chunksize=max(1, len(texts) // (ingest_chunk_workers * 4)))
+        return [(chunks, None) for chunks in chunked]
+
+    def process_and_save_batch(
+        self,
+        documents: List[Dict[str, Any]],
+        qdrant_manager: QdrantManager,
+        chunk_size: int = 2000,
+        overlap: int = 200,
+        emb_type: str = "passage",
+        chunk_unit: Literal["chars", "tokens"] = "chars"
+    ) -> Dict[str, Any]:
+        """
+        Пакетная версия process_and_save: documents — словари с text, user_id, url, header.
+
+        Дубликаты ищутся одним запросом (и внутри пакета), новые документы режутся
+        на чанки, все чанки эмбеддятся общими батчами, документы пишутся в PostgreSQL
+        одним COPY, точки — пачками в Qdrant. Результаты — в порядке documents,
+        в формате process_and_save, плюс счётчики и пропускная способность.
+        """
+        started = time.perf_counter()
+        timings = {}
+        results: List[Optional[Dict[str, Any]]] = [None] * len(documents)
+        prepared = []
+        for doc in documents:
+            clean_text = doc["text"].strip()
+            prepared.append({
+                "text": clean_text,
+                "user_id": doc.get("user_id", 0),
+                "url": doc.get("url", ""),
+                "header": doc.get("header", ""),
+                "content_hash": hashlib.sha256(clean_text.encode("utf-8")).hexdigest()
+            })
+
+        # Дубликаты: уже сохранённые и повторы внутри пакета
+        existing = {}
+        if self.postgres_processor:
+            existing = self.postgres_processor.get_content_ids_by_hashes(
+                list({(doc["user_id"], doc["content_hash"]) for doc in prepared})
+            )
+        new_docs = []
+        for i, doc in enumerate(prepared):
+            key = (doc["user_id"], doc["content_hash"])
+            if not doc["text"]:
+                results[i] = {"status": "error", "error": "Пустой текст", "saved_chunks": 0,
+                              "user_id": doc["user_id"], "url": doc["url"], "header": doc["header"]}
+                continue
+            if key in existing:
+                results[i] = {"content_id": existing[key], "saved_chunks": 0, "status": "duplicates",
+                              "user_id": doc["user_id"], "url": doc["url"], "header": doc["header"]}
+                continue
+            doc["content_id"] = self.generate_content_id()
+            doc["document_id"] = hashlib.sha256(
+                f"{doc['user_id']}_{doc['content_hash']}_{doc['header']}_{doc['url']}".encode()
+            ).hexdigest()[:16]
+            existing[key] = doc["content_id"]
+            doc["index"] = i
+            new_docs.append(doc)
+        timings["dedupe_s"] = time.perf_counter() - started
+
+        # Чанкинг и эмбеддинги всех чанков пакета одним вызовом: общие батчи модели
+        stage = time.perf_counter()
+        chunked = self.chunk_many([doc["text"] for doc in new_docs], chunk_size, overlap, chunk_unit, emb_type)
+        timings["chunk_s"] = time.perf_counter() - stage
+        stage = time.perf_counter()
+        texts = [chunk[0] for chunk_tuples, _ in chunked for chunk in chunk_tuples]
+        token_ids = None
+        if chunk_unit == "tokens":
+            token_ids = [ids for _, doc_token_ids in chunked for ids in doc_token_ids]
+        embeddings = self.embedder.embed(texts, emb_type=emb_type, token_ids=token_ids) if texts else []
+        timings["embed_s"] = time.perf_counter() - stage
+
+        # Кластеры — по пользователю: центроиды читаются один раз на пользователя
+        stage = time.perf_counter()
+        offsets, position = [], 0
+        for chunk_tuples, _ in chunked:
+            offsets.append(position)
+            position += len(chunk_tuples)
+        labels: List[Optional[str]] = [None] * len(texts)
+        descriptions: Dict[int, Dict[str, str]] = {}
+        by_user: Dict[int, List[int]] = {}
+        for doc, (chunk_tuples, _), offset in zip(new_docs, chunked, offsets):
+            by_user.setdefault(doc["user_id"], []).extend(range(offset, offset + len(chunk_tuples)))
+        for user_id, positions in by_user.items():
+            user_labels, descriptions[user_id] = self._assign_clusters(user_id, [embeddings[j] for j in positions])
+            for j, label in zip(positions, user_labels):
+                labels[j] = label
+
+        # Сначала PostgreSQL, как в process_and_save: точки без документа поиск не покажет
+        if self.postgres_processor and new_docs:
+            saved_in_pg = self.postgres_processor.save_documents([
+                {
+                    "content_id": doc["content_id"],
+                    "user_id": doc["user_id"],
+                    "content_text": doc["text"],
+                    "content_hash": doc["content_hash"],
+                    "url": doc["url"],
+                    "header": doc["header"],
+                    "document_id": doc["document_id"]
+                }
+                for doc in new_docs
+            ])
+            if not saved_in_pg:
+                raise RuntimeError("Не удалось сохранить документы в PostgreSQL")
+        timings["postgres_s"] = time.perf_counter() - stage
+
+        stage = time.perf_counter()
+        chunks_for_qdrant = []
+        for doc, (chunk_tuples, _), offset in zip(new_docs, chunked, offsets):
+            for order, (chunk_text, start, end) in enumerate(chunk_tuples):
+                label = labels[offset + order]
+                chunks_for_qdrant.append({
+                    "dense_vector": embeddings[offset + order],
+                    "sparse_vector": self._sparse_vector(chunk_text),
+                    "content_id": doc["content_id"],
+                    "chunk_id": str(uuid.uuid4()),
+                    "chunk_order": order,
+                    "chunk_text": chunk_text,
+                    "chunk_hash": chunk_hash(chunk_text),
+                    "chunk_start": start,
+                    "chunk_end": end,
+                    "user_id": doc["user_id"],
+                    "url": doc["url"],
+                    "header": doc["header"],
+                    "content_hash": doc["content_hash"],
+                    "cluster_label": label,
+                    "cluster_description": descriptions[doc["user_id"]].get(label, ""),
+                    "document_id": doc["document_id"]
+                })
+        if chunks_for_qdrant:
+            qdrant_manager.save_chunks(chunks_for_qdrant)
+        timings["qdrant_s"] = time.perf_counter() - stage
+        if self.search_cache is not None:
+            for user_id in by_user:
+                self.search_cache.bump(user_id)
+
+        for doc, (chunk_tuples, _) in zip(new_docs, chunked):
+            results[doc["index"]] = {
+                "content_id": doc["content_id"],
+                "document_id": doc["document_id"],
+                "saved_chunks": len(chunk_tuples),
+                "status": "created",
+                "user_id": doc["user_id"],
+                "url": doc["url"],
+                "header": doc["header"]
+            }
+        seconds = time.perf_counter() - started
+        return {
+            "results": results,
+            "stats": {
+                "documents": len(documents),
+                "created": len(new_docs),
+                "duplicates": sum(1 for r in results if r["status"] == "duplicates"),
+                "chunks": len(chunks_for_qdrant),
+                "seconds": round(seconds, 3),
+                "docs_per_s": round(len(documents) / seconds, 1) if seconds else 0.0,
+                "chunks_per_s": round(len(chunks_for_qdrant) / seconds, 1) if seconds else 0.0,
+                **{name: round(value, 3) for name, value in timings.items()}
+            }
+        }
+
+    def _assign_clusters(self, user_id: int, embeddings: List[List[float]]) -> Tuple[List[Optional[str]], Dict[str, str]]:
+        """Ближайший кластер пользователя для каждого вектора (порог схожести 0.3)"""
+        cluster_labels = [None] * len(embeddings)
+        cluster_descriptions = {}
+        if self.postgres_processor:
+            centroids = self.postgres_processor.get_cluster_centroids(user_id)
+            if centroids:
+                for i, vec in enumerate(embeddings):
+                    best_label = None
+                    best_sim = 0.3
+                    for label, data in centroids.items():
+                        sim = cosine_similarity(vec, data["centroid"])
+                        if sim > best_sim:
+                            best_sim = sim
+                            best_label = label
+                    cluster_labels[i] = best_label
+                    if best_label:
+                        cluster_descriptions[best_label] = data["description"]
+        return cluster_labels, cluster_descriptions
+
+    def update_document(
+        self,
+        content_id: int,
+        text: str,
+        qdrant_manager: QdrantManager,
+        chunk_size: int = 2000,
+        overlap: int = 200,
+        emb_type: str = "passage",
+        chunk_unit: Literal["chars", "tokens"] = "chars",
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Обновляет документ на месте (content_id сохраняется).
+
+        Новый текст режется на чанки и сравнивается по хешам с точками в Qdrant:
+        неизменённые чанки остаются теми же точками с теми же векторами (меняется
+        только payload), эмбеддятся лишь новые, лишние точки удаляются одним запросом.
+        """
+        clean_text = text.strip()
+        user_id = kwargs.get("user_id", 0)
+        header = kwargs.get("header", "")
+        url = kwargs.get("url", "")
+        content_hash = hashlib.sha256(clean_text.encode("utf-8")).hexdigest()
+        document_id = hashlib.sha256(f"{user_id}_{content_hash}_{header}_{url}".encode()).hexdigest()[:16]
+        result = {"content_id": content_id, "user_id": user_id, "url": url, "header": header}
+
+        existing = qdrant_manager.get_document_chunks(content_id, user_id)
+        if not existing and not (self.postgres_processor and self.postgres_processor.get_documents_by_content_ids([content_id], user_id)):
+            return {**result, "status": "not_found"}
+
+        # Точки по хешу текста; у старых точек без chunk_hash считаем его по chunk_text
+        reusable: Dict[str, List[Dict[str, Any]]] = {}
+        for point in sorted(existing, key=lambda p: p["payload"].get("chunk_order", 0)):
+            payload = point["payload"]
+            reusable.setdefault(payload.get("chunk_hash") or chunk_hash(payload.get("chunk_text", "")), []).append(point)
+
+        chunk_tuples, token_ids = self.chunk(clean_text, chunk_size, overlap, chunk_unit, emb_type)
+        common = {
+            "content_id": content_id,
+            "user_id": user_id,
+            "url": url,
+            "header": header,
+            "content_hash": content_hash,
+            "document_id": document_id
+        }
+
+        payload_updates: Dict[str, Dict[str, Any]] = {}
+        new_positions = []
+        for i, (chunk_text, start, end) in enumerate(chunk_tuples):
+            candidates = reusable.get(chunk_hash(chunk_text))
+            if not candidates:
+                new_positions.append(i)
+                continue
+            point = candidates.pop(0)
+            changes = {"chunk_order": i, "chunk_start": start, "chunk_end": end, **common}
+            changes = {k: v for k, v in changes.items() if point["payload"].get(k) != v}
+            if changes:
+                payload_updates[point["id"]] = changes
+        stale_ids = [point["id"] for points in reusable.values() for point in points]
+
+        # Эмбеддинги только для новых и изменённых чанков
+        new_texts = [chunk_tuples[i][0] for i in new_positions]
+        embeddings = self.embedder.embed(
+            new_texts,
+            emb_type=emb_type,
+            token_ids=[token_ids[i] for i in new_positions] if token_ids is not None else None
+        ) if new_texts else []
+        cluster_labels, cluster_descriptions = self._assign_clusters(user_id, embeddings)
+
+        chunks_for_qdrant = []
+        for i, vector, label in zip(new_positions, embeddings, cluster_labels):
+            chunk_text, start, end = chunk_tuples[i]
+            chunks_for_qdrant.append({
+                "dense_vector": vector,
+                "sparse_vector": self._sparse_vector(chunk_text),
+                "chunk_id": str(uuid.uuid4()),
+                "chunk_order": i,
+                "chunk_text": chunk_text,
+                "chunk_hash": chunk_hash(chunk_text),
+                "chunk_start": start,
+                "chunk_end": end,
+                "cluster_label": label,
+                "cluster_description": cluster_descriptions.get(label, ""),
+                **common
+            })
+
+        # Сначала новые точки, потом удаление старых: документ не пропадает из поиска
+        if chunks_for_qdrant:
+            qdrant_manager.save_chunks(chunks_for_qdrant)
+        qdrant_manager.set_chunk_payloads(payload_updates)
+        qdrant_manager.delete_points(stale_ids)
+
+        if self.postgres_processor:
+            updated = self.postgres_processor.update_document(
+                content_id=content_id,
+                user_id=user_id,
+                content_text=clean_text,
+                content_hash=content_hash,
+                url=url,
+                header=header,
+                document_id=document_id
+            )
+            if not updated:
+                raise RuntimeError("Не удалось обновить документ в PostgreSQL")
+        if self.search_cache is not None:
+            self.search_cache.bump(user_id)
+
+        return {
+            **result,
+            "document_id": document_id,
+            "status": "updated",
+            "total_chunks": len(chunk_tuples),
+            "reused_chunks": len(chunk_tuples) - len(new_positions),
+            "embedded_chunks": len(new_positions),
+            "deleted_chunks": len(stale_ids)
+        }
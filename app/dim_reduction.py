@@ -0,0 +1,131 @@
+# app/dim_reduction.py
+"""
+Уменьшение размерности эмбеддингов перед сохранением в Qdrant.
+
+- truncate: первые dim координат + повторная нормализация (Matryoshka-обрезка);
+- pca: проекция на главные компоненты, обученные на корпусе и сохранённые в .npz.
+
+Обучение PCA:
+    python -m app.dim_reduction --dim 128 --input corpus.txt --out pca_128.npz
+    python -m app.dim_reduction --dim 128 --from-qdrant --out pca_128.npz
+"""
+import argparse
+from typing import List, Optional
+
+import numpy as np
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return (x / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+class TruncationReducer:
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        return _normalize(np.asarray(vectors, dtype=np.float32)[:, :self.dim])
+
+
+class PCAProjection:
+    def __init__(self, mean: np.ndarray, components: np.ndarray):
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)  # (dim, исходная размерность)
+        self.dim = components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dim: int) -> "PCAProjection":
+        vectors = np.asarray(vectors, dtype=np.float64)
+        if dim > min(vectors.shape):
+            raise ValueError(f"Для PCA на {dim} компонент нужно не меньше {dim} векторов")
+        mean = vectors.mean(axis=0)
+        # SVD центрированных данных: строки vt — главные направления
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:dim])
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        return _normalize((np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T)
+
+    def save(self, path: str):
+        np.savez(path, mean=self.mean, components=self.components)
+
+    @classmethod
+    def load(cls, path: str) -> "PCAProjection":
+        data = np.load(path)
+        return cls(data["mean"], data["components"])
+
+
+def output_dim(dim: int, native_dim: int) -> int:
+    """Размерность векторов после create_reducer: dim не задан или не меньше исходной — исходная"""
+    return dim if 0 < dim < native_dim else native_dim
+
+
+def create_reducer(mode: str, dim: int, native_dim: int, pca_path: str = ""):
+    """None — если уменьшать не нужно (dim не задан или не меньше исходного)"""
+    if output_dim(dim, native_dim) == native_dim:
+        return None
+    if mode == "truncate":
+        return TruncationReducer(dim)
+    elif mode == "pca":
+        if not pca_path:
+            raise ValueError("Для EMBEDDING_REDUCTION=pca нужен EMBEDDING_PCA_PATH")
+        projection = PCAProjection.load(pca_path)
+        if projection.dim != dim:
+            raise ValueError(f"PCA в {pca_path} обучена на {projection.dim} компонент, а EMBEDDING_DIM={dim}")
+        return projection
+    else:
+        raise ValueError(f"Неизвестный режим уменьшения размерности: {mode}")
+
+
+def load_corpus_vectors(input_path: Optional[str], from_qdrant: bool, user_id: Optional[int], limit: int) -> np.ndarray:
+    """Векторы исходной размерности: из файла текстов (по строке) или из коллекции Qdrant"""
+    if from_qdrant:
+        from qdrant_client.models import Filter, FieldCondition, MatchValue
+        from app.qdrant_manager import QdrantManager
+        from app.settings.db_credentials import qdrant_host, qdrant_port
+        manager = QdrantManager(host=qdrant_host, port=qdrant_port)
+        scroll_filter = Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))]) if user_id is not None else None
+        vectors: List[List[float]] = []
+        offset = None
+        while len(vectors) < limit:
+            points, offset = manager.client.scroll(
+                collection_name=manager.collection_name,
+                scroll_filter=scroll_filter,
+                with_vectors=["dense"],
+                with_payload=False,
+                limit=min(1000, limit - len(vectors)),
+                offset=offset
+            )
+            vectors.extend(p.vector["dense"] for p in points)
+            if offset is None:
+                break
+        return np.asarray(vectors, dtype=np.float32)
+
+    from app.embedder import Embedder
+    with open(input_path, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()][:limit]
+    # Без уменьшения: обучаем на векторах исходной размерности
+    return Embedder(batching=False, cache=False, output_dim=0).embed_array(texts, "passage")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обучение PCA-проекции эмбеддингов")
+    parser.add_argument("--dim", type=int, required=True)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--input", help="файл с текстами корпуса, по одному на строку")
+    parser.add_argument("--from-qdrant", action="store_true", help="взять векторы из коллекции")
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--limit", type=int, default=100000)
+    args = parser.parse_args()
+    if not args.input and not args.from_qdrant:
+        parser.error("нужен --input или --from-qdrant")
+
+    vectors = load_corpus_vectors(args.input, args.from_qdrant, args.user_id, args.limit)
+    projection = PCAProjection.fit(vectors, args.dim)
+    projection.save(args.out)
+    print(f"✅ PCA {vectors.shape[1]} → {args.dim} обучена на {len(vectors)} векторах: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
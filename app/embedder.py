@@ -1,17 +1,155 @@
-from sentence_transformers import SentenceTransformer
-from typing import List, Literal
+import functools
+from typing import List, Literal, Optional, Union
+import numpy as np
 from app.settings.models import *
+from app.settings.embedder_settings import *
+from app.settings.backend_settings import embedder_backend
+from app.inference_backends import create_embedding_backend
+from app.batcher import MicroBatcher
+from app.embedding_cache import EmbeddingCache
+from app.token_batching import plan_token_batches
+from app import dim_reduction
+from app.dim_reduction import create_reducer
+from app.executors import cpu_executor
+
+@functools.lru_cache(maxsize=None)
+def configured_dim(model_name: str = transformer_model_name, dim: int = embedding_dim) -> int:
+    """
+    Размерность эмбеддингов по конфигу модели, без загрузки весов: коллекция Qdrant
+    создаётся с ней, не дожидаясь эмбеддера. Совпадение с Embedder.dim проверяется при его загрузке.
+    """
+    from transformers import AutoConfig
+    return dim_reduction.output_dim(dim, AutoConfig.from_pretrained(model_name).hidden_size)
+
 
 class Embedder:
-    def __init__(self, model_name: str = transformer_model_name):
-        print("🔍 Загружаем модель эмбеддингов...")
-        self.model = SentenceTransformer(model_name, device="cpu")
+    def __init__(self, model_name: str = transformer_model_name, batching: bool = embed_batching_enabled,
+                 cache: bool = embed_cache_enabled, backend: str = embedder_backend,
+                 output_dim: int = embedding_dim):
+        print(f"🔍 Загружаем модель эмбеддингов (бэкенд {backend})...")
+        self.backend = create_embedding_backend(backend, model_name)
+        self.tokenizer = self.backend.tokenizer
+        self.max_seq_length = self.backend.max_seq_length
+        self.native_dim = self.backend.dim
+        if output_dim > self.native_dim:
+            print(f"⚠️ EMBEDDING_DIM={output_dim} больше размерности модели {self.native_dim}: векторы не уменьшаются")
+        # Уменьшение размерности применяется после кэша: в кэше — полные векторы
+        self.reducer = create_reducer(embedding_reduction, output_dim, self.native_dim, embedding_pca_path)
+        self.dim = self.reducer.dim if self.reducer is not None else self.native_dim
         print("✅ Модель загружена.")
+        # Общий батчер для всех вызывающих: один encode на несколько запросов
+        self.batcher = MicroBatcher(
+            self._encode_on_cpu,
+            max_batch_size=embed_max_batch_size,
+            max_wait_ms=embed_max_wait_ms,
+            max_in_flight=self.backend.parallelism
+        ) if batching else None
+        # Бэкенд входит в ключ: int8-векторы не должны смешиваться с fp32
+        self.cache = EmbeddingCache(
+            f"{model_name}@{backend}",
+            max_entries=embed_cache_max_entries,
+            disk_path=embed_cache_disk_path,
+            disk_capacity=embed_cache_disk_capacity
+        ) if cache else None
+        self._prefix_ids = {}
+
+    def prefix_ids(self, prefix: str) -> List[int]:
+        if prefix not in self._prefix_ids:
+            # Без завершающего пробела: он приклеивается к первому токену текста
+            self._prefix_ids[prefix] = self.tokenizer(prefix.rstrip(), add_special_tokens=False)["input_ids"]
+        return self._prefix_ids[prefix]
+
+    def max_chunk_tokens(self, emb_type: Literal["query", "passage"] = "passage") -> int:
+        """Сколько токенов текста помещается во вход модели вместе с префиксом и спецтокенами"""
+        prefix = "query: " if emb_type == "query" else "passage: "
+        return self.max_seq_length - len(self.prefix_ids(prefix)) - self.tokenizer.num_special_tokens_to_add()
+
+    def _tokenize(self, prefixed: List[str]) -> List[List[int]]:
+        # Как и SentenceTransformer.tokenize: strip + обрезка по max_seq_length
+        return self.tokenizer(
+            [t.strip() for t in prefixed],
+            truncation=True,
+            max_length=self.max_seq_length
+        )["input_ids"]
+
+    def _encode_ids(self, input_ids: List[List[int]]) -> np.ndarray:
+        """Прогоняет уже токенизированные входы батчами, собранными по длине"""
+        result = np.zeros((len(input_ids), self.native_dim), dtype=np.float32)
+        batches = plan_token_batches(
+            [len(ids) for ids in input_ids],
+            max_batch_tokens=embed_max_batch_tokens,
+            max_batch_size=embed_encode_batch_size
+        )
+        futures = []
+        for batch in batches:
+            features = self.tokenizer.pad(
+                {"input_ids": [input_ids[i] for i in batch]},
+                padding=True,
+                return_tensors="np"
+            )
+            # Бэкенд нормализует — обязательно для семантического поиска (cosine similarity = dot)
+            futures.append(self.backend.submit_padded(features["input_ids"], features["attention_mask"]))
+        # Возвращаем строки на исходные позиции
+        for batch, future in zip(batches, futures):
+            result[batch] = future.result()
+        return result
 
-    def embed(self, texts: List[str], emb_type: Literal["query", "passage"] = "query") -> List[List[float]]:
-        # Добавляем префикс согласно рекомендациям E5
+    def _encode(self, items: List[Union[str, List[int]]]) -> np.ndarray:
+        # Строки токенизируем; готовые id (из token_chunk) уходят в модель как есть
+        input_ids = list(items)
+        text_positions = [i for i, item in enumerate(items) if isinstance(item, str)]
+        if text_positions:
+            for i, ids in zip(text_positions, self._tokenize([items[i] for i in text_positions])):
+                input_ids[i] = ids
+        return self._encode_ids(input_ids)
+
+    def _encode_on_cpu(self, items: List[Union[str, List[int]]]) -> np.ndarray:
+        # Прогон модели — в общем ограниченном пуле вместе с reranker
+        return cpu_executor.call(self._encode, items)
+
+    def _compute(self, items: List[Union[str, List[int]]]) -> np.ndarray:
+        if self.batcher is not None:
+            return self.batcher.submit(items)
+        return self._encode_on_cpu(items)
+
+    def embed_array(self, texts: List[str], emb_type: Literal["query", "passage"] = "query",
+                    token_ids: Optional[List[List[int]]] = None) -> np.ndarray:
+        """token_ids — id текстов без спецтокенов (token_chunk), чтобы не токенизировать повторно"""
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        vectors = self._embed_full(texts, emb_type, token_ids)
+        return self.reducer.transform(vectors) if self.reducer is not None else vectors
+
+    def _embed_full(self, texts: List[str], emb_type: Literal["query", "passage"],
+                    token_ids: Optional[List[List[int]]] = None) -> np.ndarray:
+        # Добавляем префикс согласно рекомендациям E5 — до батчинга,
+        # чтобы в общем батче у каждого вызывающего был свой префикс
         prefix = "query: " if emb_type == "query" else "passage: "
-        prefixed = [prefix + t for t in texts]
-        # Нормализуем — обязательно для семантического поиска (cosine similarity = dot)
-        embeddings = self.model.encode(prefixed, normalize_embeddings=True, show_progress_bar=False)
-        return embeddings.tolist()  # JSON-сериализуемый список списков
\ No newline at end of file
+        if token_ids is not None:
+            prefix_ids = self.prefix_ids(prefix)
+            items = [self.tokenizer.build_inputs_with_special_tokens(prefix_ids + list(ids)) for ids in token_ids]
+        else:
+            items = [prefix + t for t in texts]
+        if self.cache is None:
+            return self._compute(items)
+
+        keys = [self.cache.key(prefix, t) for t in texts]
+        cached = self.cache.get_many(keys)
+
+        # В модель уходят только промахи, повторы внутри батча — один раз
+        miss_positions = {}
+        for i, (key, vector) in enumerate(zip(keys, cached)):
+            if vector is None:
+                miss_positions.setdefault(key, []).append(i)
+        if miss_positions:
+            miss_keys = list(miss_positions)
+            computed = self._compute([items[miss_positions[k][0]] for k in miss_keys])
+            self.cache.put_many(miss_keys, computed)
+            for key, vector in zip(miss_keys, computed):
+                for i in miss_positions[key]:
+                    cached[i] = vector
+        return np.stack(cached).astype(np.float32, copy=False)
+
+    def embed(self, texts: List[str], emb_type: Literal["query", "passage"] = "query",
+              token_ids: Optional[List[List[int]]] = None) -> List[List[float]]:
+        return self.embed_array(texts, emb_type, token_ids).tolist()  # JSON-сериализуемый список списков
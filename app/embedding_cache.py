@@ -0,0 +1,206 @@
+# app/embedding_cache.py
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.lru_cache import LRUCache
+
+
+def embedding_cache_key(model_name: str, prefix: str, text: str) -> str:
+    """Ключ кэша: (модель, префикс query/passage, хеш текста)"""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model_name}\x00{prefix}\x00{text_hash}".encode("utf-8")).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    Дисковый уровень кэша: кольцевой буфер векторов в memory-mapped файле.
+
+    vectors.f32 — матрица (capacity, dim) float32, keys.log — журнал "ключ строка",
+    по которому индекс восстанавливается после рестарта.
+    """
+
+    def __init__(self, path: str, capacity: int = 1_000_000):
+        if capacity <= 0:
+            raise ValueError("capacity должен быть > 0")
+        self.path = path
+        self.capacity = capacity
+        self.dim: Optional[int] = None
+        self.evictions = 0
+        self._index: Dict[str, int] = {}
+        self._row_keys: Dict[int, str] = {}
+        self._next_row = 0
+        self._log_lines = 0
+        self._vectors: Optional[np.memmap] = None
+        self._log = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.path, "keys.log")
+
+    def _load(self):
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+        if meta.get("capacity") != self.capacity or not os.path.exists(self._vectors_path):
+            print("⚠️ Параметры дискового кэша эмбеддингов изменились — кэш сброшен")
+            self._reset()
+            return
+        self._open(int(meta["dim"]), mode="r+")
+        if os.path.exists(self._log_path):
+            with open(self._log_path) as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) != 2:
+                        continue
+                    row = int(parts[1])
+                    self._assign(parts[0], row)
+                    self._log_lines += 1
+                    # Кольцо продолжается со строки после последней записанной
+                    self._next_row = (row + 1) % self.capacity
+        self._log = open(self._log_path, "a")
+
+    def _reset(self):
+        for p in (self._meta_path, self._vectors_path, self._log_path):
+            if os.path.exists(p):
+                os.remove(p)
+
+    def _open(self, dim: int, mode: str):
+        self.dim = dim
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode=mode, shape=(self.capacity, dim))
+
+    def _create(self, dim: int):
+        self._open(dim, mode="w+")
+        with open(self._meta_path, "w") as f:
+            json.dump({"dim": dim, "capacity": self.capacity}, f)
+        self._log = open(self._log_path, "w")
+
+    def _assign(self, key: str, row: int):
+        old_key = self._row_keys.get(row)
+        if old_key is not None and self._index.get(old_key) == row:
+            del self._index[old_key]
+        self._index[key] = row
+        self._row_keys[row] = key
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._index.get(key)
+            if row is None:
+                return None
+            return np.array(self._vectors[row])
+
+    def put(self, key: str, vector: np.ndarray):
+        with self._lock:
+            if key in self._index:
+                return
+            if self._vectors is None:
+                self._create(int(vector.shape[-1]))
+            if vector.shape[-1] != self.dim:
+                return
+            row = self._next_row
+            if row in self._row_keys:
+                self.evictions += 1
+            self._vectors[row] = vector
+            self._assign(key, row)
+            self._log.write(f"{key} {row}\n")
+            self._log.flush()
+            self._log_lines += 1
+            self._next_row = (row + 1) % self.capacity
+            if self._log_lines > 2 * self.capacity:
+                self._compact_log()
+
+    def _compact_log(self):
+        """Переписывает журнал ключей, оставляя только живые записи в порядке записи"""
+        self._log.close()
+        start = self._next_row
+        rows = sorted(self._row_keys, key=lambda r: (r - start) % self.capacity)
+        tmp_path = self._log_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for row in rows:
+                f.write(f"{self._row_keys[row]} {row}\n")
+        os.replace(tmp_path, self._log_path)
+        self._log_lines = len(rows)
+        self._log = open(self._log_path, "a")
+
+    def flush(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            if self._log is not None:
+                self._log.flush()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class EmbeddingCache:
+    """
+    Двухуровневый кэш эмбеддингов: LRU в памяти + опциональный memmap на диске.
+
+    Хранит уже нормализованные векторы модели; попадания с диска
+    поднимаются в память.
+    """
+
+    def __init__(self, model_name: str, max_entries: int = 20000,
+                 disk_path: str = "", disk_capacity: int = 1_000_000):
+        self.model_name = model_name
+        self.memory = LRUCache(max_entries)
+        self.disk = DiskEmbeddingStore(disk_path, disk_capacity) if disk_path else None
+        self.disk_hits = 0
+
+    def key(self, prefix: str, text: str) -> str:
+        return embedding_cache_key(self.model_name, prefix, text)
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        found = []
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is None and self.disk is not None:
+                vector = self.disk.get(key)
+                if vector is not None:
+                    self.disk_hits += 1
+                    self.memory.put(key, vector)
+            found.append(vector)
+        return found
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        for key, vector in zip(keys, vectors):
+            vector = np.array(vector, dtype=np.float32)
+            self.memory.put(key, vector)
+            if self.disk is not None:
+                self.disk.put(key, vector)
+
+    def stats(self) -> Dict[str, object]:
+        memory = self.memory.stats()
+        # Промах памяти, найденный на диске, — это попадание кэша в целом
+        hits = memory["hits"] + self.disk_hits
+        misses = memory["misses"] - self.disk_hits
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "memory": memory,
+            "disk": {
+                "enabled": self.disk is not None,
+                "size": len(self.disk) if self.disk is not None else 0,
+                "hits": self.disk_hits,
+                "evictions": self.disk.evictions if self.disk is not None else 0
+            }
+        }
@@ -0,0 +1,87 @@
+# app/executors.py
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app.settings.service_settings import cpu_executor_workers, io_executor_workers
+
+
+class StageExecutor:
+    """
+    Ограниченный пул потоков для одной стадии обработки запроса.
+
+    run() — из event loop: цикл не блокируется, пока задача ждёт очереди или выполняется.
+    call() — из обычного потока: выполняет задачу в пуле и ждёт результат; из потока
+    этого же пула задача выполняется сразу, иначе вложенные вызовы могли бы занять
+    все потоки и ждать друг друга.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        if max_workers <= 0:
+            raise ValueError("max_workers должен быть > 0")
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix=f"{name}-stage")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+
+    def _execute(self, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        self._local.inside = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._local.inside = False
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+
+    def _dequeue_cancelled(self, future: Future):
+        # Клиент отключился, пока задача стояла в очереди: _execute для неё не вызовется
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            self._queued += 1
+        future = self._pool.submit(self._execute, fn, args, kwargs)
+        future.add_done_callback(self._dequeue_cancelled)
+        return future
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        if getattr(self._local, "inside", False):
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def offload(self, fn: Callable) -> Callable:
+        """Декоратор: синхронный обработчик FastAPI становится async и выполняется в этом пуле"""
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await self.run(fn, *args, **kwargs)
+        return wrapper
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "active": self._active,
+                "queued": self._queued,
+                "completed": self._completed
+            }
+
+
+# Инференс моделей: ограничен, чтобы параллельные запросы не делили ядра между десятками прогонов
+cpu_executor = StageExecutor("cpu", cpu_executor_workers)
+# Блокирующие обработчики (клиенты Qdrant и psycopg2): много потоков, почти всё время в ожидании сети
+io_executor = StageExecutor("io", io_executor_workers)
@@ -0,0 +1,253 @@
+# app/inference_backends.py
+import os
+import shutil
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from typing import List, Tuple
+
+import numpy as np
+
+from app.settings.models import *
+from app.settings.backend_settings import *
+from app.token_batching import plan_token_batches
+
+BACKENDS = ("torch", "onnx", "onnx-int8", "pool")
+
+
+# === Абстрактные интерфейсы ===
+class EmbeddingBackend(ABC):
+    tokenizer = None
+    max_seq_length: int = embedding_max_seq_length
+    dim: int = 0
+    # Сколько батчей бэкенд может считать одновременно
+    parallelism: int = 1
+
+    @abstractmethod
+    def encode_padded(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Паддированный батч токенов → нормализованные эмбеддинги float32"""
+
+    def submit_padded(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> Future:
+        """Асинхронный вариант encode_padded; по умолчанию считает сразу"""
+        future = Future()
+        try:
+            future.set_result(self.encode_padded(input_ids, attention_mask))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class RerankBackend(ABC):
+    @abstractmethod
+    def predict(self, pairs: List[Tuple[str, str]], batch_size: int = 32) -> np.ndarray:
+        """Пары (запрос, документ) → релевантность в [0, 1], в порядке пар"""
+
+
+# === PyTorch (как было раньше) ===
+class TorchEmbeddingBackend(EmbeddingBackend):
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.tokenizer = self.model.tokenizer
+        self.max_seq_length = self.model.max_seq_length
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode_padded(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        import torch
+        features = {
+            "input_ids": torch.from_numpy(input_ids),
+            "attention_mask": torch.from_numpy(attention_mask)
+        }
+        with torch.inference_mode():
+            out = self.model(features)["sentence_embedding"]
+            out = torch.nn.functional.normalize(out, p=2, dim=1)
+        return out.cpu().numpy().astype(np.float32, copy=False)
+
+
+class TorchRerankBackend(RerankBackend):
+    def __init__(self, model_name: str):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name, max_length=reranker_max_length)
+
+    def predict(self, pairs: List[Tuple[str, str]], batch_size: int = 32) -> np.ndarray:
+        return np.asarray(self.model.predict(pairs, batch_size=batch_size, show_progress_bar=False), dtype=np.float32)
+
+
+# === ONNX Runtime ===
+def onnx_artifact_dir(model_name: str, kind: str, quantized: bool) -> str:
+    suffix = "-int8" if quantized else ""
+    return os.path.join(onnx_cache_dir, model_name.replace("/", "__"), f"{kind}{suffix}")
+
+
+def export_onnx(model_name: str, kind: str, quantized: bool = False) -> str:
+    """
+    Однократный экспорт модели в ONNX (и динамическая int8-квантизация).
+
+    kind: "embedder" — выход last_hidden_state, "reranker" — logits.
+    Артефакты кэшируются в ONNX_CACHE_DIR; возвращает путь к model.onnx.
+    """
+    target_dir = onnx_artifact_dir(model_name, kind, quantized)
+    target = os.path.join(target_dir, "model.onnx")
+    if os.path.exists(target):
+        return target
+
+    try:
+        import torch
+        from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+    except ImportError as e:
+        raise RuntimeError(f"Не установлены зависимости для экспорта ONNX: {e}")
+
+    if quantized:
+        source = export_onnx(model_name, kind, quantized=False)
+        try:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+        except ImportError as e:
+            raise RuntimeError(f"Не установлен onnxruntime для квантизации: {e}")
+        print(f"🔧 Квантуем {model_name} ({kind}) в int8...")
+        tmp_dir = target_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        quantize_dynamic(
+            source,
+            os.path.join(tmp_dir, "model.onnx"),
+            weight_type=QuantType.QInt8,
+            # bge-reranker-v2-m3 в fp32 больше лимита protobuf в 2 ГБ
+            use_external_data_format=kind == "reranker"
+        )
+        for name in os.listdir(os.path.dirname(source)):
+            # Токенизатор и конфиг переносим к квантованной модели
+            if name.endswith((".json", ".model", ".txt")):
+                shutil.copy(os.path.join(os.path.dirname(source), name), tmp_dir)
+    else:
+        print(f"🔧 Экспортируем {model_name} ({kind}) в ONNX...")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        if kind == "embedder":
+            model = AutoModel.from_pretrained(model_name)
+            output_name = "last_hidden_state"
+            output_axes = {0: "batch", 1: "sequence"}
+        else:
+            model = AutoModelForSequenceClassification.from_pretrained(model_name)
+            output_name = "logits"
+            output_axes = {0: "batch"}
+        model.eval()
+        dummy = tokenizer(["пример текста"], ["пример документа"] if kind == "reranker" else None, return_tensors="pt")
+        tmp_dir = target_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dummy["input_ids"], dummy["attention_mask"]),
+                os.path.join(tmp_dir, "model.onnx"),
+                input_names=["input_ids", "attention_mask"],
+                output_names=[output_name],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    output_name: output_axes
+                },
+                opset_version=onnx_opset
+            )
+        tokenizer.save_pretrained(tmp_dir)
+        model.config.save_pretrained(tmp_dir)
+
+    if os.path.exists(target_dir):
+        shutil.rmtree(target_dir)
+    os.replace(tmp_dir, target_dir)
+    print(f"✅ ONNX-артефакт сохранён: {target}")
+    return target
+
+
+def _onnx_session(path: str):
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise RuntimeError(f"Не установлен onnxruntime: {e}")
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if onnx_intra_op_threads > 0:
+        options.intra_op_num_threads = onnx_intra_op_threads
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+def _load_tokenizer(onnx_path: str):
+    # Токенизатор сохраняется рядом с артефактом при экспорте
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(os.path.dirname(onnx_path))
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    def __init__(self, model_name: str, quantized: bool = False):
+        path = export_onnx(model_name, "embedder", quantized)
+        self.session = _onnx_session(path)
+        self.tokenizer = _load_tokenizer(path)
+        self.max_seq_length = min(self.tokenizer.model_max_length, embedding_max_seq_length)
+        from transformers import AutoConfig
+        self.dim = AutoConfig.from_pretrained(os.path.dirname(path)).hidden_size
+
+    def encode_padded(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        hidden = self.session.run(None, {
+            "input_ids": input_ids.astype(np.int64, copy=False),
+            "attention_mask": attention_mask.astype(np.int64, copy=False)
+        })[0]
+        if embedding_pooling == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+class OnnxRerankBackend(RerankBackend):
+    def __init__(self, model_name: str, quantized: bool = False):
+        path = export_onnx(model_name, "reranker", quantized)
+        self.session = _onnx_session(path)
+        self.tokenizer = _load_tokenizer(path)
+
+    def predict(self, pairs: List[Tuple[str, str]], batch_size: int = 32) -> np.ndarray:
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        encoded = self.tokenizer(
+            [q for q, _ in pairs], [d for _, d in pairs],
+            truncation=True, max_length=reranker_max_length
+        )["input_ids"]
+        scores = np.zeros(len(pairs), dtype=np.float32)
+        batches = plan_token_batches(
+            [len(ids) for ids in encoded],
+            max_batch_tokens=batch_size * reranker_max_length,
+            max_batch_size=batch_size
+        )
+        for batch in batches:
+            features = self.tokenizer.pad({"input_ids": [encoded[i] for i in batch]}, return_tensors="np")
+            logits = self.session.run(None, {
+                "input_ids": features["input_ids"].astype(np.int64, copy=False),
+                "attention_mask": features["attention_mask"].astype(np.int64, copy=False)
+            })[0]
+            # CrossEncoder с одним выходом применяет сигмоиду — повторяем
+            scores[batch] = 1.0 / (1.0 + np.exp(-logits[:, 0]))
+        return scores
+
+
+# === Фабрики ===
+def create_embedding_backend(name: str, model_name: str) -> EmbeddingBackend:
+    if name == "torch":
+        return TorchEmbeddingBackend(model_name)
+    elif name in ("onnx", "onnx-int8"):
+        return OnnxEmbeddingBackend(model_name, quantized=name == "onnx-int8")
+    elif name == "pool":
+        from app.worker_pool import PooledEmbeddingBackend
+        return PooledEmbeddingBackend(model_name)
+    else:
+        raise ValueError(f"Неизвестный бэкенд эмбеддингов: {name}")
+
+
+def create_rerank_backend(name: str, model_name: str) -> RerankBackend:
+    if name == "torch":
+        return TorchRerankBackend(model_name)
+    elif name in ("onnx", "onnx-int8"):
+        return OnnxRerankBackend(model_name, quantized=name == "onnx-int8")
+    elif name == "pool":
+        from app.worker_pool import PooledRerankBackend
+        return PooledRerankBackend(model_name)
+    else:
+        raise ValueError(f"Неизвестный бэкенд reranking: {name}")
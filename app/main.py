@@ -1,18 +1,30 @@
 # app/main.py
 # app/main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
+import numpy as np
 from typing import List, Literal, Tuple, Optional
+from contextlib import asynccontextmanager
 
 # Импорты компонентов
-from .embedder import Embedder
+from .embedder import Embedder, configured_dim
 from app.settings.models import *
 from app.settings.db_credentials import *
-from .chunker import semantic_chunk
+from app.settings.embedder_settings import embed_stream_batch_size, chunk_stream_batch_size
+from app.settings.service_settings import warmup_on_startup
+from app.settings.search_settings import *
+from app.settings.ingest_settings import ingest_batch_max_documents
+from app.components import ComponentRegistry
+from app.executors import cpu_executor, io_executor
+from app import serialization
+from app.streaming import DuplexStreamingResponse, stream_chunk_embeddings, stream_embeddings
 from app.content_processor import ContentProcessor
 from app.qdrant_manager import QdrantManager
 from app.postgres_processor import PostgresProcessor
 from app.reranker import Reranker
+from app.sparse_encoder import SparseEncoder
+from app.search_cache import SearchResultCache
 from qdrant_client.models import Filter, FieldCondition, MatchValue
 
 # Импорты сервисов
@@ -20,29 +32,77 @@ from app.services.document_service import DocumentService
 from app.services.search_service import SearchService
 from app.services.cluster_service import ClusterService
 
-app = FastAPI(
-    title="Embedding API",
-    description="API для получения семантических векторов (русский + 100 языков)",
-    version="1.0"
-)
-
 # === Инициализация глобальных компонентов ===
-embedder = Embedder()
-reranker = Reranker()
-qdrant_manager = QdrantManager(host=qdrant_host, port=qdrant_port)
-postgres_processor = PostgresProcessor()
-content_processor = ContentProcessor(embedder, postgres_processor)
+# Модели и клиенты БД создаются не при импорте: в фоне при старте (прогрев)
+# или при первом обращении. Глобальные имена — прозрачные ленивые прокси.
+components = ComponentRegistry()
+def load_embedder() -> Embedder:
+    instance = Embedder()
+    # Коллекция Qdrant создаётся по конфигу модели, не дожидаясь весов — сверяем с фактической размерностью
+    if instance.dim != configured_dim():
+        raise RuntimeError(f"Эмбеддер выдаёт векторы размерности {instance.dim}, а коллекция Qdrant "
+                           f"создаётся с {configured_dim()} (конфиг {transformer_model_name} и EMBEDDING_DIM)")
+    return instance
+
+
+embedder = components.register("embedder", load_embedder)
+reranker = components.register("reranker", Reranker)
+# Размерность коллекции — по конфигу модели, без загрузки эмбеддера: компоненты грузятся параллельно
+qdrant_manager = components.register(
+    "qdrant", lambda: QdrantManager(host=qdrant_host, port=qdrant_port, vector_size=configured_dim())
+)
+postgres_processor = components.register("postgres", PostgresProcessor)
+# Лёгкий cross-encoder первой ступени поиска — только если задан SEARCH_FIRST_PASS_MODEL
+first_pass_reranker = (
+    components.register("first_pass_reranker", lambda: Reranker(model_name=search_first_pass_model))
+    if search_first_pass_model else None
+)
+# Лексические sparse-векторы: при сохранении чанков и для гибридного поиска
+sparse_encoder = SparseEncoder() if sparse_vectors_enabled else None
+# Кэш результатов поиска; запись документов и кластеризация сбрасывают его для пользователя
+search_cache = SearchResultCache(
+    max_entries=search_cache_max_entries,
+    ttl_seconds=search_cache_ttl_seconds,
+    path=search_cache_path
+) if search_cache_enabled else None
+content_processor = ContentProcessor(embedder, postgres_processor, sparse_encoder=sparse_encoder,
+                                     search_cache=search_cache)
 
 # === Инициализация сервисов ===
 document_service = DocumentService(content_processor, qdrant_manager)
-search_service = SearchService(embedder, reranker, qdrant_manager, postgres_processor)
-cluster_service = ClusterService(qdrant_manager, postgres_processor)
+search_service = SearchService(embedder, reranker, qdrant_manager, postgres_processor,
+                               first_pass_reranker=first_pass_reranker, sparse_encoder=sparse_encoder,
+                               search_cache=search_cache)
+cluster_service = ClusterService(qdrant_manager, postgres_processor, search_cache=search_cache)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if warmup_on_startup:
+        components.start_all()  # не ждём: /health отвечает сразу, готовность — в /ready
+    yield
+    if components.is_ready("embedder") and embedder.cache is not None and embedder.cache.disk is not None:
+        embedder.cache.disk.flush()
+    if components.is_ready("postgres"):
+        postgres_processor.pool.close()
+    content_processor.close()
+
+
+app = FastAPI(
+    title="Embedding API",
+    description="API для получения семантических векторов (русский + 100 языков)",
+    version="1.0",
+    lifespan=lifespan
+)
 
 
 # === Модели запросов/ответов ===
 class EmbedRequest(BaseModel):
     texts: List[str]
     type: Literal["query", "passage"] = "query"
+    # base64 — упакованная матрица вместо списка чисел; бинарные форматы — через Accept
+    encoding_format: Literal["float", "base64"] = "float"
+    dtype: Literal["float32", "float16"] = "float32"
 
 class EmbedResponse(BaseModel):
     embeddings: List[List[float]]
@@ -53,7 +113,11 @@ class ChunkEmbedRequest(BaseModel):
     text: str
     chunk_size: int = 1500
     overlap: int = 40
+    # tokens: chunk_size и overlap — в токенах модели, чанк не обрезается моделью
+    chunk_unit: Literal["chars", "tokens"] = "chars"
     emb_type: Literal["query", "passage"] = "passage"
+    encoding_format: Literal["float", "base64"] = "float"
+    dtype: Literal["float32", "float16"] = "float32"
 
 class ChunkEmbedResponse(BaseModel):
     chunks: List[str]
@@ -74,6 +138,29 @@ class SaveContentRequest(BaseModel):
     text: str
     chunk_size: int = 1500
     overlap: int = 40
+    chunk_unit: Literal["chars", "tokens"] = "chars"
+    user_id: int
+    url: str = ""
+    header: str = ""
+
+class BatchDocument(BaseModel):
+    text: str
+    user_id: int
+    url: str = ""
+    header: str = ""
+
+class SaveContentBatchRequest(BaseModel):
+    documents: List[BatchDocument]
+    chunk_size: int = 1500
+    overlap: int = 40
+    chunk_unit: Literal["chars", "tokens"] = "chars"
+
+class UpdateContentRequest(BaseModel):
+    content_id: int
+    text: str
+    chunk_size: int = 1500
+    overlap: int = 40
+    chunk_unit: Literal["chars", "tokens"] = "chars"
     user_id: int
     url: str = ""
     header: str = ""
@@ -83,19 +170,76 @@ class SearchRequest(BaseModel):
     query: str
     cluster_label: Optional[str] = None
     limit: int = 5
+    # Полный текст документов из PostgreSQL; по умолчанию — только сниппеты лучших чанков
+    include_text: bool = False
+
+class SearchBatchRequest(BaseModel):
+    searches: List[SearchRequest]
+
+
+def _matrix_response(matrix: np.ndarray, fmt: str, dtype: str, fields: dict, meta: Optional[dict] = None) -> Response:
+    """Отдаёт матрицу эмбеддингов в компактном формате без промежуточных списков"""
+    dim = int(matrix.shape[1]) if matrix.ndim == 2 and len(matrix) else 0
+    if fmt == "base64":
+        return JSONResponse({
+            **fields,
+            **(meta or {}),
+            "embeddings": serialization.encode_base64(matrix, dtype),
+            "encoding_format": "base64",
+            "dtype": dtype,
+            "count": len(matrix),
+            "dim": dim
+        })
+    headers = {"X-Embedding-Count": str(len(matrix)), "X-Embedding-Dim": str(dim), "X-Embedding-Dtype": dtype}
+    if fmt == "npy":
+        return Response(serialization.encode_npy(matrix, dtype), media_type=serialization.NPY, headers=headers)
+    return Response(
+        serialization.encode_octet_stream(matrix, dtype, meta),
+        media_type=serialization.OCTET_STREAM,
+        headers=headers
+    )
 
 
 # === Эндпоинты ===
+# Блокирующие обработчики — синхронные функции под @io_executor.offload: выполняются
+# в io-пуле, не занимая event loop, инференс из них уходит в cpu-пул, и параллельные
+# запросы попадают в общий батч Embedder.batcher
 @app.get("/health")
 async def health():
     return {"status": "ok", "model": transformer_model_name}
 
 
+@app.get("/ready")
+async def ready():
+    """Готовность: состояние каждого компонента; 503, пока не загружены все"""
+    status = components.status()
+    return JSONResponse(status, status_code=200 if status["status"] == "ready" else 503)
+
+
+@app.get("/stats")
+async def stats():
+    """Счётчики кэшей и очередей инференса (незагруженные компоненты не трогаем)"""
+    embedder_ready = components.is_ready("embedder")
+    reranker_ready = components.is_ready("reranker")
+    return {
+        "embedding_cache": embedder.cache.stats() if embedder_ready and embedder.cache is not None else None,
+        "rerank_cache": reranker.cache.stats() if reranker_ready and reranker.cache is not None else None,
+        "search_cache": search_cache.stats() if search_cache is not None else None,
+        "postgres_pool": postgres_processor.pool.stats() if components.is_ready("postgres") else None,
+        "executors": {"cpu": cpu_executor.stats(), "io": io_executor.stats()}
+    }
+
+
 @app.post("/embed", response_model=EmbedResponse)
-async def embed_endpoint(req: EmbedRequest):
+@io_executor.offload
+def embed_endpoint(req: EmbedRequest, accept: Optional[str] = Header(None)):
     if not req.texts:
         raise HTTPException(status_code=400, detail="Список texts не может быть пустым")
+    fmt = serialization.negotiate_format(accept, req.encoding_format)
     try:
+        if fmt != "json":
+            matrix = embedder.embed_array(req.texts, req.type)
+            return _matrix_response(matrix, fmt, req.dtype, {"type": req.type})
         embeddings = embedder.embed(req.texts, req.type)
         return EmbedResponse(
             embeddings=embeddings,
@@ -106,8 +250,40 @@ async def embed_endpoint(req: EmbedRequest):
         raise HTTPException(status_code=500, detail=f"Ошибка генерации эмбеддингов: {str(e)}")
 
 
+@app.post("/embed/stream")
+async def embed_stream_endpoint(
+    request: Request,
+    type: Literal["query", "passage"] = "query",
+    encoding_format: Literal["float", "base64"] = "float",
+    dtype: Literal["float32", "float16"] = "float32",
+    batch_size: int = embed_stream_batch_size,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Тело — NDJSON (строка JSON или {"text": ...} на строку), ответ отдаётся по батчам
+    по мере готовности: NDJSON {"index", "embedding"} или кадры octet-stream.
+    """
+    if batch_size <= 0:
+        raise HTTPException(status_code=400, detail="batch_size должен быть > 0")
+    fmt = serialization.negotiate_format(accept, encoding_format)
+    if fmt == "npy":
+        raise HTTPException(status_code=406, detail="Формат npy не поддерживается в потоковом режиме")
+    media_type = serialization.OCTET_STREAM if fmt == "octet-stream" else "application/x-ndjson"
+    return DuplexStreamingResponse(
+        stream_embeddings(
+            request.stream(),
+            lambda texts: embedder.embed_array(texts, type),
+            batch_size=batch_size,
+            fmt=fmt,
+            dtype=dtype
+        ),
+        media_type=media_type
+    )
+
+
 @app.post("/chunk-embed", response_model=ChunkEmbedResponse)
-async def chunk_embed_endpoint(req: ChunkEmbedRequest):
+@io_executor.offload
+def chunk_embed_endpoint(req: ChunkEmbedRequest, accept: Optional[str] = Header(None)):
     if not req.text.strip():
         raise HTTPException(status_code=400, detail="Текст не может быть пустым")
     if req.chunk_size <= 0:
@@ -118,23 +294,26 @@ async def chunk_embed_endpoint(req: ChunkEmbedRequest):
         req.overlap = req.chunk_size // 4
     
     try:
-        chunk_tuples = semantic_chunk(
+        chunk_tuples, token_ids = content_processor.chunk(
             req.text,
-            max_chunk_size=req.chunk_size,
-            overlap=req.overlap
+            chunk_size=req.chunk_size,
+            overlap=req.overlap,
+            chunk_unit=req.chunk_unit,
+            emb_type=req.emb_type
         )
         chunks = [c[0] for c in chunk_tuples]
         positions = [(c[1], c[2]) for c in chunk_tuples]
+        fmt = serialization.negotiate_format(accept, req.encoding_format)
 
-        if not chunks:
+        if not chunks and fmt == "json":
             return ChunkEmbedResponse(chunks=[], embeddings=[], positions=[], dim=0)
 
-        MAX_CHUNKS = 100
-        if len(chunks) > MAX_CHUNKS:
-            chunks = chunks[:MAX_CHUNKS]
-            positions = positions[:MAX_CHUNKS]
-        
-        embeddings = embedder.embed(chunks, req.emb_type)
+        if fmt != "json":
+            matrix = embedder.embed_array(chunks, req.emb_type, token_ids)
+            # npy несёт только матрицу; тексты и позиции — в base64/octet-stream
+            return _matrix_response(matrix, fmt, req.dtype, {}, meta={"chunks": chunks, "positions": positions})
+
+        embeddings = embedder.embed(chunks, req.emb_type, token_ids)
         return ChunkEmbedResponse(
             chunks=chunks,
             embeddings=embeddings,
@@ -145,8 +324,55 @@ async def chunk_embed_endpoint(req: ChunkEmbedRequest):
         raise HTTPException(status_code=500, detail=f"Ошибка обработки: {str(e)}")
 
 
+@app.post("/chunk-embed/stream")
+async def chunk_embed_stream_endpoint(
+    request: Request,
+    chunk_size: int = 1500,
+    overlap: int = 40,
+    chunk_unit: Literal["chars", "tokens"] = "chars",
+    emb_type: Literal["query", "passage"] = "passage",
+    encoding_format: Literal["float", "base64"] = "float",
+    dtype: Literal["float32", "float16"] = "float32",
+    batch_size: int = chunk_stream_batch_size,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Тело — сам текст (UTF-8), параметры — в query. Чанкинг идёт по мере чтения тела,
+    чанки эмбеддятся батчами, а результат с позициями отдаётся сразу: без ограничения
+    на число чанков и без сборки всего ответа в памяти.
+    """
+    if chunk_size <= 0:
+        raise HTTPException(status_code=400, detail="chunk_size должен быть > 0")
+    if overlap < 0:
+        raise HTTPException(status_code=400, detail="overlap не может быть отрицательным")
+    if batch_size <= 0:
+        raise HTTPException(status_code=400, detail="batch_size должен быть > 0")
+    if overlap >= chunk_size:
+        overlap = chunk_size // 4
+    fmt = serialization.negotiate_format(accept, encoding_format)
+    if fmt == "npy":
+        raise HTTPException(status_code=406, detail="Формат npy не поддерживается в потоковом режиме")
+    media_type = serialization.OCTET_STREAM if fmt == "octet-stream" else "application/x-ndjson"
+    return DuplexStreamingResponse(
+        stream_chunk_embeddings(
+            request.stream(),
+            lambda pieces: content_processor.iter_chunks(pieces, chunk_size, overlap, chunk_unit, emb_type),
+            lambda batch: embedder.embed_array(
+                [c[0] for c in batch],
+                emb_type,
+                [c[3] for c in batch] if chunk_unit == "tokens" else None
+            ),
+            batch_size=batch_size,
+            fmt=fmt,
+            dtype=dtype
+        ),
+        media_type=media_type
+    )
+
+
 @app.post("/process")
-async def process_endpoint(req: ProcessRequest):
+@io_executor.offload
+def process_endpoint(req: ProcessRequest):
     if not req.text.strip():
         raise HTTPException(400, "text не может быть пустым")
     try:
@@ -165,7 +391,8 @@ async def process_endpoint(req: ProcessRequest):
 
 
 @app.post("/save-content")
-async def save_content(req: SaveContentRequest):
+@io_executor.offload
+def save_content(req: SaveContentRequest):
     try:
         result = document_service.save_document(
             text=req.text,
@@ -173,15 +400,61 @@ async def save_content(req: SaveContentRequest):
             chunk_size=req.chunk_size,
             overlap=req.overlap,
             url=req.url,
-            header=req.header
+            header=req.header,
+            chunk_unit=req.chunk_unit
         )
         return {"status": "success", **result}
     except Exception as e:
         raise HTTPException(500, f"Ошибка сохранения: {e}")
 
 
+@app.post("/save-content/batch")
+@io_executor.offload
+def save_content_batch(req: SaveContentBatchRequest):
+    """Пакет документов: дубликаты одним запросом, общие батчи эмбеддера, COPY в PostgreSQL, пачки точек в Qdrant"""
+    if not req.documents:
+        raise HTTPException(400, "Список documents не может быть пустым")
+    if len(req.documents) > ingest_batch_max_documents:
+        raise HTTPException(400, f"Не больше {ingest_batch_max_documents} документов за запрос")
+    try:
+        result = document_service.save_documents(
+            [doc.model_dump() for doc in req.documents],
+            chunk_size=req.chunk_size,
+            overlap=req.overlap,
+            chunk_unit=req.chunk_unit
+        )
+        return {"status": "success", **result}
+    except Exception as e:
+        raise HTTPException(500, f"Ошибка сохранения: {e}")
+
+
+@app.post("/update-content")
+@io_executor.offload
+def update_content(req: UpdateContentRequest):
+    """Новая версия документа: эмбеддятся только новые и изменённые чанки"""
+    if not req.text.strip():
+        raise HTTPException(400, "text не может быть пустым")
+    try:
+        result = document_service.update_document(
+            content_id=req.content_id,
+            text=req.text,
+            user_id=req.user_id,
+            chunk_size=req.chunk_size,
+            overlap=req.overlap,
+            url=req.url,
+            header=req.header,
+            chunk_unit=req.chunk_unit
+        )
+    except Exception as e:
+        raise HTTPException(500, f"Ошибка обновления: {e}")
+    if result["status"] == "not_found":
+        raise HTTPException(404, f"Документ {req.content_id} не найден")
+    return result
+
+
 @app.post("/clusterize")
-async def clusterize_user_content(user_id: int):
+@io_executor.offload
+def clusterize_user_content(user_id: int):
     try:
         result = cluster_service.clusterize_user(user_id)
         return result
@@ -190,7 +463,8 @@ async def clusterize_user_content(user_id: int):
 
 
 @app.get("/clusters")
-async def get_user_clusters(user_id: int):
+@io_executor.offload
+def get_user_clusters(user_id: int):
     scroll_filter = Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))])
     points, _ = qdrant_manager.client.scroll(
         collection_name="content_chunks",
@@ -209,14 +483,35 @@ async def get_user_clusters(user_id: int):
 
 
 @app.post("/search")
-async def search_chunks(req: SearchRequest):
+@io_executor.offload
+def search_chunks(req: SearchRequest):
     try:
         results = search_service.search(
             user_id=req.user_id,
             query=req.query,
             cluster_label=req.cluster_label,
-            limit=req.limit
+            limit=req.limit,
+            include_text=req.include_text
         )
         return {"results": results}
+    except Exception as e:
+        raise HTTPException(500, f"Ошибка поиска: {e}")
+
+
+@app.post("/search/batch")
+@io_executor.offload
+def search_batch(req: SearchBatchRequest):
+    """
+    Несколько поисков одним запросом: общий прогон эмбеддера и батчи reranker. Qdrant — один
+    батч-запрос, а с группировкой по документам — параллельные запросы по одному на поиск;
+    PostgreSQL — один запрос и только для поисков с include_text.
+    """
+    if not req.searches:
+        raise HTTPException(400, "Список searches не может быть пустым")
+    if len(req.searches) > search_batch_max_size:
+        raise HTTPException(400, f"Не больше {search_batch_max_size} поисков за запрос")
+    try:
+        results = search_service.search_batch([s.model_dump() for s in req.searches])
+        return {"results": results}
     except Exception as e:
         raise HTTPException(500, f"Ошибка поиска: {e}")
\ No newline at end of file
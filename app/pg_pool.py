@@ -0,0 +1,196 @@
+# app/pg_pool.py
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Sequence
+
+import psycopg2
+
+
+class PoolTimeout(Exception):
+    """Свободное соединение не появилось за timeout секунд"""
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений psycopg2 для обработчиков в io-пуле.
+
+    Держит от min_size до max_size соединений; когда все заняты, поток ждёт
+    освобождения не дольше timeout. Соединение, простаивавшее дольше
+    health_check_idle секунд, перед выдачей проверяется SELECT 1 и при ошибке
+    заменяется новым. Для каждого соединения запоминаются подготовленные
+    на сервере запросы (execute_prepared).
+    """
+
+    def __init__(self, connect: Callable[[], Any], min_size: int = 1, max_size: int = 16,
+                 timeout: float = 10.0, health_check_idle: float = 30.0):
+        if max_size <= 0 or min_size > max_size:
+            raise ValueError("Нужно 0 <= min_size <= max_size и max_size > 0")
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+        self._idle = deque()  # (соединение, время возврата в пул)
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._prepared: Dict[int, set] = {}
+        self._cond = threading.Condition()
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.health_check_failures = 0
+        for _ in range(min_size):
+            self._idle.append((self._open(), time.monotonic()))
+            self._size += 1
+
+    def _open(self):
+        conn = self.connect()
+        self._prepared[id(conn)] = set()
+        return conn
+
+    def _close(self, conn):
+        self._prepared.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn, returned_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        conn, waited = None, False
+        with self._cond:
+            while True:
+                if self._idle:
+                    # Последнее возвращённое соединение — «тёплое», реже требует проверки
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"Нет свободного соединения с PostgreSQL за {self.timeout} с "
+                                      f"(занято {self._in_use} из {self.max_size})")
+                waited = True
+                self._waiting += 1
+                self._cond.wait(remaining)
+                self._waiting -= 1
+            self._in_use += 1
+            wait = time.monotonic() - started
+            self.acquired += 1
+            if waited:
+                self.waited += 1
+                self.wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+        try:
+            if conn is not None and not self._healthy(conn, returned_at):
+                self.health_check_failures += 1
+                self._close(conn)
+                conn = None
+            return conn if conn is not None else self._open()
+        except Exception:
+            self._release(None)
+            raise
+
+    def _release(self, conn):
+        """Возвращает соединение в пул; None — соединение закрыто и место освобождается"""
+        with self._cond:
+            self._in_use -= 1
+            if conn is None:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _reset(self, conn) -> bool:
+        """Откат после ошибки; False — соединение непригодно и будет закрыто"""
+        try:
+            conn.rollback()
+            if self._prepared.get(id(conn)):
+                # Неизвестно, на каком запросе оборвалась транзакция, — готовим заново
+                with conn.cursor() as cur:
+                    cur.execute("DEALLOCATE ALL")
+                conn.commit()
+                self._prepared[id(conn)].clear()
+            return True
+        except Exception:
+            return False
+
+    @contextmanager
+    def connection(self):
+        """Соединение на время блока: commit при успехе, rollback при исключении"""
+        conn = self._checkout()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            if self._reset(conn):
+                self._release(conn)
+            else:
+                self._close(conn)
+                self._release(None)
+            raise
+        if conn.closed:
+            self._close(conn)
+            self._release(None)
+        else:
+            self._release(conn)
+
+    def execute_prepared(self, cur, name: str, sql: str, params: Sequence, types: Sequence[str] = ()):
+        """
+        Выполняет sql (параметры — $1, $2, ...) как подготовленный на сервере запрос:
+        PREPARE — один раз на соединение, дальше только EXECUTE без разбора и планирования.
+        """
+        prepared = self._prepared.setdefault(id(cur.connection), set())
+        if name not in prepared:
+            signature = f"({', '.join(types)})" if types else ""
+            cur.execute(f"PREPARE {name}{signature} AS {sql}")
+            prepared.add(name)
+        arguments = f" ({', '.join(['%s'] * len(params))})" if params else ""
+        cur.execute(f"EXECUTE {name}{arguments}", list(params))
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close(conn)
+                self._size -= 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "saturation": round(self._in_use / self.max_size, 4),
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "wait_ms_avg": round(self.wait_seconds / self.waited * 1000, 3) if self.waited else 0.0,
+                "wait_ms_max": round(self.max_wait_seconds * 1000, 3),
+                "timeouts": self.timeouts,
+                "health_check_failures": self.health_check_failures
+            }
@@ -1,6 +1,9 @@
+import csv
+import io
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
+from app.pg_pool import ConnectionPool
 from app.settings.db_credentials import *
 
 
@@ -14,11 +17,19 @@ class PostgresProcessor:
             "password": postgres_password
         }
         print("🔍 Подключаюсь к PostgreSQL...")
+        self.pool = ConnectionPool(
+            lambda: psycopg2.connect(**self.connection_params),
+            min_size=postgres_pool_min_size,
+            max_size=postgres_pool_max_size,
+            timeout=postgres_pool_timeout,
+            health_check_idle=postgres_pool_health_check_idle
+        )
         self._ensure_table_exists()
         print("✅ PostgreSQL инициализирован")
 
     def _get_connection(self):
-        return psycopg2.connect(**self.connection_params)
+        """Соединение из пула на время блока with: commit при выходе, rollback при ошибке"""
+        return self.pool.connection()
 
 
     # app/postgres_processor.py
@@ -81,6 +92,46 @@ class PostgresProcessor:
             return False
 
 
+    def save_documents(self, documents: List[Dict[str, Any]]) -> bool:
+        """Сохраняет пакет документов (ключи — как у save_document) одним COPY"""
+        if not documents:
+            return True
+        columns = ("content_id", "user_id", "content_text", "content_hash", "url", "header", "document_id")
+        buffer = io.StringIO()
+        # Все поля в кавычках: пустая строка в CSV без кавычек для COPY — NULL
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for doc in documents:
+            writer.writerow([doc.get(column, "") for column in columns])
+        buffer.seek(0)
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.copy_expert(f"COPY documents ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+                    return True
+        except Exception as e:
+            print(f"❌ Ошибка пакетного сохранения документов: {e}")
+            return False
+
+
+    def update_document(self, content_id: int, user_id: int, content_text: str,
+                        content_hash: str, url: str = "", header: str = "",
+                        document_id: str = None) -> bool:
+        """Заменяет текст и метаданные документа; False — документа нет или ошибка"""
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE documents
+                        SET content_text = %s, content_hash = %s, url = %s, header = %s, document_id = %s
+                        WHERE content_id = %s AND user_id = %s
+                    """, (content_text, content_hash, url, header, document_id, content_id, user_id))
+                    conn.commit()
+                    return cur.rowcount > 0
+        except Exception as e:
+            print(f"❌ Ошибка обновления документа: {e}")
+            return False
+
+
     def get_document(self, content_id: int) -> Optional[Dict[str, Any]]:
         """Получает полный документ по content_id"""
         try:
@@ -117,9 +168,11 @@ class PostgresProcessor:
         try:
             with self._get_connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT content_id FROM documents WHERE user_id = %s AND content_hash = %s",
-                        (user_id, content_hash)
+                    # Проверка дубликата — на каждое сохранение: подготовленный запрос
+                    self.pool.execute_prepared(
+                        cur, "content_id_by_hash",
+                        "SELECT content_id FROM documents WHERE user_id = $1 AND content_hash = $2",
+                        (user_id, content_hash), types=("integer", "text")
                     )
                     row = cur.fetchone()
                     return row[0] if row else None
@@ -128,6 +181,22 @@ class PostgresProcessor:
             return None
         
     
+    def get_content_ids_by_hashes(self, keys: List[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+        """content_id сохранённых документов по парам (user_id, content_hash) — один запрос на пакет"""
+        if not keys:
+            return {}
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT user_id, content_hash, content_id FROM documents WHERE (user_id, content_hash) IN %s",
+                        (tuple(keys),)
+                    )
+                    return {(row[0], row[1]): row[2] for row in cur.fetchall()}
+        except Exception as e:
+            print(f"❌ Ошибка при проверке хешей: {e}")
+            return {}
+
     def save_cluster_centroids(self, user_id: int, centroids: Dict[str, dict]):
         """Сохраняет центроиды и описания кластеров"""
         with self._get_connection() as conn:
@@ -149,9 +218,10 @@ class PostgresProcessor:
         try:
             with self._get_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    cur.execute(
-                        "SELECT cluster_label, centroid_vector, description FROM user_clusters WHERE user_id = %s",
-                        (user_id,)
+                    self.pool.execute_prepared(
+                        cur, "cluster_centroids",
+                        "SELECT cluster_label, centroid_vector, description FROM user_clusters WHERE user_id = $1",
+                        (user_id,), types=("integer",)
                     )
                     return {
                         row["cluster_label"]: {
@@ -173,18 +243,36 @@ class PostgresProcessor:
         try:
             with self._get_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    placeholders = ','.join(['%s'] * len(content_ids))
-                    cur.execute(f"""
+                    # Массив вместо IN (%s, ...) — один подготовленный запрос для любого числа id
+                    self.pool.execute_prepared(cur, "documents_by_content_ids", """
                         SELECT content_id, user_id, content_text, url, header, document_id
-                        FROM documents 
-                        WHERE content_id IN ({placeholders}) AND user_id = %s
-                    """, content_ids + [user_id])
+                        FROM documents
+                        WHERE content_id = ANY($1) AND user_id = $2
+                    """, (list(content_ids), user_id), types=("bigint[]", "integer"))
                     
                     return [dict(row) for row in cur.fetchall()]
         except Exception as e:
             print(f"Ошибка получения документов: {e}")
             return []
         
+    def get_documents_by_keys(self, keys: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        """Документы по парам (content_id, user_id) — один запрос на несколько поисков разных пользователей"""
+        if not keys:
+            return []
+
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute("""
+                        SELECT content_id, user_id, content_text, url, header, document_id
+                        FROM documents
+                        WHERE (content_id, user_id) IN %s
+                    """, (tuple(keys),))
+                    return [dict(row) for row in cur.fetchall()]
+        except Exception as e:
+            print(f"Ошибка получения документов: {e}")
+            return []
+        
     def clear_test_data(self, min_user_id=9000):
         """Удаляет тестовые данные"""
         self.conn.execute(f"DELETE FROM documents WHERE user_id >= {min_user_id};")
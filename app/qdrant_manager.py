@@ -1,28 +1,211 @@
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
-    PointStruct, VectorParams, Distance, CollectionConfig
+    PointStruct, VectorParams, Distance, CollectionConfig,
+    SparseVectorParams, SparseVector, Modifier, Prefetch, FusionQuery, Fusion, QueryRequest, Filter,
+    HnswConfigDiff, OptimizersConfigDiff, CollectionParamsDiff, VectorParamsDiff,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization, BinaryQuantizationConfig,
+    Disabled, SearchParams, QuantizationSearchParams,
+    IntegerIndexParams, IntegerIndexType, KeywordIndexParams, KeywordIndexType
 )
 from typing import List, Dict, Any, Optional
 import uuid
 from app.settings.db_credentials import *
+from app.settings.models import embedding_native_dim
+from app.settings.embedder_settings import embedding_dim
+from app.settings.search_settings import (
+    sparse_vectors_enabled, search_quantization_oversampling, search_quantization_rescore
+)
+from app.settings.qdrant_settings import *
+from app.ranking import weighted_fusion
+from app.dim_reduction import output_dim
+from app.executors import StageExecutor
+
+
+# Индексы полей, по которым фильтруют запросы. is_tenant в Qdrant есть только у keyword-индексов,
+# поэтому целочисленный user_id индексируется для точного совпадения (без range),
+# а поиск внутри пользователя ускоряют подграфы HNSW по его значениям (payload_m)
+PAYLOAD_INDEXES = {
+    "user_id": IntegerIndexParams(type=IntegerIndexType.INTEGER, lookup=True, range=False),
+    "content_id": IntegerIndexParams(type=IntegerIndexType.INTEGER, lookup=True, range=False),
+    "cluster_label": KeywordIndexParams(type=KeywordIndexType.KEYWORD),
+    "content_hash": KeywordIndexParams(type=KeywordIndexType.KEYWORD),
+}
+
+
+def _changed_fields(current, wanted) -> Dict[str, Any]:
+    """Поля wanted, значения которых отличаются от current (None у current — значение по умолчанию)"""
+    return {
+        key: value for key, value in wanted.model_dump(exclude_none=True).items()
+        if (getattr(current, key, None) or 0) != (value or 0)
+    }
+
+
+def quantization_config(kind: str):
+    """Квантизация dense-векторов коллекции по QDRANT_QUANTIZATION; None — без квантизации"""
+    if not kind:
+        return None
+    if kind == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=qdrant_scalar_quantile, always_ram=qdrant_quantization_always_ram
+        ))
+    if kind == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=qdrant_quantization_always_ram))
+    raise ValueError(f"Неизвестный тип квантизации: {kind}")
+
+
+def _quantization_changed(current, wanted) -> bool:
+    if current is None or wanted is None:
+        return (current is None) != (wanted is None)
+    if type(current) is not type(wanted):
+        return True
+    field = "scalar" if isinstance(wanted, ScalarQuantization) else "binary"
+    return bool(_changed_fields(getattr(current, field), getattr(wanted, field)))
+
+
+def search_params(oversampling: float = search_quantization_oversampling,
+                  rescore: bool = search_quantization_rescore) -> SearchParams:
+    """
+    Параметры dense-поиска по квантованным векторам: Qdrant берёт limit * oversampling
+    кандидатов по квантованным векторам и при rescore переоценивает их по исходным.
+    Для коллекции без квантизации ни на что не влияют.
+    """
+    return SearchParams(quantization=QuantizationSearchParams(rescore=rescore, oversampling=oversampling))
+
+
+def query_requests(dense_query: List[float], sparse_query: Optional[Dict] = None,
+                   query_filter: Optional[Filter] = None, limit: int = 5,
+                   fusion: str = "rrf", params: Optional[SearchParams] = None) -> List[QueryRequest]:
+    """
+    Запросы для query_batch_points по одному поиску.
+    dense или нет sparse_query — один dense-запрос; rrf — prefetch dense и sparse
+    со слиянием reciprocal rank fusion в самом Qdrant; weighted — два отдельных
+    запроса, их сливает fuse_responses. params (search_params) — только для dense.
+    """
+    dense = QueryRequest(query=dense_query, using="dense", filter=query_filter, limit=limit,
+                         params=params, with_payload=True)
+    if fusion == "dense" or sparse_query is None or not sparse_query["indices"]:
+        return [dense]
+    sparse = QueryRequest(query=SparseVector(**sparse_query), using="sparse", filter=query_filter,
+                          limit=limit, with_payload=True)
+    if fusion == "weighted":
+        return [dense, sparse]
+    if fusion != "rrf":
+        raise ValueError(f"Неизвестный способ слияния: {fusion}")
+    return [QueryRequest(
+        prefetch=[
+            Prefetch(query=dense.query, using="dense", filter=query_filter, limit=limit, params=params),
+            Prefetch(query=sparse.query, using="sparse", filter=query_filter, limit=limit)
+        ],
+        query=FusionQuery(fusion=Fusion.RRF),
+        filter=query_filter,
+        limit=limit,
+        with_payload=True
+    )]
+
+
+def fuse_responses(responses: list, limit: int, dense_weight: float = 0.7, sparse_weight: float = 0.3) -> list:
+    """Точки по ответам на query_requests одного поиска"""
+    if len(responses) == 1:
+        return responses[0].points
+    return weighted_fusion([r.points for r in responses], [dense_weight, sparse_weight], limit)
 
 
 class QdrantManager:
-    def __init__(self, host: str = "localhost", port: int = 6333):
-        self.client = QdrantClient(host=host, port=port)
+    def __init__(self, host: str = "localhost", port: int = 6333, vector_size: int = output_dim(embedding_dim, embedding_native_dim),
+                 client: Optional[QdrantClient] = None):
+        # client — готовый клиент (например, QdrantClient(location=":memory:") в бенчмарках)
+        self.client = client or QdrantClient(host=host, port=port)
         self.collection_name = qdrant_collection_name
+        self.vector_size = vector_size
+        self.sparse_enabled = sparse_vectors_enabled
+        # Пачки точек больших документов и пакетной загрузки пишутся параллельно
+        self.upsert_executor = StageExecutor("qdrant-upsert", qdrant_upsert_parallel)
         self._ensure_collection_exists()  # ← вызывается здесь!
+        self._ensure_payload_indexes()
+
+    @staticmethod
+    def _hnsw_config() -> HnswConfigDiff:
+        return HnswConfigDiff(m=qdrant_hnsw_m, ef_construct=qdrant_hnsw_ef_construct,
+                              payload_m=qdrant_hnsw_payload_m, on_disk=qdrant_hnsw_on_disk)
+
+    @staticmethod
+    def _optimizers_config() -> OptimizersConfigDiff:
+        return OptimizersConfigDiff(default_segment_number=qdrant_default_segment_number,
+                                    indexing_threshold=qdrant_indexing_threshold_kb)
 
     def _ensure_collection_exists(self):
-        """Создаёт коллекцию при первом запуске"""
+        """Создаёт коллекцию при первом запуске, у существующей — обновляет параметры хранения"""
         if not self.client.collection_exists(self.collection_name):
             self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config={
-                    "dense": VectorParams(size=384, distance=Distance.COSINE)
-                }
+                    "dense": VectorParams(size=self.vector_size, distance=Distance.COSINE, on_disk=qdrant_vectors_on_disk)
+                },
+                # IDF по коллекции считает Qdrant: в точках — только насыщенная частота BM25
+                sparse_vectors_config={
+                    "sparse": SparseVectorParams(modifier=Modifier.IDF)
+                } if self.sparse_enabled else None,
+                on_disk_payload=qdrant_on_disk_payload,
+                hnsw_config=self._hnsw_config(),
+                optimizers_config=self._optimizers_config(),
+                quantization_config=quantization_config(qdrant_quantization)
             )
-            print(f"✅ Коллекция '{self.collection_name}' создана")
+            print(f"✅ Коллекция '{self.collection_name}' создана (dense: {self.vector_size}, sparse: {self.sparse_enabled})")
+            return
+        config = self.client.get_collection(self.collection_name).config
+        self._migrate_collection(config)
+        # Размерность существующей коллекции не меняется — нужна новая коллекция и переиндексация
+        params = config.params
+        if self.sparse_enabled and "sparse" not in (params.sparse_vectors or {}):
+            # Добавить именованный вектор в существующую коллекцию Qdrant не позволяет
+            self.sparse_enabled = False
+            print(f"⚠️ В коллекции '{self.collection_name}' нет sparse-вектора: гибридный поиск выключен. "
+                  f"Смените QDRANT_COLLECTION_NAME и переиндексируйте")
+        existing = params.vectors["dense"].size
+        if existing != self.vector_size:
+            print(f"⚠️ Коллекция '{self.collection_name}' создана с размерностью {existing}, "
+                  f"а эмбеддинги имеют {self.vector_size}: смените QDRANT_COLLECTION_NAME и переиндексируйте")
+
+    def _migrate_collection(self, config: CollectionConfig):
+        """
+        Приводит HNSW, сегменты, квантизацию и хранение payload и векторов
+        существующей коллекции к настройкам.
+        Меняет только отличающиеся параметры: повторный запуск ничего не делает.
+        """
+        hnsw = _changed_fields(config.hnsw_config, self._hnsw_config())
+        optimizers = _changed_fields(config.optimizer_config, self._optimizers_config())
+        on_disk_payload = bool(config.params.on_disk_payload) != qdrant_on_disk_payload
+        dense = config.params.vectors["dense"]
+        vectors_on_disk = bool(dense.on_disk) != qdrant_vectors_on_disk
+        quantization = quantization_config(qdrant_quantization)
+        quantization_changed = _quantization_changed(config.quantization_config, quantization)
+        if not (hnsw or optimizers or on_disk_payload or vectors_on_disk or quantization_changed):
+            return
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            hnsw_config=HnswConfigDiff(**hnsw) if hnsw else None,
+            optimizers_config=OptimizersConfigDiff(**optimizers) if optimizers else None,
+            collection_params=CollectionParamsDiff(on_disk_payload=qdrant_on_disk_payload) if on_disk_payload else None,
+            vectors_config={"dense": VectorParamsDiff(on_disk=qdrant_vectors_on_disk)} if vectors_on_disk else None,
+            # Квантованные векторы Qdrant строит в фоне, до готовности поиск идёт по исходным
+            quantization_config=(quantization or Disabled.DISABLED) if quantization_changed else None
+        )
+        changed = list(hnsw) + list(optimizers) + (["on_disk_payload"] if on_disk_payload else [])
+        changed += (["vectors_on_disk"] if vectors_on_disk else []) + (["quantization"] if quantization_changed else [])
+        print(f"🔧 Коллекция '{self.collection_name}': обновлены {', '.join(changed)}")
+
+    def _ensure_payload_indexes(self):
+        """Создаёт недостающие индексы payload; индекс с другими параметрами пересоздаётся"""
+        payload_schema = self.client.get_collection(self.collection_name).payload_schema
+        for field, params in PAYLOAD_INDEXES.items():
+            current = payload_schema.get(field)
+            if current is not None and current.params is not None and not _changed_fields(current.params, params):
+                continue
+            if current is not None:
+                self.client.delete_payload_index(self.collection_name, field, wait=True)
+            # Строится в фоне: фильтры работают и до готовности индекса, только медленнее
+            self.client.create_payload_index(self.collection_name, field, field_schema=params, wait=False)
+            print(f"🔧 Индекс payload '{field}' в '{self.collection_name}' {'пересоздан' if current else 'создан'}")
 
     # В app/qdrant_manager.py
     def save_chunks(self, chunks_data: List[Dict[str, Any]]) -> List[str]:
@@ -34,8 +217,8 @@ class QdrantManager:
             
             # Формируем multi-vector
             vector = {"dense": dense_vector}
-            if sparse_vector is not None:
-                vector["sparse"] = sparse_vector
+            if sparse_vector is not None and self.sparse_enabled:
+                vector["sparse"] = SparseVector(**sparse_vector)
             
             point_id = item["chunk_id"]
             points.append(PointStruct(
@@ -44,10 +227,22 @@ class QdrantManager:
                 payload=item
             ))
 
-        self.client.upsert(collection_name=self.collection_name, points=points)
+        batch_size = max(1, qdrant_upsert_batch_size)
+        if len(points) <= batch_size:
+            self.client.upsert(collection_name=self.collection_name, points=points)
+        else:
+            futures = [
+                self.upsert_executor.submit(self.client.upsert, collection_name=self.collection_name,
+                                            points=points[i:i + batch_size])
+                for i in range(0, len(points), batch_size)
+            ]
+            for future in futures:
+                future.result()
         return [p.id for p in points]
 
-    def search(self, query_vector: List[float], user_id: Optional[int] = None, limit: int = 5):
+    def search(self, query_vector: List[float], user_id: Optional[int] = None, limit: int = 5,
+               oversampling: float = search_quantization_oversampling,
+               rescore: bool = search_quantization_rescore):
         """Поиск по dense-вектору с опциональной фильтрацией по пользователю"""
         from qdrant_client.models import Filter, FieldCondition, MatchValue
 
@@ -57,12 +252,14 @@ class QdrantManager:
                 must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))]
             )
 
-        return self.client.search(
+        return self.client.query_points(
             collection_name=self.collection_name,
-            query_vector=query_vector,
+            query=query_vector,
+            using="dense",
             query_filter=query_filter,
+            search_params=search_params(oversampling, rescore),
             limit=limit
-        )
+        ).points
 
     def get_document_chunks(self, content_id: int, user_id: int) -> List[Dict]:
         """Получить все чанки документа для сборки полного текста"""
@@ -75,14 +272,45 @@ class QdrantManager:
             ]
         )
 
-        hits, _ = self.client.scroll(
+        # Постранично: у длинных документов чанков больше, чем помещается в одну страницу
+        hits, offset = [], None
+        while True:
+            page, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=scroll_filter,
+                limit=1000,
+                offset=offset
+            )
+            hits.extend(page)
+            if offset is None:
+                break
+        return [{"id": h.id, "payload": h.payload} for h in hits]
+
+    def set_chunk_payloads(self, payloads: Dict[str, Dict[str, Any]]):
+        """Обновляет payload нескольких точек одним запросом, векторы не трогает"""
+        from qdrant_client.models import SetPayload, SetPayloadOperation
+
+        if not payloads:
+            return
+        self.client.batch_update_points(
             collection_name=self.collection_name,
-            scroll_filter=scroll_filter,
-            limit=100
+            update_operations=[
+                SetPayloadOperation(set_payload=SetPayload(payload=payload, points=[point_id]))
+                for point_id, payload in payloads.items()
+            ]
+        )
+
+    def delete_points(self, point_ids: List[str]):
+        """Удаляет точки одним запросом"""
+        from qdrant_client.models import PointIdsList
+
+        if not point_ids:
+            return
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=PointIdsList(points=point_ids)
         )
-        return [{"id": h.id, "payload": h.payload} for h in hits]
     
-    # В QdrantManager
     def hybrid_search(
         self,
         dense_query: List[float],
@@ -90,16 +318,29 @@ class QdrantManager:
         user_id: Optional[int] = None,
         limit: int = 5,
         dense_weight: float = 0.7,
-        sparse_weight: float = 0.3
+        sparse_weight: float = 0.3,
+        fusion: str = "rrf",
+        oversampling: float = search_quantization_oversampling,
+        rescore: bool = search_quantization_rescore
     ):
         """
-        Заглушка под гибридный поиск.
-        Пока возвращает только dense-результаты.
+        Гибридный поиск: dense + sparse (SparseEncoder.encode_query) со слиянием
+        rrf или weighted. Без sparse_query или sparse-вектора в коллекции — только dense.
         """
-        if sparse_query is None:
-            # Только dense-поиск (текущая логика)
-            return self.search(dense_query, user_id=user_id, limit=limit)
-        
-        # TODO: Реализовать комбинацию dense + sparse
-        # Например: rerank или weighted fusion
-        raise NotImplementedError("Гибридный поиск пока не реализован")
\ No newline at end of file
+        from qdrant_client.models import FieldCondition, MatchValue
+
+        query_filter = None
+        if user_id is not None:
+            query_filter = Filter(
+                must=[FieldCondition(key="user_id", match=MatchValue(value=user_id))]
+            )
+        requests = query_requests(
+            dense_query,
+            sparse_query if self.sparse_enabled else None,
+            query_filter,
+            limit,
+            fusion,
+            search_params(oversampling, rescore)
+        )
+        responses = self.client.query_batch_points(collection_name=self.collection_name, requests=requests)
+        return fuse_responses(responses, limit, dense_weight, sparse_weight)
@@ -0,0 +1,63 @@
+# app/ranking.py
+"""
+Векторизованная агрегация оценок reranker: порог, максимум по документу, top-k.
+Все функции принимают массивы, выровненные с порядком кандидатов.
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Индексы k лучших оценок по убыванию; argpartition вместо полной сортировки"""
+    if k <= 0 or len(scores) == 0:
+        return np.zeros(0, dtype=np.intp)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    # Стабильная сортировка: при равных оценках сохраняется исходный порядок кандидатов
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def best_per_group(group_ids: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Максимальная оценка в каждой группе: (уникальные group_ids, их максимумы)"""
+    if len(scores) == 0:
+        return np.zeros(0, dtype=group_ids.dtype), np.zeros(0, dtype=scores.dtype)
+    # Порядок внутри группы не важен для максимума — хватает нестабильной сортировки
+    order = np.argsort(group_ids)
+    sorted_ids = group_ids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    return sorted_ids[starts], np.maximum.reduceat(scores[order], starts)
+
+
+def rank_groups(group_ids: np.ndarray, scores: np.ndarray, threshold: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Чанки с оценкой выше threshold → лучшая оценка каждого документа → k лучших документов.
+    Возвращает (group_ids, оценки) по убыванию оценки.
+    """
+    mask = scores > threshold
+    ids, best = best_per_group(group_ids[mask], scores[mask])
+    top = top_k_indices(best, k)
+    return ids[top], best[top]
+
+
+def weighted_fusion(point_lists: list, weights: list, limit: int) -> list:
+    """
+    Слияние нескольких выдач (точек Qdrant со score) взвешенной суммой.
+    Оценки каждой выдачи приводятся к [0, 1] min-max нормировкой, отсутствие точки в выдаче — 0.
+    Возвращает точки с итоговой оценкой в score по убыванию.
+    """
+    fused, points = {}, {}
+    for found, weight in zip(point_lists, weights):
+        if not found:
+            continue
+        scores = np.array([p.score for p in found], dtype=np.float32)
+        spread = scores.max() - scores.min()
+        normalized = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+        for point, score in zip(found, normalized.tolist()):
+            fused[point.id] = fused.get(point.id, 0.0) + weight * score
+            points.setdefault(point.id, point)
+    ids = list(fused)
+    top = top_k_indices(np.array([fused[i] for i in ids], dtype=np.float32), limit)
+    return [points[ids[i]].model_copy(update={"score": fused[ids[i]]}) for i in top.tolist()]
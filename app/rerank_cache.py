@@ -0,0 +1,36 @@
+# app/rerank_cache.py
+import unicodedata
+from typing import Dict, List, Optional
+
+from app.lru_cache import LRUCache
+
+
+def normalize_query(query: str) -> str:
+    """Один и тот же запрос с разными пробелами/композицией символов — один ключ"""
+    return " ".join(unicodedata.normalize("NFC", query).split())
+
+
+class RerankScoreCache:
+    """
+    LRU-кэш оценок cross-encoder по (нормализованный запрос, хеш текста чанка).
+
+    Текст чанка входит в ключ через хеш, поэтому изменённый чанк
+    автоматически получает новый ключ, а устаревшие оценки вытесняются LRU.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.memory = LRUCache(max_entries)
+
+    @staticmethod
+    def key(query: str, doc_hash: str) -> str:
+        return f"{doc_hash}\x00{query}"
+
+    def get_many(self, keys: List[str]) -> List[Optional[float]]:
+        return [self.memory.get(key) for key in keys]
+
+    def put_many(self, keys: List[str], scores):
+        for key, score in zip(keys, scores):
+            self.memory.put(key, float(score))
+
+    def stats(self) -> Dict[str, object]:
+        return self.memory.stats()
@@ -1,25 +1,74 @@
 # app/reranker.py
-from sentence_transformers import CrossEncoder
+from typing import List, Optional
+import numpy as np
 from app.settings.models import *
+from app.settings.backend_settings import reranker_backend
+from app.settings.reranker_settings import *
+from app.inference_backends import create_rerank_backend
+from app.chunker import chunk_hash
+from app.rerank_cache import RerankScoreCache, normalize_query
+from app.executors import cpu_executor
 import os
 
 
 class Reranker:
-    def __init__(self):
-        print("🔍 Загружаем модель reranking...")
+    def __init__(self, backend: str = reranker_backend, cache: bool = rerank_cache_enabled,
+                 model_name: str = reranked_model):
+        print(f"🔍 Загружаем модель reranking {model_name} (бэкенд {backend})...")
         # Для мультиязычного reranking (включая русский)
-        self.model = CrossEncoder(
-            reranked_model,
-            max_length=512
-        )
+        self.model_name = model_name
+        self.backend = create_rerank_backend(backend, model_name)
         print("✅ Модель reranking загружена")
+        self.cache = RerankScoreCache(rerank_cache_max_entries) if cache else None
+
+    def _predict(self, pairs: List[tuple]) -> np.ndarray:
+        # Прогон модели — в общем ограниченном пуле вместе с эмбеддингами
+        return cpu_executor.call(self.backend.predict, pairs, batch_size=32)
+
+    def score(self, query: str, documents: List[str], doc_hashes: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Оценки cross-encoder в порядке documents.
+        doc_hashes — готовые хеши текстов (chunk_hash из payload), иначе считаются здесь.
+        В модель уходят только пары, которых нет в кэше.
+        """
+        return self.score_pairs([query] * len(documents), documents, doc_hashes)
+
+    def score_pairs(self, queries: List[str], documents: List[str], doc_hashes: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Как score, но у каждого документа свой запрос: пары нескольких поисков
+        прогоняются через модель общими батчами.
+        """
+        if not documents:
+            return np.zeros(0, dtype=np.float32)
+        normalized = {q: normalize_query(q) for q in set(queries)}
+        queries = [normalized[q] for q in queries]
+        if self.cache is None:
+            return self._predict(list(zip(queries, documents))).astype(np.float32, copy=False)
+
+        if doc_hashes is None:
+            doc_hashes = [chunk_hash(doc) for doc in documents]
+        keys = [self.cache.key(q, h) for q, h in zip(queries, doc_hashes)]
+        cached = self.cache.get_many(keys)
+        scores = np.array([np.nan if s is None else s for s in cached], dtype=np.float32)
+
+        # Повторы одной пары среди кандидатов — один прогон
+        miss_positions = {}
+        for i, score in enumerate(cached):
+            if score is None:
+                miss_positions.setdefault(keys[i], []).append(i)
+        if miss_positions:
+            miss_keys = list(miss_positions)
+            computed = self._predict([(queries[miss_positions[k][0]], documents[miss_positions[k][0]]) for k in miss_keys])
+            self.cache.put_many(miss_keys, computed)
+            for key, score in zip(miss_keys, computed):
+                scores[miss_positions[key]] = score
+        return scores
 
     def rerank(self, query: str, documents: list[str], top_k: int = None) -> list[tuple[float, str]]:
         if not documents:
             return []
         
-        pairs = [(query, doc) for doc in documents]
-        scores = self.model.predict(pairs, batch_size=32)
+        scores = self.score(query, documents)
         
         # Конвертируем numpy.float32 → float
         scored_docs = [(float(score), doc) for score, doc in zip(scores, documents)]
@@ -28,4 +77,4 @@ class Reranker:
         if top_k:
             scored_docs = scored_docs[:top_k]
             
-        return scored_docs
\ No newline at end of file
+        return scored_docs
@@ -0,0 +1,167 @@
+# app/search_cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.lru_cache import LRUCache
+from app.rerank_cache import normalize_query
+
+
+class MemorySearchStore:
+    """Результаты и поколения в памяти процесса: LRU по числу записей"""
+
+    def __init__(self, max_entries: int):
+        self.results = LRUCache(max_entries)
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        return self.results.get(key)
+
+    def put(self, key: str, expires_at: float, results: List[dict]):
+        self.results.put(key, (expires_at, results))
+
+    def generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, 0)
+
+    def bump(self, user_id: int):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def size(self) -> int:
+        return len(self.results)
+
+
+class SqliteSearchStore:
+    """
+    Результаты и поколения в файле SQLite: один кэш на все процессы uvicorn хоста.
+    Запись после сохранения документа в любом воркере сразу видна остальным.
+    Лишние записи сверх max_entries удаляются пачкой, самые старые по времени записи.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._puts = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_results (
+                    key TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL,
+                    stored_at REAL NOT NULL,
+                    results TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_search_results_stored ON search_results(stored_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_generations (
+                    user_id INTEGER PRIMARY KEY,
+                    generation INTEGER NOT NULL
+                )
+            """)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3-соединение нельзя делить между потоками — своё на каждый поток
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        row = self._connection().execute(
+            "SELECT expires_at, results FROM search_results WHERE key = ?", (key,)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put(self, key: str, expires_at: float, results: List[dict]):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_results (key, expires_at, stored_at, results) VALUES (?, ?, ?, ?)",
+                (key, expires_at, time.time(), json.dumps(results, ensure_ascii=False, default=str))
+            )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                conn.execute("DELETE FROM search_results WHERE expires_at < ?", (time.time(),))
+                conn.execute("""
+                    DELETE FROM search_results WHERE key IN (
+                        SELECT key FROM search_results ORDER BY stored_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+
+    def generation(self, user_id: int) -> int:
+        row = self._connection().execute(
+            "SELECT generation FROM search_generations WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, user_id: int):
+        with self._connection() as conn:
+            conn.execute("""
+                INSERT INTO search_generations (user_id, generation) VALUES (?, 1)
+                ON CONFLICT(user_id) DO UPDATE SET generation = generation + 1
+            """, (user_id,))
+
+    def size(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM search_results").fetchone()[0]
+
+
+class SearchResultCache:
+    """
+    Кэш результатов поиска по (user_id, нормализованный запрос, cluster_label, limit).
+
+    В ключ входит поколение пользователя: сохранение, обновление документа и
+    кластеризация увеличивают его (bump), и все прежние результаты пользователя
+    перестают находиться, а вытесняются уже по LRU/TTL. Ключ берётся до поиска,
+    поэтому результат, посчитанный одновременно с записью, ляжет под старое поколение.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300, path: str = ""):
+        if max_entries <= 0:
+            raise ValueError("max_entries должен быть > 0")
+        self.ttl_seconds = ttl_seconds
+        self.store = SqliteSearchStore(path, max_entries) if path else MemorySearchStore(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def key(self, user_id: int, query: str, cluster_label: Optional[str], limit: int,
+            include_text: bool = False) -> str:
+        generation = self.store.generation(user_id)
+        return json.dumps([user_id, generation, cluster_label, limit, include_text, normalize_query(query)],
+                          ensure_ascii=False)
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        entry = self.store.get(key)
+        if entry is not None and entry[0] < time.time():
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Копии: вызывающий может дописывать поля в результаты
+        return [dict(doc) for doc in entry[1]]
+
+    def put(self, key: str, results: List[dict]):
+        self.store.put(key, time.time() + self.ttl_seconds, [dict(doc) for doc in results])
+
+    def bump(self, user_id: int):
+        self.store.bump(user_id)
+
+    def stats(self) -> Dict[str, object]:
+        total = self.hits + self.misses
+        return {
+            "backend": "sqlite" if isinstance(self.store, SqliteSearchStore) else "memory",
+            "size": self.store.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,85 @@
+# app/serialization.py
+"""
+Компактные форматы ответа для матриц эмбеддингов.
+
+- json + encoding_format="base64": матрица little-endian float32/float16 в base64
+- application/octet-stream: 20-байтовый заголовок + матрица + JSON-метаданные
+- application/x-npy: стандартный .npy (np.load читает напрямую)
+
+Заголовок octet-stream (little-endian):
+    magic  4s  b"EMB1"
+    dtype  B   0 — float32, 1 — float16
+    pad    3x
+    rows   I
+    dim    I
+    meta   I   длина JSON-метаданных после матрицы (0 — нет)
+"""
+import base64
+import io
+import json
+import struct
+from typing import Any, Dict, Literal, Optional, Tuple
+
+import numpy as np
+
+OCTET_STREAM = "application/octet-stream"
+NPY = "application/x-npy"
+
+HEADER = struct.Struct("<4sB3xIII")
+MAGIC = b"EMB1"
+DTYPES = {"float32": ("<f4", 0), "float16": ("<f2", 1)}
+
+Format = Literal["json", "base64", "octet-stream", "npy"]
+
+
+def negotiate_format(accept: Optional[str], encoding_format: str = "float") -> Format:
+    """Бинарный формат выбирается по Accept, base64 — полем encoding_format"""
+    if accept:
+        accepted = [part.split(";")[0].strip() for part in accept.split(",")]
+        if NPY in accepted:
+            return "npy"
+        if OCTET_STREAM in accepted:
+            return "octet-stream"
+    return "base64" if encoding_format == "base64" else "json"
+
+
+def to_little_endian(matrix: np.ndarray, dtype: str = "float32") -> np.ndarray:
+    if dtype not in DTYPES:
+        raise ValueError(f"Неподдерживаемый dtype: {dtype}")
+    matrix = np.asarray(matrix)
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(len(matrix), -1)
+    return np.ascontiguousarray(matrix, dtype=DTYPES[dtype][0])
+
+
+def encode_base64(matrix: np.ndarray, dtype: str = "float32") -> str:
+    return base64.b64encode(to_little_endian(matrix, dtype).tobytes()).decode("ascii")
+
+
+def decode_base64(data: str, dim: int, dtype: str = "float32") -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=DTYPES[dtype][0]).reshape(-1, dim)
+
+
+def encode_octet_stream(matrix: np.ndarray, dtype: str = "float32", meta: Optional[Dict[str, Any]] = None) -> bytes:
+    packed = to_little_endian(matrix, dtype)
+    meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8") if meta else b""
+    rows, dim = packed.shape
+    header = HEADER.pack(MAGIC, DTYPES[dtype][1], rows, dim, len(meta_bytes))
+    return b"".join([header, packed.tobytes(), meta_bytes])
+
+
+def decode_octet_stream(body: bytes) -> Tuple[np.ndarray, Optional[Dict[str, Any]]]:
+    magic, dtype_code, rows, dim, meta_len = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError("Неверная сигнатура бинарного ответа")
+    dtype = "<f4" if dtype_code == 0 else "<f2"
+    size = rows * dim * np.dtype(dtype).itemsize
+    matrix = np.frombuffer(body, dtype=dtype, count=rows * dim, offset=HEADER.size).reshape(rows, dim)
+    meta = json.loads(body[HEADER.size + size:HEADER.size + size + meta_len]) if meta_len else None
+    return matrix, meta
+
+
+def encode_npy(matrix: np.ndarray, dtype: str = "float32") -> bytes:
+    buffer = io.BytesIO()
+    np.lib.format.write_array(buffer, to_little_endian(matrix, dtype), allow_pickle=False)
+    return buffer.getvalue()
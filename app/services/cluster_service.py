@@ -1,14 +1,17 @@
 # app/services/cluster_service.py
-from typing import Dict
+from typing import Dict, Optional
 from app.qdrant_manager import QdrantManager
 from app.postgres_processor import PostgresProcessor
 from app.cluster_utils import cluster_chunks_umap_hdbscan
+from app.search_cache import SearchResultCache
 from qdrant_client.models import Filter, FieldCondition, MatchValue
 
 class ClusterService:
-    def __init__(self, qdrant_manager: QdrantManager, postgres_processor: PostgresProcessor):
+    def __init__(self, qdrant_manager: QdrantManager, postgres_processor: PostgresProcessor,
+                 search_cache: Optional[SearchResultCache] = None):
         self.qdrant_manager = qdrant_manager
         self.postgres_processor = postgres_processor
+        self.search_cache = search_cache
 
     def clusterize_user(self, user_id: int) -> Dict[str, int]:
         """Кластеризует чанки пользователя и сохраняет результаты"""
@@ -48,4 +51,8 @@ class ClusterService:
                 points=[point_ids[i]]
             )
 
+        # Метки кластеров изменились — поиск с cluster_label должен видеть новые
+        if self.search_cache is not None:
+            self.search_cache.bump(user_id)
+
         return {"status": "success", "clusters_found": len(centroids_dict)}
\ No newline at end of file
@@ -1,4 +1,5 @@
 # app/services/document_service.py
+from typing import Any, Dict, List
 from app.content_processor import ContentProcessor
 from app.qdrant_manager import QdrantManager
 
@@ -8,14 +9,41 @@ class DocumentService:
         self.qdrant_manager = qdrant_manager
 
     def save_document(self, text: str, user_id: int, chunk_size: int = 1500, 
-                     overlap: int = 40, url: str = "", header: str = ""):
+                     overlap: int = 40, url: str = "", header: str = "", chunk_unit: str = "chars"):
         """Сохраняет документ и его чанки"""
         return self.content_processor.process_and_save(
             text=text,
             qdrant_manager=self.qdrant_manager,
             chunk_size=chunk_size,
             overlap=overlap,
+            chunk_unit=chunk_unit,
             user_id=user_id,
             url=url,
             header=header
-        )
\ No newline at end of file
+        )
+
+    def update_document(self, content_id: int, text: str, user_id: int, chunk_size: int = 1500,
+                        overlap: int = 40, url: str = "", header: str = "", chunk_unit: str = "chars"):
+        """Обновляет документ, эмбеддя только изменившиеся чанки"""
+        return self.content_processor.update_document(
+            content_id=content_id,
+            text=text,
+            qdrant_manager=self.qdrant_manager,
+            chunk_size=chunk_size,
+            overlap=overlap,
+            chunk_unit=chunk_unit,
+            user_id=user_id,
+            url=url,
+            header=header
+        )
+
+    def save_documents(self, documents: List[Dict[str, Any]], chunk_size: int = 1500, overlap: int = 40,
+                       chunk_unit: str = "chars") -> Dict[str, Any]:
+        """Сохраняет пакет документов (text, user_id, url, header): общие эмбеддинги, COPY и пачки точек"""
+        return self.content_processor.process_and_save_batch(
+            documents=documents,
+            qdrant_manager=self.qdrant_manager,
+            chunk_size=chunk_size,
+            overlap=overlap,
+            chunk_unit=chunk_unit
+        )
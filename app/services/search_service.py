@@ -1,69 +1,278 @@
 # app/services/search_service.py
-from typing import List, Optional
+import math
+from collections import defaultdict
+from typing import List, Optional, Tuple
+import numpy as np
 from app.reranker import Reranker
-from app.qdrant_manager import QdrantManager
+from app.qdrant_manager import QdrantManager, fuse_responses, query_requests, search_params
 from app.postgres_processor import PostgresProcessor
 from app.embedder import Embedder
+from app.executors import StageExecutor
+from app.ranking import rank_groups
+from app.sparse_encoder import SparseEncoder
+from app.search_cache import SearchResultCache
+from app.snippets import highlight_snippet
+from app.settings.search_settings import *
 from qdrant_client.models import Filter, FieldCondition, MatchValue
 
 class SearchService:
     def __init__(self, embedder: Embedder, reranker: Reranker, 
-                 qdrant_manager: QdrantManager, postgres_processor: PostgresProcessor):
+                 qdrant_manager: QdrantManager, postgres_processor: PostgresProcessor,
+                 first_pass_reranker: Optional[Reranker] = None,
+                 candidates_per_result: int = search_candidates_per_result,
+                 min_candidates: int = search_min_candidates,
+                 max_candidates: int = search_max_candidates,
+                 dense_max_gap: float = search_dense_max_gap,
+                 first_pass_per_result: int = search_first_pass_per_result,
+                 rerank_threshold: float = search_rerank_threshold,
+                 sparse_encoder: Optional[SparseEncoder] = None,
+                 fusion: str = search_fusion,
+                 dense_weight: float = search_dense_weight,
+                 sparse_weight: float = search_sparse_weight,
+                 search_cache: Optional[SearchResultCache] = None,
+                 group_size: int = search_group_size,
+                 group_parallel: int = search_group_parallel,
+                 snippets_per_result: int = search_snippets_per_result,
+                 snippet_chars: int = search_snippet_chars,
+                 highlight_tags: Tuple[str, str] = search_highlight_tags,
+                 oversampling: float = search_quantization_oversampling,
+                 rescore: bool = search_quantization_rescore):
         self.embedder = embedder
         self.reranker = reranker
         self.qdrant_manager = qdrant_manager
         self.postgres_processor = postgres_processor
+        self.first_pass_reranker = first_pass_reranker
+        self.candidates_per_result = candidates_per_result
+        self.min_candidates = min_candidates
+        self.max_candidates = max_candidates
+        self.dense_max_gap = dense_max_gap
+        self.first_pass_per_result = first_pass_per_result
+        self.rerank_threshold = rerank_threshold
+        self.sparse_encoder = sparse_encoder
+        self.fusion = fusion
+        self.dense_weight = dense_weight
+        self.sparse_weight = sparse_weight
+        self.search_cache = search_cache
+        self.group_size = group_size
+        # Отдельный пул: search_batch сам выполняется в io-пуле, вложенные задачи туда могли бы ждать друг друга
+        self.group_executor = StageExecutor("search-groups", group_parallel)
+        self.snippets_per_result = snippets_per_result
+        self.snippet_chars = snippet_chars
+        self.highlight_tags = highlight_tags
+        # Нормализация слов для подсветки — та же, что у sparse-векторов
+        self.term_encoder = sparse_encoder or SparseEncoder()
+        # Поиск по квантованным векторам коллекции, если квантизация включена
+        self.search_params = search_params(oversampling, rescore)
 
-    def search(self, user_id: int, query: str, cluster_label: Optional[str] = None, limit: int = 5) -> List[dict]:
+    def candidate_budget(self, limit: int) -> int:
+        """Сколько чанков брать из Qdrant: пропорционально limit, в пределах [min, max]"""
+        return max(self.min_candidates, min(self.max_candidates, limit * self.candidates_per_result))
+
+    def _fusion(self) -> str:
+        """Гибридный поиск — если есть кодировщик запросов и sparse-вектор в коллекции"""
+        if self.sparse_encoder is not None and self.qdrant_manager.sparse_enabled:
+            return self.fusion
+        return "dense"
+
+    def _dense_cutoff(self, chunks: list, limit: int) -> list:
+        """Отсекает кандидатов, чей dense-скор отстаёт от лучшего больше чем на dense_max_gap"""
+        if self.dense_max_gap <= 0 or len(chunks) <= limit:
+            return chunks
+        # Qdrant отдаёт точки по убыванию score
+        floor = chunks[0].score - self.dense_max_gap
+        keep = max(limit, sum(1 for chunk in chunks if chunk.score >= floor))
+        return chunks[:keep]
+
+    @staticmethod
+    def _chunk_hashes(chunks: list) -> Optional[List[str]]:
+        """chunk_hash из payload; у старых точек его нет — тогда хеши посчитает reranker"""
+        hashes = [chunk.payload.get("chunk_hash") for chunk in chunks]
+        return None if None in hashes else hashes
+
+    def _score_groups(self, reranker: Reranker, queries: List[str], groups: List[list]) -> List[np.ndarray]:
+        """Оценки кандидатов всех поисков одним вызовом reranker: общие батчи cross-encoder"""
+        chunks = [chunk for group in groups for chunk in group]
+        scores = reranker.score_pairs(
+            [query for query, group in zip(queries, groups) for _ in group],
+            [chunk.payload["chunk_text"] for chunk in chunks],
+            doc_hashes=self._chunk_hashes(chunks)
+        )
+        return np.split(scores, np.cumsum([len(group) for group in groups])[:-1])
+
+    def _first_pass(self, queries: List[str], groups: List[list], limits: List[int]) -> List[list]:
+        """Лёгкий cross-encoder оставляет limit * first_pass_per_result лучших кандидатов в исходном порядке"""
+        keeps = [max(limit, limit * self.first_pass_per_result) for limit in limits]
+        todo = [i for i, group in enumerate(groups) if len(group) > keeps[i]]
+        if self.first_pass_reranker is None or not todo:
+            return groups
+        groups = list(groups)
+        scored = self._score_groups(self.first_pass_reranker, [queries[i] for i in todo], [groups[i] for i in todo])
+        for i, scores in zip(todo, scored):
+            best = np.sort(np.argpartition(-scores, keeps[i] - 1)[:keeps[i]])
+            groups[i] = [groups[i][j] for j in best]
+        return groups
+
+    def search(self, user_id: int, query: str, cluster_label: Optional[str] = None, limit: int = 5,
+               include_text: bool = False) -> List[dict]:
         """Выполняет семантический поиск по документам пользователя"""
-        query_embedding = self.embedder.embed([query], "query")[0]
-        
-        must_conditions = [FieldCondition(key="user_id", match=MatchValue(value=user_id))]
-        if cluster_label is not None:
-            must_conditions.append(FieldCondition(key="cluster_label", match=MatchValue(value=cluster_label)))
-        search_filter = Filter(must=must_conditions)
-        
-        all_chunks = self.qdrant_manager.client.query_points(
-            collection_name="content_chunks",
-            query=query_embedding,
-            using="dense",
-            query_filter=search_filter,
-            limit=1000
-        ).points
-        
-        if not all_chunks:
-            return []
-        
-        chunk_texts = [chunk.payload["chunk_text"] for chunk in all_chunks]
-        reranked_pairs = self.reranker.rerank(query, chunk_texts, top_k=None)
-        rerank_scores = [float(score) for score, _ in reranked_pairs]
-        
-        RERANK_THRESHOLD = 0.15
-        relevant_chunks = []
-        relevant_scores = []
-        for i, chunk in enumerate(all_chunks):
-            score = rerank_scores[i]
-            if score > RERANK_THRESHOLD:
-                relevant_chunks.append(chunk)
-                relevant_scores.append(score)
-        
-        if not relevant_chunks:
+        return self.search_batch([{"user_id": user_id, "query": query, "cluster_label": cluster_label,
+                                   "limit": limit, "include_text": include_text}])[0]
+
+    def search_batch(self, searches: List[dict]) -> List[List[dict]]:
+        """
+        Несколько поисков за раз (ключи как у search): один прогон эмбеддера,
+        один батч-запрос в Qdrant (с группировкой — параллельные запросы),
+        общие батчи reranker и один SQL-запрос
+        (только для поисков с include_text — остальным хватает сниппетов из payload).
+        Результаты — в порядке searches; найденные в кэше поиски не выполняются.
+        """
+        if not searches:
             return []
+        if self.search_cache is None:
+            return self._search_uncached(searches)
+
+        keys = [
+            self.search_cache.key(s["user_id"], s["query"], s.get("cluster_label"), s.get("limit", 5),
+                                  s.get("include_text", False))
+            for s in searches
+        ]
+        results = [self.search_cache.get(key) for key in keys]
+        misses = [i for i, found in enumerate(results) if found is None]
+        if misses:
+            for i, found in zip(misses, self._search_uncached([searches[i] for i in misses])):
+                self.search_cache.put(keys[i], found)
+                results[i] = found
+        return results
+
+    def _candidates(self, searches: List[dict], limits: List[int], fusion: str) -> List[list]:
+        """Чанки-кандидаты каждого поиска, по убыванию score Qdrant"""
+        query_embeddings = self.embedder.embed_array([s["query"] for s in searches], "query")
+        # У поиска один запрос (dense, rrf) или два (weighted)
+        requests = []
+        for s, limit, query_embedding in zip(searches, limits, query_embeddings):
+            must_conditions = [FieldCondition(key="user_id", match=MatchValue(value=s["user_id"]))]
+            if s.get("cluster_label") is not None:
+                must_conditions.append(FieldCondition(key="cluster_label", match=MatchValue(value=s["cluster_label"])))
+            requests.append(query_requests(
+                query_embedding.tolist(),
+                self.sparse_encoder.encode_query(s["query"]) if fusion != "dense" else None,
+                Filter(must=must_conditions),
+                self.candidate_budget(limit),
+                fusion,
+                self.search_params
+            ))
+
+        if self.group_size > 0 and fusion != "weighted":
+            if len(requests) == 1:
+                return [self._grouped_candidates(requests[0][0], limits[0])]
+            # Батч-версии нет — запросы пакета уходят в Qdrant одновременно
+            futures = [self.group_executor.submit(self._grouped_candidates, search_requests[0], limit)
+                       for search_requests, limit in zip(requests, limits)]
+            return [future.result() for future in futures]
+
+        # Без группировки — все запросы в одном батче
+        responses = self.qdrant_manager.client.query_batch_points(
+            collection_name=self.qdrant_manager.collection_name,
+            requests=[request for search_requests in requests for request in search_requests]
+        )
+        groups, position = [], 0
+        for search_requests, limit in zip(requests, limits):
+            count = len(search_requests)
+            groups.append(fuse_responses(responses[position:position + count], self.candidate_budget(limit),
+                                         self.dense_weight, self.sparse_weight))
+            position += count
+        return groups
+
+    def _grouped_candidates(self, request, limit: int) -> list:
+        """
+        Группировка по content_id в Qdrant: не больше group_size лучших чанков
+        на документ, поэтому один длинный документ не вытесняет остальные из бюджета.
+        Батч-версии query_points_groups нет — по запросу на поиск, в пакете параллельно.
+        """
+        response = self.qdrant_manager.client.query_points_groups(
+            collection_name=self.qdrant_manager.collection_name,
+            group_by="content_id",
+            query=request.query,
+            using=request.using,
+            prefetch=request.prefetch,
+            query_filter=request.filter,
+            search_params=request.params,
+            limit=math.ceil(self.candidate_budget(limit) / self.group_size),
+            group_size=self.group_size,
+            with_payload=True
+        )
+        chunks = [hit for group in response.groups for hit in group.hits]
+        # Группы упорядочены по лучшему чанку — восстанавливаем общий порядок по score
+        return sorted(chunks, key=lambda chunk: -chunk.score)
+
+    def _snippets(self, query: str, chunks: List[tuple]) -> List[dict]:
+        """Подсвеченные фрагменты лучших чанков документа: (score, chunk) по убыванию score"""
+        snippets = []
+        for score, chunk in chunks[:self.snippets_per_result]:
+            payload = chunk.payload
+            snippets.append({
+                "text": highlight_snippet(payload["chunk_text"], query, self.term_encoder.terms,
+                                          self.snippet_chars, self.highlight_tags),
+                "start": payload.get("chunk_start"),
+                "end": payload.get("chunk_end"),
+                "score": score
+            })
+        return snippets
+
+    def _search_uncached(self, searches: List[dict]) -> List[List[dict]]:
+        queries = [s["query"] for s in searches]
+        limits = [s.get("limit", 5) for s in searches]
+        fusion = self._fusion()
+        groups = self._candidates(searches, limits, fusion)
+        # Отсечка по отставанию имеет смысл только для dense-скоров
+        if fusion == "dense":
+            groups = [self._dense_cutoff(group, limit) for group, limit in zip(groups, limits)]
+        groups = self._first_pass(queries, groups, limits)
+        # Оценки в порядке кандидатов каждого поиска
+        scored = self._score_groups(self.reranker, queries, groups)
         
-        relevant_content_ids = list(set(int(chunk.payload["content_id"]) for chunk in relevant_chunks))
-        documents = self.postgres_processor.get_documents_by_content_ids(relevant_content_ids, user_id)
-        
-        content_id_to_best_score = {}
-        for i, chunk in enumerate(relevant_chunks):
-            content_id = int(chunk.payload["content_id"])
-            current_score = relevant_scores[i]
-            if content_id not in content_id_to_best_score or current_score > content_id_to_best_score[content_id]:
-                content_id_to_best_score[content_id] = current_score
+        ranked = []
+        for group, scores, limit in zip(groups, scored, limits):
+            content_ids = np.array([chunk.payload["content_id"] for chunk in group], dtype=np.int64)
+            ranked.append(rank_groups(content_ids, scores, self.rerank_threshold, limit))
         
-        results_with_score = []
-        for doc in documents:
-            doc["rerank_score"] = content_id_to_best_score.get(doc["content_id"], 0.0)
-            results_with_score.append(doc)
+        # Из PostgreSQL — только документы из выдачи поисков с include_text, сразу для всех
+        keys = {
+            (content_id, s["user_id"])
+            for s, (top_ids, _) in zip(searches, ranked) if s.get("include_text")
+            for content_id in top_ids.tolist()
+        }
+        documents = {}
+        if keys:
+            documents = {(doc["content_id"], doc["user_id"]): doc
+                         for doc in self.postgres_processor.get_documents_by_keys(list(keys))}
         
-        results_with_score.sort(key=lambda x: x["rerank_score"], reverse=True)
-        return results_with_score[:limit]
\ No newline at end of file
+        results = []
+        for s, group, scores, (top_ids, top_scores) in zip(searches, groups, scored, ranked):
+            # Лучшие чанки каждого документа выдачи — для сниппетов
+            best_chunks = defaultdict(list)
+            top = set(top_ids.tolist())
+            for chunk, score in zip(group, scores.tolist()):
+                content_id = chunk.payload["content_id"]
+                if content_id in top and score > self.rerank_threshold:
+                    best_chunks[content_id].append((score, chunk))
+            found = []
+            for content_id, score in zip(top_ids.tolist(), top_scores.tolist()):
+                chunks = sorted(best_chunks[content_id], key=lambda item: -item[0])
+                if s.get("include_text"):
+                    doc = documents.get((content_id, s["user_id"]))
+                    if doc is None:
+                        continue
+                else:
+                    # url, header и document_id есть в payload каждого чанка
+                    payload = chunks[0][1].payload
+                    doc = {
+                        "content_id": content_id,
+                        "user_id": s["user_id"],
+                        "url": payload.get("url", ""),
+                        "header": payload.get("header", ""),
+                        "document_id": payload.get("document_id")
+                    }
+                found.append({**doc, "rerank_score": score, "snippets": self._snippets(s["query"], chunks)})
+            results.append(found)
+        return results
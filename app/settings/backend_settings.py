@@ -0,0 +1,15 @@
+import os
+
+# Бэкенд инференса: torch | onnx | onnx-int8 | pool
+embedder_backend = os.environ.get("EMBEDDER_BACKEND", "torch")
+reranker_backend = os.environ.get("RERANKER_BACKEND", "torch")
+
+# Каталог для экспортированных/квантованных ONNX-артефактов
+onnx_cache_dir = os.environ.get("ONNX_CACHE_DIR", os.path.expanduser("~/.cache/embedding-api/onnx"))
+onnx_intra_op_threads = int(os.environ.get("ONNX_INTRA_OP_THREADS", 0))  # 0 — по числу ядер
+onnx_opset = int(os.environ.get("ONNX_OPSET", 17))
+
+# Бэкенд pool: пул процессов с общими (memory-mapped) весами
+inference_pool_threads = int(os.environ.get("INFERENCE_POOL_THREADS", 2))
+inference_pool_workers = int(os.environ.get("INFERENCE_POOL_WORKERS", max(1, (os.cpu_count() or 1) // inference_pool_threads)))
+shared_weights_dir = os.environ.get("SHARED_WEIGHTS_DIR", os.path.expanduser("~/.cache/embedding-api/weights"))
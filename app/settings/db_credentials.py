@@ -24,4 +24,12 @@ postgres_host = os.environ.get("POSTGRES_HOST", "localhost")
 postgres_port = int(os.environ.get("POSTGRES_PORT", 5432))
 postgres_db = os.environ.get("POSTGRES_DB", "myapp_db")
 postgres_user = os.environ.get("POSTGRES_USER", "myapp")
-postgres_password = os.environ.get("POSTGRES_PASSWORD", "mysecretpassword")
\ No newline at end of file
+postgres_password = os.environ.get("POSTGRES_PASSWORD", "mysecretpassword")
+
+# Пул соединений PostgreSQL (app/pg_pool.py): соединения открываются заранее (min)
+# и по мере надобности (до max); больше max — ожидание свободного не дольше timeout секунд
+postgres_pool_min_size = int(os.environ.get("POSTGRES_POOL_MIN_SIZE", 1))
+postgres_pool_max_size = int(os.environ.get("POSTGRES_POOL_MAX_SIZE", 16))
+postgres_pool_timeout = float(os.environ.get("POSTGRES_POOL_TIMEOUT", 10))
+# Соединение, простаивавшее дольше, перед выдачей проверяется SELECT 1
+postgres_pool_health_check_idle = float(os.environ.get("POSTGRES_POOL_HEALTH_CHECK_IDLE", 30))
@@ -0,0 +1,27 @@
+import os
+
+# Микро-батчинг: объединяем embed-вызовы от разных запросов в один encode
+embed_batching_enabled = os.environ.get("EMBED_BATCHING_ENABLED", "1") == "1"
+embed_max_batch_size = int(os.environ.get("EMBED_MAX_BATCH_SIZE", 64))
+embed_max_wait_ms = float(os.environ.get("EMBED_MAX_WAIT_MS", 5))
+
+# Кэш эмбеддингов: LRU в памяти + опциональный memmap на диске (пустой путь — выключен)
+embed_cache_enabled = os.environ.get("EMBED_CACHE_ENABLED", "1") == "1"
+embed_cache_max_entries = int(os.environ.get("EMBED_CACHE_MAX_ENTRIES", 20000))
+embed_cache_disk_path = os.environ.get("EMBED_CACHE_DISK_PATH", "")
+embed_cache_disk_capacity = int(os.environ.get("EMBED_CACHE_DISK_CAPACITY", 1_000_000))
+
+# Батчи внутри encode: сортировка по длине и бюджет токенов с учётом паддинга
+embed_max_batch_tokens = int(os.environ.get("EMBED_MAX_BATCH_TOKENS", 8192))
+embed_encode_batch_size = int(os.environ.get("EMBED_ENCODE_BATCH_SIZE", 128))
+
+# Потоковый /embed/stream: текстов в одном батче ответа
+embed_stream_batch_size = int(os.environ.get("EMBED_STREAM_BATCH_SIZE", 256))
+# Потоковый /chunk-embed/stream: чанков в одном батче эмбеддинга
+chunk_stream_batch_size = int(os.environ.get("CHUNK_STREAM_BATCH_SIZE", 32))
+
+# Размерность векторов в Qdrant: 0 — исходная размерность модели.
+# truncate — обрезка + нормализация, pca — проекция из EMBEDDING_PCA_PATH (app/dim_reduction.py)
+embedding_dim = int(os.environ.get("EMBEDDING_DIM", 0))
+embedding_reduction = os.environ.get("EMBEDDING_REDUCTION", "truncate")
+embedding_pca_path = os.environ.get("EMBEDDING_PCA_PATH", "")
@@ -0,0 +1,9 @@
+import os
+
+# Пакетная загрузка документов: /save-content/batch
+ingest_batch_max_documents = int(os.environ.get("INGEST_BATCH_MAX_DOCUMENTS", 1000))
+
+# Чанкинг пакета в процессах (chunk_unit=chars): сколько процессов (0 или 1 — в текущем потоке)
+# и с какого суммарного объёма текста пакета их стоит задействовать
+ingest_chunk_workers = int(os.environ.get("INGEST_CHUNK_WORKERS", min(4, os.cpu_count() or 1)))
+ingest_parallel_chunk_min_chars = int(os.environ.get("INGEST_PARALLEL_CHUNK_MIN_CHARS", 200000))
@@ -1,4 +1,11 @@
 # transformer_model_name = 'intfloat/e5-small-v2'
 transformer_model_name = 'intfloat/multilingual-e5-small'
 llm_model_name = "Qwen/Qwen1.5-1.8B-Chat"
-reranked_model = "BAAI/bge-reranker-v2-m3"
\ No newline at end of file
+reranked_model = "BAAI/bge-reranker-v2-m3"
+
+# Пулинг и длина входа e5 — нужны бэкендам, которые работают без SentenceTransformer
+embedding_pooling = "mean"
+embedding_max_seq_length = 512
+reranker_max_length = 512
+# Исходная размерность transformer_model_name (e5-small) — для создания коллекции до загрузки модели
+embedding_native_dim = 384
@@ -0,0 +1,30 @@
+import os
+
+# Payload чанков (chunk_text и метаданные) хранится на диске: в RAM — векторы и индексы.
+# Для существующей коллекции применяется к новым сегментам после оптимизации
+qdrant_on_disk_payload = os.environ.get("QDRANT_ON_DISK_PAYLOAD", "1") == "1"
+
+# HNSW: связей на вершину и ширина поиска при построении графа.
+# QDRANT_HNSW_M=0 — без общего графа, только подграфы по user_id (все поиски идут с фильтром)
+qdrant_hnsw_m = int(os.environ.get("QDRANT_HNSW_M", 16))
+qdrant_hnsw_ef_construct = int(os.environ.get("QDRANT_HNSW_EF_CONSTRUCT", 100))
+# Связи подграфов по значениям индексированных полей: быстрый поиск внутри одного пользователя
+qdrant_hnsw_payload_m = int(os.environ.get("QDRANT_HNSW_PAYLOAD_M", 16))
+qdrant_hnsw_on_disk = os.environ.get("QDRANT_HNSW_ON_DISK", "0") == "1"
+
+# Сегменты: число сегментов (0 — по числу ядер) и порог в КБ, после которого сегмент индексируется
+qdrant_default_segment_number = int(os.environ.get("QDRANT_DEFAULT_SEGMENT_NUMBER", 0))
+qdrant_indexing_threshold_kb = int(os.environ.get("QDRANT_INDEXING_THRESHOLD_KB", 20000))
+
+# Квантизация dense-векторов: "" — выключена, scalar — int8 (в 4 раза меньше памяти),
+# binary — 1 бит на координату (в 32 раза; для моделей с большой размерностью)
+qdrant_quantization = os.environ.get("QDRANT_QUANTIZATION", "")
+# Квантиль отсечения выбросов при scalar-квантизации
+qdrant_scalar_quantile = float(os.environ.get("QDRANT_SCALAR_QUANTILE", 0.99))
+# Квантованные векторы — в RAM, исходные float32 (для rescoring) — на диске
+qdrant_quantization_always_ram = os.environ.get("QDRANT_QUANTIZATION_ALWAYS_RAM", "1") == "1"
+qdrant_vectors_on_disk = os.environ.get("QDRANT_VECTORS_ON_DISK", "0") == "1"
+
+# Запись точек: пачками по столько точек, до столько пачек одновременно
+qdrant_upsert_batch_size = int(os.environ.get("QDRANT_UPSERT_BATCH_SIZE", 256))
+qdrant_upsert_parallel = int(os.environ.get("QDRANT_UPSERT_PARALLEL", 4))
@@ -0,0 +1,5 @@
+import os
+
+# Кэш оценок reranker по (нормализованный запрос, хеш чанка)
+rerank_cache_enabled = os.environ.get("RERANK_CACHE_ENABLED", "1") == "1"
+rerank_cache_max_entries = int(os.environ.get("RERANK_CACHE_MAX_ENTRIES", 200000))
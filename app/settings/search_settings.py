@@ -0,0 +1,57 @@
+import os
+
+# Каскад поиска: сколько кандидатов брать из Qdrant в зависимости от limit
+search_candidates_per_result = int(os.environ.get("SEARCH_CANDIDATES_PER_RESULT", 20))
+search_min_candidates = int(os.environ.get("SEARCH_MIN_CANDIDATES", 50))
+search_max_candidates = int(os.environ.get("SEARCH_MAX_CANDIDATES", 1000))
+
+# Ранняя отсечка: кандидаты, чей dense-скор ниже лучшего больше чем на gap (0 — выключена)
+search_dense_max_gap = float(os.environ.get("SEARCH_DENSE_MAX_GAP", 0))
+
+# Необязательный лёгкий reranker перед тяжёлым (пусто — выключен)
+# и сколько кандидатов на один результат он пропускает дальше
+search_first_pass_model = os.environ.get("SEARCH_FIRST_PASS_MODEL", "")
+search_first_pass_per_result = int(os.environ.get("SEARCH_FIRST_PASS_PER_RESULT", 5))
+
+# Порог оценки reranker для попадания чанка в выдачу
+search_rerank_threshold = float(os.environ.get("SEARCH_RERANK_THRESHOLD", 0.15))
+
+# Максимум поисков в одном запросе /search/batch
+search_batch_max_size = int(os.environ.get("SEARCH_BATCH_MAX_SIZE", 100))
+
+# Разреженные лексические векторы (BM25 по хешированному словарю) и гибридный поиск
+sparse_vectors_enabled = os.environ.get("SPARSE_VECTORS_ENABLED", "1") == "1"
+# Слова длиннее — обрезаются до префикса: грубый стемминг для русских окончаний (0 — без обрезки)
+sparse_stem_prefix = int(os.environ.get("SPARSE_STEM_PREFIX", 6))
+sparse_bm25_k1 = float(os.environ.get("SPARSE_BM25_K1", 1.2))
+sparse_bm25_b = float(os.environ.get("SPARSE_BM25_B", 0.75))
+# Средняя длина чанка в словах — нормировка длины в BM25
+sparse_avg_doc_terms = float(os.environ.get("SPARSE_AVG_DOC_TERMS", 200))
+
+# Слияние dense и sparse кандидатов: rrf (в Qdrant), weighted (на клиенте) или dense (только dense)
+search_fusion = os.environ.get("SEARCH_FUSION", "rrf")
+search_dense_weight = float(os.environ.get("SEARCH_DENSE_WEIGHT", 0.7))
+search_sparse_weight = float(os.environ.get("SEARCH_SPARSE_WEIGHT", 0.3))
+
+# Кэш результатов поиска по (user_id, запрос, cluster_label, limit).
+# Сбрасывается для пользователя счётчиком поколений при сохранении, обновлении и кластеризации.
+search_cache_enabled = os.environ.get("SEARCH_CACHE_ENABLED", "1") == "1"
+search_cache_max_entries = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", 10000))
+search_cache_ttl_seconds = float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", 300))
+# Файл SQLite — общий кэш и счётчики для всех воркеров uvicorn на хосте (пусто — в памяти процесса)
+search_cache_path = os.environ.get("SEARCH_CACHE_PATH", "")
+
+# Группировка кандидатов по content_id в Qdrant: столько лучших чанков на документ (0 — без группировки)
+search_group_size = int(os.environ.get("SEARCH_GROUP_SIZE", 3))
+# Сгруппированные поиски пакета /search/batch — по запросу на поиск, столько одновременно
+search_group_parallel = int(os.environ.get("SEARCH_GROUP_PARALLEL", 8))
+# Сниппеты вместо полного текста: сколько на документ и их длина в символах
+search_snippets_per_result = int(os.environ.get("SEARCH_SNIPPETS_PER_RESULT", 2))
+search_snippet_chars = int(os.environ.get("SEARCH_SNIPPET_CHARS", 300))
+# Разметка совпавших с запросом слов в сниппете
+search_highlight_tags = tuple(os.environ.get("SEARCH_HIGHLIGHT_TAGS", "<mark>,</mark>").split(",", 1))
+
+# Поиск по квантованным векторам: кандидатов берётся в oversampling раз больше limit,
+# и при rescore они переоцениваются по исходным векторам
+search_quantization_oversampling = float(os.environ.get("SEARCH_QUANTIZATION_OVERSAMPLING", 2.0))
+search_quantization_rescore = os.environ.get("SEARCH_QUANTIZATION_RESCORE", "1") == "1"
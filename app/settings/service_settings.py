@@ -0,0 +1,11 @@
+import os
+
+# Прогрев: при старте приложения загружать модели и подключаться к БД в фоне.
+# При 0 каждый компонент загружается при первом обращении.
+warmup_on_startup = os.environ.get("WARMUP_ON_STARTUP", "1") == "1"
+
+# Пулы потоков по стадиям запроса (app/executors.py):
+# cpu — одновременные вызовы моделей (эмбеддинги и reranking),
+# io — обработчики эндпоинтов с блокирующими обращениями к Qdrant и PostgreSQL
+cpu_executor_workers = int(os.environ.get("CPU_EXECUTOR_WORKERS", 4))
+io_executor_workers = int(os.environ.get("IO_EXECUTOR_WORKERS", 32))
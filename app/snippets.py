@@ -0,0 +1,58 @@
+# app/snippets.py
+import re
+from typing import Callable, List, Tuple
+
+_WORD = re.compile(r"\w+")
+
+
+def highlight_snippet(text: str, query: str, terms: Callable[[str], List[str]],
+                      max_chars: int = 300, tags: Tuple[str, str] = ("<mark>", "</mark>")) -> str:
+    """
+    Фрагмент чанка длиной до max_chars вокруг места, где больше всего слов запроса,
+    с разметкой этих слов. terms — нормализация слов (SparseEncoder.terms),
+    поэтому «доставку» в тексте подсвечивается по запросу «доставка».
+    """
+    # Предлоги и союзы не подсвечиваем
+    wanted = {term for term in terms(query) if len(term) > 2 or term.isdigit()}
+    hits = []
+    for match in _WORD.finditer(text):
+        normalized = terms(match.group())
+        if normalized and normalized[0] in wanted:
+            hits.append(match.span())
+
+    start, end = 0, len(text)
+    if len(text) > max_chars:
+        # Окно с наибольшим числом совпадений; без совпадений — начало чанка
+        best, best_count = 0, 0
+        right = 0
+        for left, (a, _) in enumerate(hits):
+            while right < len(hits) and hits[right][1] - a <= max_chars:
+                right += 1
+            if right - left > best_count:
+                best, best_count = left, right - left
+        start = hits[best][0] if hits else 0
+        # Немного контекста перед первым совпадением
+        start = max(0, start - max_chars // 5)
+        end = min(len(text), start + max_chars)
+        start = max(0, end - max_chars)
+        # Не режем слова на границах окна; если окно целиком внутри одного слова
+        # (CJK без пробелов, длинные URL и base64) — оставляем обрезку по символам
+        snapped_start, snapped_end = start, end
+        while 0 < snapped_start < end and text[snapped_start - 1].isalnum():
+            snapped_start += 1
+        while snapped_start < snapped_end < len(text) and text[snapped_end].isalnum():
+            snapped_end -= 1
+        if snapped_start < snapped_end:
+            start, end = snapped_start, snapped_end
+
+    pre, post = tags
+    parts, position = [], start
+    for a, b in hits:
+        if a < start or b > end:
+            continue
+        parts.append(text[position:a])
+        parts.append(pre + text[a:b] + post)
+        position = b
+    parts.append(text[position:end])
+    snippet = "".join(parts).strip()
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
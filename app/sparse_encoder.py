@@ -0,0 +1,55 @@
+# app/sparse_encoder.py
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List
+
+from app.settings.search_settings import (
+    sparse_avg_doc_terms, sparse_bm25_b, sparse_bm25_k1, sparse_stem_prefix
+)
+
+_WORD = re.compile(r"\w+")
+
+
+class SparseEncoder:
+    """
+    Лексические разреженные векторы в духе BM25 без словаря и сети.
+
+    Индекс термина — crc32 от его нормализованной формы, поэтому словарь не нужно
+    ни обучать, ни хранить. В документе вес термина — насыщенная частота BM25 с
+    нормировкой на длину; IDF по коллекции считает Qdrant (Modifier.IDF у вектора "sparse").
+    В запросе у каждого термина вес 1.
+    """
+
+    def __init__(self, stem_prefix: int = sparse_stem_prefix, k1: float = sparse_bm25_k1,
+                 b: float = sparse_bm25_b, avg_doc_terms: float = sparse_avg_doc_terms):
+        self.stem_prefix = stem_prefix
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_terms = avg_doc_terms
+
+    def terms(self, text: str) -> List[str]:
+        words = _WORD.findall(text.lower().replace("ё", "е"))
+        if self.stem_prefix > 0:
+            # «доставка», «доставки», «доставку» → «достав»; числа не трогаем
+            words = [w if w.isdigit() else w[:self.stem_prefix] for w in words]
+        return words
+
+    @staticmethod
+    def _index(term: str) -> int:
+        return zlib.crc32(term.encode("utf-8"))
+
+    def encode_document(self, text: str) -> Dict[str, list]:
+        terms = self.terms(text)
+        counts = Counter(terms)
+        norm = self.k1 * (1 - self.b + self.b * len(terms) / self.avg_doc_terms)
+        weights = {}
+        for term, tf in counts.items():
+            # Разные термины с одним crc32 складываются — Qdrant требует уникальных индексов
+            index = self._index(term)
+            weights[index] = weights.get(index, 0.0) + tf * (self.k1 + 1) / (tf + norm)
+        return {"indices": list(weights), "values": list(weights.values())}
+
+    def encode_query(self, text: str) -> Dict[str, list]:
+        indices = list(dict.fromkeys(self._index(term) for term in self.terms(text)))
+        return {"indices": indices, "values": [1.0] * len(indices)}
@@ -0,0 +1,214 @@
+# app/streaming.py
+import asyncio
+import codecs
+import contextlib
+import json
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional, Tuple
+
+import anyio
+import anyio.from_thread
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+from app import serialization
+
+
+class NDJSONError(ValueError):
+    """Строка входного NDJSON не разобрана"""
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse, который не слушает disconnect параллельно с генератором.
+
+    Стандартный ответ при ASGI spec < 2.4 (uvicorn) забирает сообщения receive()
+    в фоновой задаче и теряет куски тела запроса, а нам нужно читать тело
+    во время отдачи ответа. Разрыв соединения генератор увидит сам при чтении.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Режет поток байтов на строки; в памяти только текущая неполная строка"""
+    tail = b""
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if tail.strip():
+        yield tail
+
+
+def parse_text_line(line: bytes) -> str:
+    """Строка NDJSON — JSON-строка или объект {"text": "..."}"""
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        raise NDJSONError(f"Некорректный JSON: {e}")
+    if isinstance(item, dict):
+        item = item.get("text")
+    if not isinstance(item, str):
+        raise NDJSONError('Ожидалась строка или объект {"text": "..."}')
+    return item
+
+
+async def stream_embeddings(
+    chunks: AsyncIterator[bytes],
+    embed_fn: Callable[[List[str]], np.ndarray],
+    batch_size: int,
+    fmt: str = "json",
+    dtype: str = "float32"
+) -> AsyncIterator[bytes]:
+    """
+    Читает тексты из NDJSON-потока и отдаёт результат по мере готовности батчей.
+
+    fmt="json"/"base64" — строки {"index": i, "embedding": ...};
+    fmt="octet-stream" — по кадру serialization.encode_octet_stream на батч.
+    Ошибка разбора строки или эмбеддера в json/base64 — последняя строка {"index", "error"},
+    где index — первый текст без эмбеддинга.
+    """
+    batch: List[str] = []
+    offset = 0
+
+    async def flush() -> bytes:
+        matrix = await run_in_threadpool(embed_fn, batch)
+        if fmt == "octet-stream":
+            return serialization.encode_octet_stream(matrix, dtype, {"offset": offset})
+        lines = []
+        for i, row in enumerate(matrix):
+            embedding = serialization.encode_base64(row[None, :], dtype) if fmt == "base64" else row.tolist()
+            lines.append(json.dumps({"index": offset + i, "embedding": embedding}))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    error = None
+    try:
+        async for line in iter_ndjson_lines(chunks):
+            batch.append(parse_text_line(line))
+            if len(batch) >= batch_size:
+                yield await flush()
+                offset += len(batch)
+                batch = []
+    except NDJSONError as e:
+        error = e
+    except Exception as e:
+        # Эмбеддер упал посреди потока — остаток батча не считаем
+        error, batch = e, []
+    if batch:
+        try:
+            data = await flush()
+        except Exception as e:
+            error = e
+        else:
+            yield data
+            offset += len(batch)
+    if error is not None:
+        if fmt == "octet-stream":
+            raise error
+        # Заголовки уже отправлены — сообщаем об ошибке последней строкой
+        yield (json.dumps({"index": offset, "error": str(error)}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+# (текст, start, end, token_ids или None) — как ContentProcessor.iter_chunks
+Chunk = Tuple[str, int, int, Optional[List[int]]]
+
+
+def _blocking_text_pieces(body: AsyncIterator[bytes]) -> Iterator[str]:
+    """Тело запроса как итератор строк для кода в рабочем потоке (UTF-8 декодируется по кускам)"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    async def next_piece() -> Optional[bytes]:
+        try:
+            return await body.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    while True:
+        piece = anyio.from_thread.run(next_piece)
+        if piece is None:
+            break
+        text = decoder.decode(piece)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def stream_chunk_embeddings(
+    body: AsyncIterator[bytes],
+    chunker: Callable[[Iterable[str]], Iterable[Chunk]],
+    embed_fn: Callable[[List[Chunk]], np.ndarray],
+    batch_size: int,
+    fmt: str = "json",
+    dtype: str = "float32",
+    prefetch: int = 2
+) -> AsyncIterator[bytes]:
+    """
+    Конвейер: чтение тела → чанкинг → эмбеддинг → сериализация.
+
+    Чтение, чанкинг и эмбеддинг идут в рабочем потоке, готовые батчи передаются
+    через очередь на prefetch батчей: пока один батч отправляется клиенту, следующий
+    уже считается, а при медленном клиенте поток ждёт — память ограничена.
+
+    fmt="json"/"base64" — строки {"index", "chunk", "start", "end", "embedding"};
+    fmt="octet-stream" — кадр на батч, в метаданных offset, chunks и positions.
+    """
+    send, receive = anyio.create_memory_object_stream(prefetch)
+
+    def produce():
+        try:
+            batch: List[Chunk] = []
+            for chunk in chunker(_blocking_text_pieces(body)):
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    anyio.from_thread.run(send.send, (batch, embed_fn(batch)))
+                    batch = []
+            if batch:
+                anyio.from_thread.run(send.send, (batch, embed_fn(batch)))
+        finally:
+            anyio.from_thread.run_sync(send.close)
+
+    def serialize(batch: List[Chunk], matrix: np.ndarray, offset: int) -> bytes:
+        if fmt == "octet-stream":
+            meta = {"offset": offset, "chunks": [c[0] for c in batch], "positions": [c[1:3] for c in batch]}
+            return serialization.encode_octet_stream(matrix, dtype, meta)
+        lines = []
+        for i, ((text, start, end, _), row) in enumerate(zip(batch, matrix)):
+            embedding = serialization.encode_base64(row[None, :], dtype) if fmt == "base64" else row.tolist()
+            lines.append(json.dumps(
+                {"index": offset + i, "chunk": text, "start": start, "end": end, "embedding": embedding},
+                ensure_ascii=False
+            ))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    producer = asyncio.ensure_future(run_in_threadpool(produce))
+    offset = 0
+    try:
+        async with receive:
+            async for batch, matrix in receive:
+                yield serialize(batch, matrix, offset)
+                offset += len(batch)
+        error = None
+        try:
+            await producer
+        except Exception as e:
+            error = e
+        if error is not None:
+            if fmt == "octet-stream":
+                raise error
+            # Заголовки уже отправлены — сообщаем об ошибке последней строкой
+            yield (json.dumps({"index": offset, "error": str(error)}, ensure_ascii=False) + "\n").encode("utf-8")
+    finally:
+        # Клиент ушёл раньше: закрытая очередь остановит поток на следующем send
+        receive.close()
+        with contextlib.suppress(Exception):
+            await producer
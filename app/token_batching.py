@@ -0,0 +1,25 @@
+# app/token_batching.py
+from typing import List, Sequence
+
+
+def plan_token_batches(lengths: Sequence[int], max_batch_tokens: int, max_batch_size: int) -> List[List[int]]:
+    """
+    Группирует индексы входов в батчи по длине в токенах.
+
+    Входы сортируются по длине, и батч закрывается, когда с учётом паддинга
+    (число элементов × длина самого длинного) он превысил бы max_batch_tokens
+    или max_batch_size. Вход длиннее бюджета уходит отдельным батчем.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches: List[List[int]] = []
+    current: List[int] = []
+    for i in order:
+        # Порядок возрастающий — текущий элемент самый длинный в батче
+        padded = (len(current) + 1) * lengths[i]
+        if current and (padded > max_batch_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
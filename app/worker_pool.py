@@ -0,0 +1,157 @@
+# app/worker_pool.py
+"""
+Пул процессов инференса с общими read-only весами.
+
+Веса каждой модели один раз сохраняются в SHARED_WEIGHTS_DIR, и каждый воркер
+подгружает их через torch.load(mmap=True): страницы файла разделяются между
+процессами через page cache, поэтому RSS не растёт пропорционально числу воркеров.
+Каждый воркер ограничен INFERENCE_POOL_THREADS потоками intra-op.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.settings.models import *
+from app.settings.backend_settings import *
+from app.inference_backends import EmbeddingBackend, RerankBackend
+
+# === Код, выполняемый внутри воркеров ===
+_worker_models: Dict[Tuple[str, str], object] = {}
+
+
+def _init_worker(threads: int):
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+
+def _weights_module(kind: str, backend):
+    # У CrossEncoder веса лежат в HF-модели внутри обёртки
+    return backend.model if kind == "embedder" else backend.model.model
+
+
+def _load_backend(kind: str, model_name: str):
+    from app.inference_backends import TorchEmbeddingBackend, TorchRerankBackend
+    return TorchEmbeddingBackend(model_name) if kind == "embedder" else TorchRerankBackend(model_name)
+
+
+def _worker_backend(kind: str, model_name: str, weights_path: str):
+    key = (kind, model_name)
+    if key not in _worker_models:
+        import torch
+        backend = _load_backend(kind, model_name)
+        state = torch.load(weights_path, mmap=True, weights_only=True)
+        # assign=True подменяет параметры mmap-тензорами, собственная копия освобождается
+        _weights_module(kind, backend).load_state_dict(state, assign=True)
+        _weights_module(kind, backend).eval()
+        _worker_models[key] = backend
+    return _worker_models[key]
+
+
+def _task_export_weights(kind: str, model_name: str, path: str) -> str:
+    if os.path.exists(path):
+        return path
+    import torch
+    backend = _load_backend(kind, model_name)
+    tmp_path = path + ".tmp"
+    torch.save(_weights_module(kind, backend).state_dict(), tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _task_encode(model_name: str, weights_path: str, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    return _worker_backend("embedder", model_name, weights_path).encode_padded(input_ids, attention_mask)
+
+
+def _task_rerank(model_name: str, weights_path: str, pairs: List[Tuple[str, str]], batch_size: int) -> np.ndarray:
+    return _worker_backend("reranker", model_name, weights_path).predict(pairs, batch_size=batch_size)
+
+
+# === Сторона API-процесса ===
+class InferencePool:
+    def __init__(self, workers: int = inference_pool_workers, threads: int = inference_pool_threads):
+        self.workers = workers
+        self.threads = threads
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            # spawn: воркеры не наследуют состояние API-процесса (event loop, соединения)
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads,)
+        )
+        self._weights: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        print(f"✅ Пул инференса: {workers} процессов × {threads} потоков")
+
+    def shared_weights(self, kind: str, model_name: str) -> str:
+        """Путь к общему файлу весов; при первом обращении один воркер его создаёт"""
+        key = (kind, model_name)
+        with self._lock:
+            if key not in self._weights:
+                os.makedirs(shared_weights_dir, exist_ok=True)
+                path = os.path.join(shared_weights_dir, f"{model_name.replace('/', '__')}.{kind}.pt")
+                self._weights[key] = self.executor.submit(_task_export_weights, kind, model_name, path).result()
+            return self._weights[key]
+
+    def submit(self, fn, *args) -> Future:
+        return self.executor.submit(fn, *args)
+
+    def worker_pids(self) -> List[int]:
+        return [p.pid for p in self.executor._processes.values()]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+_pool: Optional[InferencePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_inference_pool() -> InferencePool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = InferencePool()
+        return _pool
+
+
+class PooledEmbeddingBackend(EmbeddingBackend):
+    """Токенизация в API-процессе, прямой проход — в пуле"""
+
+    def __init__(self, model_name: str, pool: Optional[InferencePool] = None):
+        from transformers import AutoConfig, AutoTokenizer
+        self.model_name = model_name
+        self.pool = pool or get_inference_pool()
+        self.parallelism = self.pool.workers
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.max_seq_length = min(self.tokenizer.model_max_length, embedding_max_seq_length)
+        self.dim = AutoConfig.from_pretrained(model_name).hidden_size
+        self.weights_path = self.pool.shared_weights("embedder", model_name)
+
+    def submit_padded(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> Future:
+        return self.pool.submit(_task_encode, self.model_name, self.weights_path, input_ids, attention_mask)
+
+    def encode_padded(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        return self.submit_padded(input_ids, attention_mask).result()
+
+
+class PooledRerankBackend(RerankBackend):
+    """Пары режутся на батчи, которые считаются параллельно в разных воркерах"""
+
+    def __init__(self, model_name: str, pool: Optional[InferencePool] = None):
+        self.model_name = model_name
+        self.pool = pool or get_inference_pool()
+        self.weights_path = self.pool.shared_weights("reranker", model_name)
+
+    def predict(self, pairs: List[Tuple[str, str]], batch_size: int = 32) -> np.ndarray:
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        futures = [
+            self.pool.submit(_task_rerank, self.model_name, self.weights_path, pairs[i:i + batch_size], batch_size)
+            for i in range(0, len(pairs), batch_size)
+        ]
+        return np.concatenate([f.result() for f in futures]).astype(np.float32, copy=False)
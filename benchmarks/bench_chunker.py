@@ -0,0 +1,88 @@
+# benchmarks/bench_chunker.py
+"""
+Исходный semantic_chunk (посимвольный поиск границ) против однопроходного
+iter_semantic_chunks на многомегабайтных текстах; плюс пиковая память
+при чтении из файла.
+
+Запуск: python -m benchmarks.bench_chunker --mb 2 8 --chunk-size 1500 --overlap 40
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from app.chunker import iter_semantic_chunks, semantic_chunk
+from benchmarks.bench_length_buckets import WORDS
+from benchmarks.legacy_chunker import semantic_chunk_legacy
+
+
+def make_document(size_mb: float, seed: int = 42) -> str:
+    """Абзацы по 3–12 предложений; часть абзацев — сплошной текст без точек"""
+    rnd = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    paragraphs, total = [], 0
+    while total < target:
+        if rnd.random() < 0.1:
+            paragraph = " ".join(rnd.choices(WORDS, k=rnd.randint(200, 600)))
+        else:
+            paragraph = " ".join(
+                " ".join(rnd.choices(WORDS, k=rnd.randint(5, 20))).capitalize() + rnd.choice(".!?;")
+                for _ in range(rnd.randint(3, 12))
+            )
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def peak_memory_mb(fn) -> float:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--chunk-size", type=int, default=1500)
+    parser.add_argument("--overlap", type=int, default=40)
+    args = parser.parse_args()
+
+    for size_mb in args.mb:
+        text = make_document(size_mb)
+        legacy, legacy_time = timed(lambda: semantic_chunk_legacy(text, args.chunk_size, args.overlap))
+        chunks, new_time = timed(lambda: semantic_chunk(text, args.chunk_size, args.overlap))
+        assert chunks == legacy, "результаты разошлись"
+
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".txt", delete=False) as f:
+            f.write(text)
+        try:
+            def from_file():
+                with open(f.name, encoding="utf-8") as source:
+                    for _ in iter_semantic_chunks(source, args.chunk_size, args.overlap):
+                        pass
+            _, file_time = timed(from_file)
+            file_peak = peak_memory_mb(from_file)
+        finally:
+            os.unlink(f.name)
+        string_peak = peak_memory_mb(lambda: semantic_chunk(text, args.chunk_size, args.overlap))
+
+        mb = len(text) / 2 ** 20
+        print(f"{mb:.1f} МБ, {len(chunks)} чанков")
+        print(f"  исходный:          {legacy_time:.2f} с ({mb / legacy_time:.1f} МБ/с)")
+        print(f"  однопроходный:     {new_time:.2f} с ({mb / new_time:.1f} МБ/с), x{legacy_time / new_time:.1f}")
+        print(f"  поток из файла:    {file_time:.2f} с, пик памяти {file_peak:.1f} МБ "
+              f"(список из строки: {string_peak:.1f} МБ)")
+
+
+if __name__ == "__main__":
+    main()
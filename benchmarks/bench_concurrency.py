@@ -0,0 +1,99 @@
+# benchmarks/bench_concurrency.py
+"""
+Хвостовые задержки под смешанной нагрузкой на запущенный сервис.
+
+Несколько параллельных клиентов шлют вперемешку /search, /embed и /chunk-embed,
+а отдельный зонд раз в --probe-ms опрашивает /health. Если обработчик блокирует
+event loop, первым это видно по p99 у /health.
+
+Запуск (сервис уже поднят, у пользователя --user-id есть документы):
+    python -m benchmarks.bench_concurrency --url http://localhost:8000 --concurrency 8 32 --seconds 20
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_length_buckets import WORDS, make_mixed_texts
+
+
+def make_requests(user_id: int, seed: int = 42):
+    rnd = random.Random(seed)
+    texts = make_mixed_texts(200, seed)
+    while True:
+        kind = rnd.choices(["search", "embed", "chunk-embed"], weights=[5, 4, 1])[0]
+        if kind == "search":
+            yield "search", {"user_id": user_id, "query": " ".join(rnd.choices(WORDS, k=rnd.randint(3, 8)))}
+        elif kind == "embed":
+            yield "embed", {"texts": rnd.sample(texts, rnd.randint(1, 16)), "type": "passage"}
+        else:
+            yield "chunk-embed", {"text": " ".join(rnd.sample(texts, 8)), "chunk_size": 500, "overlap": 50}
+
+
+async def client_loop(client: httpx.AsyncClient, requests, deadline: float, latencies: dict, errors: dict):
+    while time.monotonic() < deadline:
+        kind, body = next(requests)
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"/{kind}", json=body)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        latencies[kind].append(time.perf_counter() - started)
+        if not ok:
+            errors[kind] += 1
+
+
+async def probe_loop(client: httpx.AsyncClient, deadline: float, interval: float, latencies: dict):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        await client.get("/health")
+        latencies["health"].append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def run_level(url: str, concurrency: int, seconds: float, probe_ms: float, user_id: int):
+    latencies, errors = defaultdict(list), defaultdict(int)
+    requests = make_requests(user_id)
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        deadline = time.monotonic() + seconds
+        await asyncio.gather(
+            probe_loop(client, deadline, probe_ms / 1000, latencies),
+            *(client_loop(client, requests, deadline, latencies, errors) for _ in range(concurrency))
+        )
+        stats = (await client.get("/stats")).json().get("executors")
+    return latencies, errors, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--probe-ms", type=float, default=50)
+    parser.add_argument("--user-id", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'клиентов':>8} {'эндпоинт':<12} {'запр/с':>7} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'ошибок':>7}")
+    for concurrency in args.concurrency:
+        latencies, errors, stats = asyncio.run(
+            run_level(args.url, concurrency, args.seconds, args.probe_ms, args.user_id)
+        )
+        for kind in ("health", "search", "embed", "chunk-embed"):
+            values = np.array(latencies[kind]) * 1000
+            if len(values) == 0:
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            print(f"{concurrency:>8} {kind:<12} {len(values) / args.seconds:>7.1f} "
+                  f"{p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {errors[kind]:>7}")
+        if stats:
+            print(f"{'':>8} пулы: cpu {stats['cpu']['completed']} задач, io {stats['io']['completed']} задач")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_ingest.py
+"""
+Пропускная способность загрузки корпуса: /save-content по документу против /save-content/batch.
+
+Документы — случайные тексты из словаря бенчмарков (--chars символов, абзацами).
+Каждый прогон пишет новые документы (в текст добавляется метка прогона), поэтому
+дубликаты не искажают замер. Для пакетов выводятся и стадии из stats ответа.
+
+Запуск (сервис уже поднят):
+    python -m benchmarks.bench_ingest --url http://localhost:8000 --documents 500 --batch-sizes 50 200
+"""
+import argparse
+import random
+import time
+import uuid
+
+import httpx
+
+from benchmarks.bench_length_buckets import WORDS
+
+
+def make_documents(n: int, chars: int, user_id: int, seed: int = 42) -> list:
+    rnd = random.Random(seed)
+    run = uuid.uuid4().hex[:8]
+    documents = []
+    for i in range(n):
+        paragraphs, size = [], 0
+        while size < chars:
+            paragraph = " ".join(rnd.choices(WORDS, k=rnd.randint(20, 60))).capitalize() + "."
+            paragraphs.append(paragraph)
+            size += len(paragraph) + 2
+        documents.append({"text": f"Документ {run}-{i}.\n\n" + "\n\n".join(paragraphs), "user_id": user_id})
+    return documents
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--chars", type=int, default=6000, help="длина документа в символах")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--chunk-size", type=int, default=1500)
+    parser.add_argument("--user-id", type=int, default=9001)
+    parser.add_argument("--skip-single", action="store_true", help="без замера /save-content")
+    args = parser.parse_args()
+
+    print(f"Документов: {args.documents} по ~{args.chars} символов, chunk_size={args.chunk_size}")
+    print(f"{'режим':<16} {'с':>7} {'док/с':>7} {'чанков/с':>9}  стадии, с")
+    with httpx.Client(base_url=args.url, timeout=600) as client:
+        if not args.skip_single:
+            documents = make_documents(args.documents, args.chars, args.user_id)
+            started, chunks = time.perf_counter(), 0
+            for doc in documents:
+                response = client.post("/save-content", json={**doc, "chunk_size": args.chunk_size})
+                response.raise_for_status()
+                chunks += response.json()["saved_chunks"]
+            seconds = time.perf_counter() - started
+            print(f"{'по одному':<16} {seconds:>7.1f} {len(documents) / seconds:>7.1f} {chunks / seconds:>9.1f}")
+
+        for batch_size in args.batch_sizes:
+            documents = make_documents(args.documents, args.chars, args.user_id)
+            started, chunks = time.perf_counter(), 0
+            stages = {}
+            for i in range(0, len(documents), batch_size):
+                response = client.post("/save-content/batch", json={
+                    "documents": documents[i:i + batch_size], "chunk_size": args.chunk_size
+                })
+                response.raise_for_status()
+                stats = response.json()["stats"]
+                chunks += stats["chunks"]
+                for name, value in stats.items():
+                    if name.endswith("_s"):
+                        stages[name] = stages.get(name, 0.0) + value
+            seconds = time.perf_counter() - started
+            stage_line = " ".join(f"{name[:-2]} {value:.1f}" for name, value in stages.items())
+            print(f"{f'пакеты по {batch_size}':<16} {seconds:>7.1f} {len(documents) / seconds:>7.1f} "
+                  f"{chunks / seconds:>9.1f}  {stage_line}")
+
+
+if __name__ == "__main__":
+    main()
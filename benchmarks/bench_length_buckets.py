@@ -0,0 +1,69 @@
+# benchmarks/bench_length_buckets.py
+"""
+Сравнение encode в порядке поступления и батчей по бюджету токенов
+на смеси коротких запросов и длинных чанков.
+
+Запуск: python -m benchmarks.bench_length_buckets --texts 512 --repeat 3
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.embedder import Embedder
+
+WORDS = (
+    "возврат товара оплата картой гарантия доставка заказ поддержка клиент "
+    "срок договор счёт документ магазин курьер склад скидка акция подписка"
+).split()
+
+
+def make_mixed_texts(n: int, seed: int = 42) -> list:
+    """~70% коротких запросов (3–12 слов) и ~30% чанков по ~1500 символов"""
+    rnd = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        if rnd.random() < 0.7:
+            texts.append(" ".join(rnd.choices(WORDS, k=rnd.randint(3, 12))))
+        else:
+            sentences = []
+            while sum(len(s) for s in sentences) < 1500:
+                sentences.append(" ".join(rnd.choices(WORDS, k=rnd.randint(6, 18))).capitalize() + ".")
+            texts.append(" ".join(sentences))
+    return texts
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    embedder = Embedder(batching=False, cache=False, backend="torch")
+    texts = ["passage: " + t for t in make_mixed_texts(args.texts)]
+
+    baseline = lambda: embedder.backend.model.encode(texts, batch_size=32, normalize_embeddings=True, show_progress_bar=False)
+    bucketed = lambda: embedder._encode(texts)
+
+    base_time = timed(baseline, args.repeat)
+    bucket_time = timed(bucketed, args.repeat)
+    diff = np.abs(np.asarray(baseline()) - bucketed()).max()
+
+    print(f"Текстов: {len(texts)}")
+    print(f"model.encode (batch_size=32): {base_time:.2f} с, {len(texts) / base_time:.1f} текстов/с")
+    print(f"батчи по бюджету токенов:     {bucket_time:.2f} с, {len(texts) / bucket_time:.1f} текстов/с")
+    print(f"Ускорение: x{base_time / bucket_time:.2f}, max |Δ| = {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
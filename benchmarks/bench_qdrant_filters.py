@@ -0,0 +1,127 @@
+# benchmarks/bench_qdrant_filters.py
+"""
+Задержка поиска с фильтром по user_id при разной раскладке коллекции Qdrant.
+
+Раскладки:
+  plain   — как до индексов: общий HNSW, payload в памяти, без индексов payload;
+  indexed — индексы PAYLOAD_INDEXES, payload на диске, подграфы по user_id (payload_m);
+  tenant  — то же, но без общего графа (m=0): только подграфы пользователей.
+
+В каждую коллекцию пишутся одни и те же случайные векторы с payload как у чанков
+(user_id по закону Ципфа — есть крупные и мелкие пользователи, content_id,
+cluster_label, chunk_text). Для каждой раскладки: p50/p95 поиска с фильтром
+user_id и user_id + cluster_label и recall@limit относительно точного поиска.
+
+Индексы payload работают только в сервере Qdrant, поэтому по умолчанию — localhost:6333.
+Запуск:
+    python -m benchmarks.bench_qdrant_filters --points 1000000 --tenants 2000
+    python -m benchmarks.bench_qdrant_filters --points 20000 --location :memory:
+"""
+import argparse
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Distance, FieldCondition, Filter, HnswConfigDiff, MatchValue, SearchParams, VectorParams
+)
+
+from app.qdrant_manager import PAYLOAD_INDEXES
+
+LAYOUTS = {
+    "plain": dict(hnsw=HnswConfigDiff(m=16, ef_construct=100), on_disk_payload=False, indexes=False),
+    "indexed": dict(hnsw=HnswConfigDiff(m=16, ef_construct=100, payload_m=16), on_disk_payload=True, indexes=True),
+    "tenant": dict(hnsw=HnswConfigDiff(m=0, ef_construct=100, payload_m=16), on_disk_payload=True, indexes=True),
+}
+
+
+def make_points(n: int, dim: int, tenants: int, text_chars: int, seed: int = 42):
+    rnd = np.random.default_rng(seed)
+    vectors = rnd.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    user_ids = np.minimum(rnd.zipf(1.3, size=n), tenants)
+    text = "чанк " * (text_chars // 5)
+    payloads = [
+        {"user_id": int(user_id), "content_id": i // 8, "cluster_label": str(i % 10), "chunk_text": text}
+        for i, user_id in enumerate(user_ids.tolist())
+    ]
+    return vectors, payloads
+
+
+def build(client: QdrantClient, name: str, layout: dict, vectors: np.ndarray, payloads: list, batch: int):
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(
+        name,
+        vectors_config={"dense": VectorParams(size=vectors.shape[1], distance=Distance.COSINE)},
+        hnsw_config=layout["hnsw"],
+        on_disk_payload=layout["on_disk_payload"]
+    )
+    # Индексы до загрузки: подграфы payload_m строятся вместе с HNSW
+    if layout["indexes"]:
+        for field, params in PAYLOAD_INDEXES.items():
+            client.create_payload_index(name, field, field_schema=params)
+    started = time.perf_counter()
+    client.upload_collection(name, vectors={"dense": vectors}, payload=payloads,
+                             ids=list(range(len(payloads))), batch_size=batch)
+    # Ждём окончания индексации, иначе меряем полный перебор неоптимизированных сегментов
+    while client.get_collection(name).status.value != "green":
+        time.sleep(1)
+    return time.perf_counter() - started
+
+
+def run_queries(client: QdrantClient, name: str, queries: np.ndarray, filters: list, limit: int, exact: bool = False):
+    latencies, found = [], []
+    for query, query_filter in zip(queries, filters):
+        started = time.perf_counter()
+        response = client.query_points(name, query=query.tolist(), using="dense", query_filter=query_filter,
+                                       limit=limit, search_params=SearchParams(exact=exact))
+        latencies.append((time.perf_counter() - started) * 1000)
+        found.append({point.id for point in response.points})
+    return np.array(latencies), found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--location", help="вместо --url, например :memory: (индексы payload не действуют)")
+    parser.add_argument("--points", type=int, default=1000000)
+    parser.add_argument("--tenants", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--text-chars", type=int, default=500, help="длина chunk_text в payload")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--layouts", nargs="+", default=list(LAYOUTS), choices=list(LAYOUTS))
+    parser.add_argument("--keep", action="store_true", help="не удалять коллекции после замера")
+    args = parser.parse_args()
+
+    client = QdrantClient(location=args.location) if args.location else QdrantClient(url=args.url)
+    vectors, payloads = make_points(args.points, args.dim, args.tenants, args.text_chars)
+    rnd = np.random.default_rng(7)
+    # Запросы от пользователей пропорционально их числу чанков — как в реальной нагрузке
+    picked = rnd.integers(0, len(payloads), size=args.queries)
+    queries = vectors[rnd.integers(0, len(vectors), size=args.queries)] + 0.1 * rnd.standard_normal((args.queries, args.dim))
+    by_user = [Filter(must=[FieldCondition(key="user_id", match=MatchValue(value=payloads[i]["user_id"]))])
+               for i in picked.tolist()]
+    by_cluster = [Filter(must=f.must + [FieldCondition(key="cluster_label", match=MatchValue(value="3"))])
+                  for f in by_user]
+
+    print(f"Точек: {args.points}, пользователей: {args.tenants}, dim={args.dim}, limit={args.limit}")
+    print(f"{'раскладка':<9} {'загрузка, с':>11} {'фильтр':<20} {'p50 мс':>7} {'p95 мс':>7} {'recall':>7}")
+    for layout in args.layouts:
+        name = f"bench_filters_{layout}"
+        upload = build(client, name, LAYOUTS[layout], vectors, payloads, args.batch)
+        for label, filters in (("user_id", by_user), ("user_id+cluster", by_cluster)):
+            run_queries(client, name, queries[:10], filters[:10], args.limit)  # прогрев
+            latencies, found = run_queries(client, name, queries, filters, args.limit)
+            _, reference = run_queries(client, name, queries, filters, args.limit, exact=True)
+            recall = np.mean([len(f & r) / len(r) if r else 1.0 for f, r in zip(found, reference)])
+            print(f"{layout:<9} {upload:>11.1f} {label:<20} {np.percentile(latencies, 50):>7.2f} "
+                  f"{np.percentile(latencies, 95):>7.2f} {recall:>7.3f}")
+        if not args.keep:
+            client.delete_collection(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_ranking.py
+"""
+Агрегация оценок reranker: исходные циклы со словарём против app.ranking.rank_groups.
+
+Запуск:
+    python -m benchmarks.bench_ranking --candidates 1000 10000 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.ranking import rank_groups
+
+
+def rank_dict(chunks: list, scores: np.ndarray, threshold: float, k: int) -> list:
+    """Прежний путь SearchService: порог, максимум по content_id в словаре, сортировка"""
+    best = {}
+    for chunk, score in zip(chunks, scores.tolist()):
+        if score > threshold:
+            content_id = int(chunk["content_id"])
+            if content_id not in best or score > best[content_id]:
+                best[content_id] = score
+    return sorted(best.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+def timed_us(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--chunks-per-doc", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rnd = np.random.default_rng(42)
+    print(f"{'кандидатов':>10} {'dict, мкс':>10} {'numpy, мкс':>11} {'из них ранжир.':>15} {'ускорение':>10}")
+    for n in args.candidates:
+        docs = max(1, n // args.chunks_per_doc)
+        content_ids = rnd.integers(0, 2**53, size=docs)[rnd.integers(0, docs, size=n)]
+        scores = rnd.random(n).astype(np.float32)
+        chunks = [{"content_id": int(cid)} for cid in content_ids]
+
+        def vectorized():
+            ids = np.array([c["content_id"] for c in chunks], dtype=np.int64)
+            return rank_groups(ids, scores, 0.15, args.limit)
+
+        ids, best = vectorized()
+        assert list(zip(ids.tolist(), best.tolist())) == rank_dict(chunks, scores, 0.15, args.limit)
+        old = timed_us(lambda: rank_dict(chunks, scores, 0.15, args.limit), args.repeat)
+        new = timed_us(vectorized, args.repeat)
+        # Без извлечения content_id из payload — только порог, группировка и top-k
+        ids_array = np.array(content_ids, dtype=np.int64)
+        ranking = timed_us(lambda: rank_groups(ids_array, scores, 0.15, args.limit), args.repeat)
+        print(f"{n:>10} {old:>10.0f} {new:>11.0f} {ranking:>15.0f} {old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
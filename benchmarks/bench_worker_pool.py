@@ -0,0 +1,70 @@
+# benchmarks/bench_worker_pool.py
+"""
+Масштабирование пула инференса по числу процессов и расход памяти.
+
+Для каждого размера пула: пропускная способность encode и память воркеров —
+суммарный RSS и PSS (PSS делит общие страницы mmap-весов между процессами,
+поэтому показывает реальный расход).
+
+Запуск: python -m benchmarks.bench_worker_pool --workers 1 2 4 --threads 1
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import worker_pool
+from app.embedder import Embedder
+from app.worker_pool import InferencePool
+from benchmarks.bench_length_buckets import make_mixed_texts
+
+
+def memory_kb(pid: int) -> tuple:
+    rss = pss = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Rss:"):
+                rss = int(line.split()[1])
+            elif line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+def run(workers: int, threads: int, texts: list, requests: int) -> None:
+    # Подменяем общий пул, который возьмёт Embedder(backend="pool")
+    pool = worker_pool._pool = InferencePool(workers=workers, threads=threads)
+    embedder = Embedder(batching=True, cache=False, backend="pool")
+    # Прогрев: по батчу на воркер, чтобы веса были подгружены везде
+    embedder.embed_array(texts[:workers * 8], "passage")
+
+    per_request = max(1, len(texts) // requests)
+    chunks = [texts[i:i + per_request] for i in range(0, len(texts), per_request)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(requests) as clients:
+        list(clients.map(lambda c: embedder.embed_array(c, "passage"), chunks))
+    elapsed = time.perf_counter() - t0
+
+    rss = pss = 0
+    for pid in pool.worker_pids():
+        r, p = memory_kb(pid)
+        rss += r
+        pss += p
+    print(f"{workers:>3} воркеров: {len(texts) / elapsed:8.1f} текстов/с, RSS {rss / 1024:7.0f} МБ, PSS {pss / 1024:7.0f} МБ")
+    pool.shutdown()
+    worker_pool._pool = None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--texts", type=int, default=2048)
+    parser.add_argument("--requests", type=int, default=32, help="параллельных клиентов")
+    args = parser.parse_args()
+
+    texts = make_mixed_texts(args.texts)
+    for workers in args.workers:
+        run(workers, args.threads, texts, args.requests)
+
+
+if __name__ == "__main__":
+    main()
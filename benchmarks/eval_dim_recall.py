@@ -0,0 +1,73 @@
+# benchmarks/eval_dim_recall.py
+"""
+Офлайн-оценка recall@k при уменьшенной размерности эмбеддингов.
+
+Эталон — точный top-k по полным векторам; для каждой размерности и режима
+(truncate / pca) считаем, какая доля эталонного top-k найдена в уменьшенном пространстве.
+
+Запуск:
+    python -m benchmarks.eval_dim_recall --input corpus.txt --queries queries.txt
+    python -m benchmarks.eval_dim_recall --from-qdrant --user-id 1 --dims 64 128 256
+Без --queries запросами служат случайные векторы корпуса (сам вектор из выдачи исключается).
+"""
+import argparse
+
+import numpy as np
+
+from app.dim_reduction import PCAProjection, TruncationReducer, load_corpus_vectors
+
+
+def top_k(queries: np.ndarray, corpus: np.ndarray, k: int, exclude: np.ndarray = None) -> np.ndarray:
+    scores = queries @ corpus.T
+    if exclude is not None:
+        scores[np.arange(len(queries)), exclude] = -np.inf
+    return np.argpartition(-scores, k, axis=1)[:, :k]
+
+
+def recall_at_k(reference: np.ndarray, found: np.ndarray) -> float:
+    k = reference.shape[1]
+    hits = sum(len(set(r) & set(f)) for r, f in zip(reference, found))
+    return hits / (len(reference) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", help="файл с текстами корпуса, по одному на строку")
+    parser.add_argument("--from-qdrant", action="store_true")
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--limit", type=int, default=50000)
+    parser.add_argument("--queries", help="файл с запросами; по умолчанию — выборка из корпуса")
+    parser.add_argument("--sample-queries", type=int, default=500)
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 96, 128, 192, 256])
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    if not args.input and not args.from_qdrant:
+        parser.error("нужен --input или --from-qdrant")
+
+    corpus = load_corpus_vectors(args.input, args.from_qdrant, args.user_id, args.limit)
+    exclude = None
+    if args.queries:
+        from app.embedder import Embedder
+        with open(args.queries, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        queries = Embedder(batching=False, cache=False, output_dim=0).embed_array(texts, "query")
+    else:
+        rnd = np.random.default_rng(42)
+        exclude = rnd.choice(len(corpus), size=min(args.sample_queries, len(corpus)), replace=False)
+        queries = corpus[exclude]
+
+    reference = top_k(queries, corpus, args.k, exclude)
+    native = corpus.shape[1]
+    print(f"Корпус: {len(corpus)} × {native}, запросов: {len(queries)}, k={args.k}")
+    print(f"{'dim':>5} {'truncate':>10} {'pca':>8} {'МБ на 1M':>10}")
+    for dim in sorted(d for d in args.dims if d < native):
+        row = []
+        for reducer in (TruncationReducer(dim), PCAProjection.fit(corpus, dim)):
+            found = top_k(reducer.transform(queries), reducer.transform(corpus), args.k, exclude)
+            row.append(recall_at_k(reference, found))
+        print(f"{dim:>5} {row[0]:>10.3f} {row[1]:>8.3f} {dim * 4 * 1_000_000 / 2 ** 20:>10.0f}")
+    print(f"{native:>5} {1.0:>10.3f} {1.0:>8.3f} {native * 4 * 1_000_000 / 2 ** 20:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
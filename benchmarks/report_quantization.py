@@ -0,0 +1,109 @@
+# benchmarks/report_quantization.py
+"""
+Recall и задержка поиска по квантованным векторам против коллекции без квантизации.
+
+Одни и те же векторы пишутся в коллекции без квантизации, со scalar (int8) и с binary
+квантизацией. Эталон — точный поиск (exact) в коллекции без квантизации; для каждой
+квантизации и каждого oversampling с rescore и без считаются recall@limit и p50/p95.
+Память на вектор: float32 — 4 байта на координату, int8 — 1, binary — 1 бит.
+
+Векторы — из файла текстов (эмбеддер), из рабочей коллекции или случайные.
+Запуск:
+    python -m benchmarks.report_quantization --from-qdrant --user-id 1 --limit-points 100000
+    python -m benchmarks.report_quantization --points 20000 --location :memory:
+В режиме :memory: qdrant_client ищет полным перебором — это проверка корректности,
+задержки нужно мерить на сервере Qdrant (--url).
+"""
+import argparse
+import time
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, SearchParams, VectorParams
+
+from app.dim_reduction import load_corpus_vectors
+from app.qdrant_manager import quantization_config, search_params
+
+BYTES_PER_DIM = {"": 4.0, "scalar": 1.0, "binary": 1 / 8}
+
+
+def build(client: QdrantClient, name: str, vectors: np.ndarray, quantization: str, on_disk: bool, batch: int):
+    if client.collection_exists(name):
+        client.delete_collection(name)
+    client.create_collection(
+        name,
+        vectors_config={"dense": VectorParams(size=vectors.shape[1], distance=Distance.COSINE, on_disk=on_disk)},
+        quantization_config=quantization_config(quantization)
+    )
+    client.upload_collection(name, vectors={"dense": vectors}, ids=list(range(len(vectors))), batch_size=batch)
+    # Квантованные векторы строятся вместе с индексом
+    while client.get_collection(name).status.value != "green":
+        time.sleep(1)
+
+
+def run_queries(client: QdrantClient, name: str, queries: np.ndarray, limit: int, params: SearchParams):
+    latencies, found = [], []
+    for query in queries:
+        started = time.perf_counter()
+        response = client.query_points(name, query=query.tolist(), using="dense", limit=limit,
+                                       search_params=params, with_payload=False)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found.append({point.id for point in response.points})
+    return np.array(latencies), found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--location", help="вместо --url, например :memory:")
+    parser.add_argument("--input", help="файл с текстами корпуса, по одному на строку")
+    parser.add_argument("--from-qdrant", action="store_true", help="векторы из рабочей коллекции")
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--limit-points", type=int, default=100000, help="сколько векторов взять из корпуса")
+    parser.add_argument("--points", type=int, default=100000, help="случайных векторов без --input/--from-qdrant")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--oversampling", type=float, nargs="+", default=[1.0, 2.0, 4.0])
+    parser.add_argument("--vectors-on-disk", action="store_true", help="исходные векторы квантованных коллекций на диске")
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    rnd = np.random.default_rng(42)
+    if args.input or args.from_qdrant:
+        vectors = load_corpus_vectors(args.input, args.from_qdrant, args.user_id, args.limit_points)
+    else:
+        vectors = rnd.standard_normal((args.points, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Запросы — зашумлённые векторы корпуса: у них есть близкие соседи, как у настоящих запросов
+    queries = vectors[rnd.integers(0, len(vectors), size=args.queries)]
+    queries = queries + 0.05 * rnd.standard_normal(queries.shape).astype(np.float32)
+
+    client = QdrantClient(location=args.location) if args.location else QdrantClient(url=args.url)
+    dim = vectors.shape[1]
+    print(f"Векторов: {len(vectors)}, dim={dim}, запросов: {len(queries)}, limit={args.limit}")
+    print(f"{'квантизация':<12} {'МБ векторов':>11} {'oversampling':>12} {'rescore':>8} "
+          f"{'recall':>7} {'p50 мс':>7} {'p95 мс':>7}")
+
+    build(client, "bench_quant_none", vectors, "", False, args.batch)
+    _, reference = run_queries(client, "bench_quant_none", queries, args.limit, SearchParams(exact=True))
+    runs = [("", 1.0, False)]
+    runs += [(kind, oversampling, rescore) for kind in ("scalar", "binary")
+             for oversampling in args.oversampling for rescore in (False, True)]
+    for kind in ("", "scalar", "binary"):
+        name = f"bench_quant_{kind or 'none'}"
+        if kind:
+            build(client, name, vectors, kind, args.vectors_on_disk, args.batch)
+        megabytes = len(vectors) * dim * BYTES_PER_DIM[kind] / 2**20
+        for _, oversampling, rescore in [run for run in runs if run[0] == kind]:
+            params = search_params(oversampling, rescore)
+            run_queries(client, name, queries[:10], args.limit, params)  # прогрев
+            latencies, found = run_queries(client, name, queries, args.limit, params)
+            recall = np.mean([len(f & r) / len(r) for f, r in zip(found, reference)])
+            print(f"{kind or 'нет':<12} {megabytes:>11.1f} {oversampling:>12.1f} {'да' if rescore else 'нет':>8} "
+                  f"{recall:>7.3f} {np.percentile(latencies, 50):>7.2f} {np.percentile(latencies, 95):>7.2f}")
+        client.delete_collection(name)
+
+
+if __name__ == "__main__":
+    main()
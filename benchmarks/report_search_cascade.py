@@ -0,0 +1,181 @@
+# benchmarks/report_search_cascade.py
+"""
+Качество и задержка каскада поиска на размеченном корпусе.
+
+Корпус — benchmarks/fixtures/search_corpus.json (документы поддержки и запросы с
+релевантными content_id) плюс, по желанию, шумовые чанки из словаря бенчмарков.
+Всё лежит в Qdrant в памяти процесса, PostgreSQL заменён словарём, поэтому
+замеряются эмбеддинг запроса, поиск кандидатов и reranking.
+
+Эталон — исходная схема: 1000 dense-кандидатов, все через тяжёлый reranker.
+Гибридные конфигурации (rrf, weighted) добавляют sparse-векторы SparseEncoder.
+Шумовые чанки можно собрать в длинные документы (--distractor-chunks) — тогда
+видно, как группировка по content_id в Qdrant освобождает бюджет кандидатов.
+Для каждой конфигурации: recall@limit и MRR по разметке, совпадение top-limit
+с эталоном, среднее число пар в тяжёлом reranker, средняя и p95 задержка.
+
+Запуск:
+    python -m benchmarks.report_search_cascade --distractors 3000
+    python -m benchmarks.report_search_cascade --distractors 3000 --distractor-chunks 50
+    python -m benchmarks.report_search_cascade --first-pass-model cross-encoder/mmarco-mMiniLMv2-L12-H384-v1
+"""
+import argparse
+import json
+import os
+import random
+import time
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, Modifier, PointStruct, SparseVector, SparseVectorParams, VectorParams
+
+from app.content_processor import chunk_hash
+from app.embedder import Embedder
+from app.reranker import Reranker
+from app.services.search_service import SearchService
+from app.sparse_encoder import SparseEncoder
+from benchmarks.bench_length_buckets import WORDS
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "search_corpus.json")
+USER_ID = 1
+
+
+class _Documents:
+    """Вместо PostgresProcessor: документы корпуса по content_id"""
+
+    def __init__(self, documents: dict):
+        self.documents = documents
+
+    def get_documents_by_keys(self, keys):
+        return [dict(self.documents[cid]) for cid, _ in keys if cid in self.documents]
+
+
+class _CountingReranker:
+    """Считает пары, ушедшие в модель reranker"""
+
+    def __init__(self, reranker: Reranker):
+        self.reranker = reranker
+        self.pairs = 0
+
+    def score_pairs(self, queries, documents, doc_hashes=None):
+        self.pairs += len(documents)
+        return self.reranker.score_pairs(queries, documents, doc_hashes=doc_hashes)
+
+
+def make_distractors(n: int, seed: int = 42) -> list:
+    rnd = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        sentences = [" ".join(rnd.choices(WORDS, k=rnd.randint(6, 14))).capitalize() + "."
+                     for _ in range(rnd.randint(2, 5))]
+        texts.append(" ".join(sentences))
+    return texts
+
+
+def build_index(embedder: Embedder, sparse_encoder: SparseEncoder, corpus: dict, distractors: int,
+                distractor_chunks: int = 1):
+    chunks = [(doc["content_id"], doc["text"]) for doc in corpus["documents"]]
+    next_id = max(cid for cid, _ in chunks) + 1
+    chunks += [(next_id + i // distractor_chunks, text) for i, text in enumerate(make_distractors(distractors))]
+
+    vectors = embedder.embed_array([text for _, text in chunks], "passage")
+    client = QdrantClient(location=":memory:")
+    client.create_collection(
+        "search_bench",
+        vectors_config={"dense": VectorParams(size=vectors.shape[1], distance=Distance.COSINE)},
+        sparse_vectors_config={"sparse": SparseVectorParams(modifier=Modifier.IDF)}
+    )
+    points = [
+        PointStruct(
+            id=str(uuid.uuid4()),
+            vector={"dense": vector.tolist(), "sparse": SparseVector(**sparse_encoder.encode_document(text))},
+            payload={"content_id": cid, "user_id": USER_ID, "chunk_text": text, "chunk_hash": chunk_hash(text)}
+        )
+        for (cid, text), vector in zip(chunks, vectors)
+    ]
+    for i in range(0, len(points), 1000):
+        client.upsert("search_bench", points=points[i:i + 1000])
+
+    documents = {}
+    for cid, text in chunks:
+        doc = documents.setdefault(cid, {"content_id": cid, "user_id": USER_ID, "content_text": ""})
+        doc["content_text"] = (doc["content_text"] + "\n\n" + text).strip()
+    qdrant = SimpleNamespace(client=client, collection_name="search_bench", sparse_enabled=True)
+    return qdrant, _Documents(documents)
+
+
+def evaluate(service: SearchService, counter: _CountingReranker, queries: list, limit: int, repeat: int):
+    counter.pairs = 0
+    latencies, rankings = [], []
+    for _ in range(repeat):
+        rankings = []
+        for item in queries:
+            started = time.perf_counter()
+            results = service.search(USER_ID, item["query"], limit=limit)
+            latencies.append(time.perf_counter() - started)
+            rankings.append([doc["content_id"] for doc in results])
+    return rankings, np.array(latencies) * 1000, counter.pairs / (repeat * len(queries))
+
+
+def quality(rankings: list, queries: list, limit: int):
+    recall, mrr = [], []
+    for ranking, item in zip(rankings, queries):
+        relevant = set(item["relevant"])
+        recall.append(len(relevant & set(ranking[:limit])) / len(relevant))
+        rank = next((i + 1 for i, cid in enumerate(ranking) if cid in relevant), None)
+        mrr.append(1 / rank if rank else 0.0)
+    return float(np.mean(recall)), float(np.mean(mrr))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=FIXTURE)
+    parser.add_argument("--distractors", type=int, default=2000, help="шумовых чанков в коллекции")
+    parser.add_argument("--distractor-chunks", type=int, default=1, help="шумовых чанков на документ")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--gaps", type=float, nargs="+", default=[0.05, 0.1])
+    parser.add_argument("--first-pass-model", help="лёгкий cross-encoder для первой ступени")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus = json.load(f)
+    queries = corpus["queries"]
+
+    embedder = Embedder(batching=False, cache=False)
+    # Без кэша оценок: иначе повторы запросов ничего не стоят
+    heavy = _CountingReranker(Reranker(cache=False))
+    first_pass = Reranker(cache=False, model_name=args.first_pass_model) if args.first_pass_model else None
+    sparse_encoder = SparseEncoder()
+    qdrant, documents = build_index(embedder, sparse_encoder, corpus, args.distractors, args.distractor_chunks)
+
+    # Без группировки — как в исходной схеме, если конфигурация не говорит иного
+    baseline = dict(min_candidates=1000, max_candidates=1000, dense_max_gap=0, group_size=0)
+    configs = [("эталон: 1000 кандидатов", baseline), ("адаптивный бюджет", dict(dense_max_gap=0, group_size=0))]
+    configs += [(f"бюджет + gap {gap}", dict(dense_max_gap=gap, group_size=0)) for gap in args.gaps]
+    configs += [(f"бюджет + {fusion}", dict(dense_max_gap=0, sparse_encoder=sparse_encoder, fusion=fusion, group_size=0))
+                for fusion in ("rrf", "weighted")]
+    configs.append(("бюджет + группы", dict(dense_max_gap=0)))
+    configs.append(("бюджет + rrf + группы", dict(dense_max_gap=0, sparse_encoder=sparse_encoder, fusion="rrf")))
+    if first_pass is not None:
+        configs.append(("бюджет + первая ступень", dict(dense_max_gap=0, first_pass_reranker=first_pass, group_size=0)))
+
+    print(f"Чанков: {len(corpus['documents']) + args.distractors}, запросов: {len(queries)}, limit={args.limit}")
+    print(f"{'конфигурация':<26} {'recall':>7} {'MRR':>6} {'= эталон':>9} {'пар':>6} {'ср. мс':>8} {'p95 мс':>8}")
+    reference = None
+    for name, params in configs:
+        service = SearchService(embedder, heavy, qdrant, documents, **params)
+        service.search(USER_ID, queries[0]["query"], limit=args.limit)  # прогрев
+        rankings, latencies, pairs = evaluate(service, heavy, queries, args.limit, args.repeat)
+        if reference is None:
+            reference = rankings
+        agreement = np.mean([r == ref for r, ref in zip(rankings, reference)])
+        recall, mrr = quality(rankings, queries, args.limit)
+        print(f"{name:<26} {recall:>7.3f} {mrr:>6.3f} {agreement:>9.2f} {pairs:>6.0f} "
+              f"{latencies.mean():>8.1f} {np.percentile(latencies, 95):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# tests/test_batcher.py
+import threading
+import time
+import numpy as np
+from app.batcher import MicroBatcher
+
+
+def _fake_encode(calls):
+    def encode(texts):
+        calls.append(len(texts))
+        return np.array([[float(len(t)), float(t.startswith("query: "))] for t in texts], dtype=np.float32)
+    return encode
+
+
+def test_concurrent_callers_share_one_batch():
+    calls = []
+    batcher = MicroBatcher(_fake_encode(calls), max_batch_size=64, max_wait_ms=200)
+    results = {}
+
+    def worker(i):
+        prefix = "query: " if i % 2 == 0 else "passage: "
+        results[i] = batcher.submit([prefix + "x" * i, prefix + "y"])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sum(calls) == 16
+    assert len(calls) < 8
+    for i, emb in results.items():
+        prefix_len = len("query: ") if i % 2 == 0 else len("passage: ")
+        assert emb.shape == (2, 2)
+        assert emb[0, 0] == prefix_len + i
+        assert emb[0, 1] == float(i % 2 == 0)
+
+
+def test_batch_size_is_bounded():
+    calls = []
+    batcher = MicroBatcher(_fake_encode(calls), max_batch_size=4, max_wait_ms=50)
+    threads = [threading.Thread(target=batcher.submit, args=(["a", "b", "c"],)) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(calls) == 15
+    assert max(calls) <= 4
+
+
+def test_errors_reach_every_caller():
+    def failing(texts):
+        raise RuntimeError("boom")
+
+    batcher = MicroBatcher(failing, max_batch_size=8, max_wait_ms=1)
+    try:
+        batcher.submit(["a"])
+    except RuntimeError as e:
+        assert "boom" in str(e)
+    else:
+        raise AssertionError("ожидалась ошибка")
+
+
+def test_batches_overlap_when_in_flight_allowed():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow_encode(texts):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return np.zeros((len(texts), 2), dtype=np.float32)
+
+    batcher = MicroBatcher(slow_encode, max_batch_size=1, max_wait_ms=0, max_in_flight=4)
+    threads = [threading.Thread(target=batcher.submit, args=(["a"],)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] > 1
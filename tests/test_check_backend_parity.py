@@ -0,0 +1,46 @@
+# tests/test_check_backend_parity.py
+import numpy as np
+
+import app.check_backend_parity as parity
+
+
+class _Embedder:
+    """Эталон — единичные векторы; «onnx» отличается небольшим шумом, «broken» — перестановкой"""
+
+    def __init__(self, batching=False, cache=False, backend="torch"):
+        self.backend = backend
+
+    def embed_array(self, texts, emb_type="passage"):
+        vectors = np.eye(len(texts), len(texts) + 1, dtype=np.float32)
+        if self.backend == "onnx":
+            vectors[:, -1] = 0.01
+        elif self.backend == "broken":
+            vectors = vectors[::-1]
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class _Reranker:
+    def __init__(self, shift):
+        self.shift = shift
+
+    def predict(self, pairs, batch_size=32):
+        # Оценка — длина документа; у кандидата сдвиг не меняет порядок
+        return np.array([len(doc) + self.shift for _, doc in pairs], dtype=np.float32)
+
+
+def test_rank_agreement():
+    scores = np.array([0.9, 0.1, 0.5])
+    assert parity.rank_agreement(scores, scores * 2) == 1.0
+    assert parity.rank_agreement(scores, -scores) == -1.0
+    assert parity.rank_agreement(np.array([1.0]), np.array([0.0])) == 1.0
+
+
+def test_close_backend_passes_and_diverging_one_fails(monkeypatch):
+    monkeypatch.setattr(parity, "Embedder", _Embedder)
+    texts = ["а", "б", "в"]
+    assert parity.check_embedder("onnx", texts) > 0.99
+    assert parity.check_embedder("broken", texts) < 0.5
+
+    monkeypatch.setattr(parity, "create_rerank_backend",
+                        lambda backend, model: _Reranker(0.0 if backend == "torch" else 0.5))
+    assert parity.check_reranker("onnx-int8") == (1.0, 1.0)
@@ -0,0 +1,67 @@
+# tests/test_chunker.py
+import io
+import random
+import re
+from app.chunker import iter_semantic_chunks, semantic_chunk, token_chunk
+from benchmarks.legacy_chunker import semantic_chunk_legacy
+
+
+class _WordTokenizer:
+    """Токен — слово или знак препинания; offset_mapping как у fast-токенизаторов HF"""
+
+    def __call__(self, text, add_special_tokens=True, truncation=False, return_offsets_mapping=False):
+        spans = [(m.start(), m.end()) for m in re.finditer(r"\w+|[^\w\s]", text)]
+        result = {"input_ids": [hash(text[a:b]) % 1000 for a, b in spans]}
+        if return_offsets_mapping:
+            result["offset_mapping"] = spans
+        return result
+
+
+def test_chunks_fit_token_budget_and_keep_ids():
+    tokenizer = _WordTokenizer()
+    text = "Первое предложение про доставку. Второе предложение про оплату!\n\n" * 40
+    chunks = token_chunk(text, tokenizer, max_tokens=30, overlap=5)
+    assert len(chunks) > 1
+    for chunk_text, start, end, ids in chunks:
+        assert len(ids) <= 30
+        assert text.strip()[start:end] == chunk_text
+        assert ids == tokenizer(chunk_text)["input_ids"]
+    assert chunks[-1][2] == len(text.strip())
+
+
+def test_boundaries_snap_to_sentences():
+    text = " ".join(f"Предложение номер {i} заканчивается точкой." for i in range(50))
+    chunks = token_chunk(text, _WordTokenizer(), max_tokens=40, overlap=0)
+    assert all(c[0].endswith(".") for c in chunks)
+    # Без перекрытия чанки стыкуются и покрывают весь текст
+    assert " ".join(c[0] for c in chunks) == text
+
+
+def test_short_text_is_single_chunk():
+    chunks = token_chunk("  Короткий текст.  ", _WordTokenizer(), max_tokens=512)
+    assert [c[:3] for c in chunks] == [("Короткий текст.", 0, 15)]
+    assert token_chunk("   ", _WordTokenizer()) == []
+
+
+def _random_text(rnd, n):
+    parts = ["слово", "word", " ", " ", "  ", "\n", "\n\n", ".", "!", "?", ";", "…", ","]
+    return "".join(rnd.choice(parts) for _ in range(n))
+
+
+def test_semantic_chunk_matches_legacy():
+    rnd = random.Random(0)
+    for _ in range(300):
+        text = _random_text(rnd, rnd.choice([0, 20, 200, 1500]))
+        if rnd.random() < 0.3:
+            text = " \n " + text + "\n\n  "
+        size = rnd.choice([10, 100, 301, 1500])
+        overlap = rnd.choice([0, 40, 200, 2000])
+        assert semantic_chunk(text, size, overlap) == semantic_chunk_legacy(text, size, overlap)
+
+
+def test_streaming_sources_match_string():
+    text = _random_text(random.Random(1), 20000)
+    expected = semantic_chunk_legacy(text, 1500, 40)
+    assert list(iter_semantic_chunks(io.StringIO(text), 1500, 40, read_size=777)) == expected
+    pieces = (text[i:i + 100] for i in range(0, len(text), 100))
+    assert list(iter_semantic_chunks(pieces, 1500, 40)) == expected
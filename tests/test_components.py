@@ -0,0 +1,45 @@
+# tests/test_components.py
+from app.components import ComponentRegistry
+
+
+class _Model:
+    loads = 0
+
+    def __init__(self):
+        _Model.loads += 1
+        self.dim = 384
+
+
+def test_component_is_loaded_on_first_use_only():
+    registry = ComponentRegistry()
+    model = registry.register("model", _Model)
+    assert _Model.loads == 0
+    assert registry.status()["components"]["model"]["state"] == "pending"
+
+    assert model.dim == 384
+    assert model.dim == 384
+    assert _Model.loads == 1
+    assert registry.status()["status"] == "ready"
+
+
+def test_failed_component_is_reported_and_retried():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("нет соединения")
+        return {"ok": True}
+
+    registry = ComponentRegistry()
+    db = registry.register("db", flaky)
+    try:
+        db.get("ok")
+    except RuntimeError as e:
+        assert "нет соединения" in str(e)
+    else:
+        raise AssertionError("ожидалась ошибка")
+    assert registry.status()["status"] == "failed"
+
+    assert db.get("ok") is True
+    assert registry.status()["status"] == "ready"
@@ -0,0 +1,90 @@
+# tests/test_content_batch.py
+import pytest
+
+pytest.importorskip("umap")  # content_processor → cluster_utils
+from app.content_processor import ContentProcessor
+
+
+class _Embedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed(self, texts, emb_type="passage", token_ids=None):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+class _Qdrant:
+    def __init__(self):
+        self.points = []
+
+    def save_chunks(self, chunks):
+        self.points.extend(chunks)
+        return [item["chunk_id"] for item in chunks]
+
+
+class _Postgres:
+    def __init__(self, existing=None):
+        self.existing = existing or {}
+        self.saved = []
+        self.lookups = 0
+
+    def get_content_ids_by_hashes(self, keys):
+        self.lookups += 1
+        return {key: self.existing[key] for key in keys if key in self.existing}
+
+    def save_documents(self, documents):
+        self.saved.append(documents)
+        return True
+
+    def get_cluster_centroids(self, user_id):
+        return {}
+
+
+def test_batch_dedupes_and_shares_one_embedding_call():
+    embedder, qdrant = _Embedder(), _Qdrant()
+    first = ContentProcessor(embedder, _Postgres())
+    stored = first.process_and_save_batch([{"text": "Уже сохранённый документ", "user_id": 1}], qdrant)
+    existing_id = stored["results"][0]["content_id"]
+    existing_hash = first.postgres_processor.saved[0][0]["content_hash"]
+
+    postgres = _Postgres({(1, existing_hash): existing_id})
+    processor = ContentProcessor(embedder, postgres)
+    documents = [
+        {"text": "Доставка курьером. " * 30, "user_id": 1, "header": "Доставка"},
+        {"text": "Уже сохранённый документ", "user_id": 1},
+        {"text": "Оплата картой", "user_id": 2},
+        {"text": "  Оплата картой ", "user_id": 2},
+        {"text": " ", "user_id": 2},
+    ]
+    embedder.calls.clear()
+    qdrant.points.clear()
+    result = processor.process_and_save_batch(documents, qdrant, chunk_size=200, overlap=0)
+
+    statuses = [r["status"] for r in result["results"]]
+    assert statuses == ["created", "duplicates", "created", "duplicates", "error"]
+    assert result["results"][1]["content_id"] == existing_id
+    assert result["results"][3]["content_id"] == result["results"][2]["content_id"]
+    assert postgres.lookups == 1 and len(postgres.saved) == 1 and len(postgres.saved[0]) == 2
+    assert len(embedder.calls) == 1
+    assert result["stats"]["chunks"] == len(qdrant.points) == result["results"][0]["saved_chunks"] + 1
+    # Чанки документа — подряд и со своими метаданными
+    delivery = [p for p in qdrant.points if p["content_id"] == result["results"][0]["content_id"]]
+    assert [p["chunk_order"] for p in delivery] == list(range(len(delivery)))
+    assert all(p["header"] == "Доставка" and p["user_id"] == 1 for p in delivery)
+
+
+def test_parallel_chunking_matches_sequential_and_pool_is_closed(monkeypatch):
+    import app.content_processor as content_processor
+
+    monkeypatch.setattr(content_processor, "ingest_chunk_workers", 2)
+    monkeypatch.setattr(content_processor, "ingest_parallel_chunk_min_chars", 0)
+    processor = ContentProcessor(_Embedder(), _Postgres())
+    texts = [f"Раздел {i}. " + "Условия доставки и оплаты. " * 40 for i in range(4)]
+    expected = [processor.chunk(text, 300, 0) for text in texts]
+    assert processor.chunk_many(texts, 300, 0) == expected
+    assert processor._chunk_pool is not None
+
+    processor.close()
+    assert processor._chunk_pool is None
+    processor.close()  # повторный вызов — без ошибок
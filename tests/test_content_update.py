@@ -0,0 +1,74 @@
+# tests/test_content_update.py
+import uuid
+import pytest
+
+pytest.importorskip("umap")  # content_processor → cluster_utils
+from app.content_processor import ContentProcessor
+
+
+class _Embedder:
+    def __init__(self):
+        self.embedded = []
+
+    def embed(self, texts, emb_type="passage", token_ids=None):
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+class _Qdrant:
+    """Точки в словаре: id → payload"""
+
+    def __init__(self):
+        self.points = {}
+
+    def save_chunks(self, chunks):
+        for item in chunks:
+            item.pop("dense_vector")
+            item.pop("sparse_vector", None)
+            self.points[item["chunk_id"]] = item
+        return [item["chunk_id"] for item in chunks]
+
+    def get_document_chunks(self, content_id, user_id):
+        return [{"id": pid, "payload": dict(p)} for pid, p in self.points.items()
+                if p["content_id"] == content_id and p["user_id"] == user_id]
+
+    def set_chunk_payloads(self, payloads):
+        for pid, payload in payloads.items():
+            self.points[pid].update(payload)
+
+    def delete_points(self, ids):
+        for pid in ids:
+            del self.points[pid]
+
+
+def _document(paragraphs):
+    return "\n\n".join(paragraphs)
+
+
+def test_update_embeds_only_changed_chunks():
+    embedder, qdrant = _Embedder(), _Qdrant()
+    processor = ContentProcessor(embedder)
+    paragraphs = [f"Раздел {i}. " + "Текст раздела про доставку и оплату. " * 8 for i in range(10)]
+    saved = processor.process_and_save(_document(paragraphs), qdrant, chunk_size=400, overlap=0, user_id=1)
+    original_ids = set(qdrant.points)
+    embedder.embedded.clear()
+
+    paragraphs[4] = paragraphs[4].replace("доставку", "возврат")
+    result = processor.update_document(saved["content_id"], _document(paragraphs), qdrant,
+                                       chunk_size=400, overlap=0, user_id=1)
+
+    assert result["status"] == "updated"
+    assert 0 < result["embedded_chunks"] <= 2
+    assert embedder.embedded and all("возврат" in t for t in embedder.embedded)
+    assert result["reused_chunks"] + result["embedded_chunks"] == len(qdrant.points)
+    assert len(original_ids & set(qdrant.points)) == result["reused_chunks"]
+    assert sorted(p["chunk_order"] for p in qdrant.points.values()) == list(range(len(qdrant.points)))
+    # Метаданные документа обновлены и у переиспользованных точек
+    assert len({(p["content_hash"], p["document_id"]) for p in qdrant.points.values()}) == 1
+    assert all(p["document_id"] == result["document_id"] for p in qdrant.points.values())
+
+
+def test_update_unknown_document():
+    processor = ContentProcessor(_Embedder())
+    result = processor.update_document(uuid.uuid4().int % 1000, "Текст", _Qdrant(), user_id=1)
+    assert result["status"] == "not_found"
@@ -0,0 +1,64 @@
+# tests/test_dim_reduction.py
+import numpy as np
+import pytest
+from app.dim_reduction import PCAProjection, TruncationReducer, create_reducer, output_dim
+
+
+def _unit_vectors(n, dim, seed=0):
+    rnd = np.random.default_rng(seed)
+    # Данные с низкой эффективной размерностью, как у реальных эмбеддингов
+    x = rnd.normal(size=(n, 8)) @ rnd.normal(size=(8, dim)) + 0.01 * rnd.normal(size=(n, dim))
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_truncation_renormalizes():
+    vectors = _unit_vectors(10, 32)
+    reduced = TruncationReducer(8).transform(vectors)
+    assert reduced.shape == (10, 8)
+    assert np.allclose(np.linalg.norm(reduced, axis=1), 1.0, atol=1e-5)
+
+
+def test_pca_roundtrip_and_neighbours(tmp_path):
+    vectors = _unit_vectors(300, 64)
+    projection = PCAProjection.fit(vectors, 16)
+    path = str(tmp_path / "pca.npz")
+    projection.save(path)
+    loaded = create_reducer("pca", 16, 64, path)
+    assert np.allclose(loaded.transform(vectors), projection.transform(vectors))
+
+    # Ближайший сосед почти всегда сохраняется
+    full = vectors @ vectors.T
+    reduced = loaded.transform(vectors)
+    small = reduced @ reduced.T
+    np.fill_diagonal(full, -np.inf)
+    np.fill_diagonal(small, -np.inf)
+    assert (full.argmax(axis=1) == small.argmax(axis=1)).mean() > 0.9
+
+
+def test_create_reducer_validation(tmp_path):
+    assert create_reducer("truncate", 0, 384) is None
+    assert create_reducer("truncate", 384, 384) is None
+    assert create_reducer("truncate", 512, 384) is None
+    with pytest.raises(ValueError):
+        create_reducer("pca", 128, 384)
+    path = str(tmp_path / "pca.npz")
+    PCAProjection.fit(_unit_vectors(50, 32), 8).save(path)
+    with pytest.raises(ValueError):
+        create_reducer("pca", 16, 32, path)
+
+
+def test_output_dim_matches_reducer():
+    # Размерность коллекции Qdrant по умолчанию должна совпадать с размерностью эмбеддера
+    assert [output_dim(dim, 384) for dim in (0, 128, 384, 512)] == [384, 128, 384, 384]
+    assert create_reducer("truncate", 128, 384).dim == output_dim(128, 384)
+
+
+def test_configured_dim_reads_model_config_without_weights(monkeypatch):
+    import sys
+    import types
+    from app.embedder import configured_dim
+
+    transformers = types.ModuleType("transformers")
+    transformers.AutoConfig = types.SimpleNamespace(from_pretrained=lambda name: types.SimpleNamespace(hidden_size=384))
+    monkeypatch.setitem(sys.modules, "transformers", transformers)
+    assert [configured_dim.__wrapped__("model", dim) for dim in (0, 128, 512)] == [384, 128, 384]
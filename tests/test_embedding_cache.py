@@ -0,0 +1,51 @@
+# tests/test_embedding_cache.py
+import numpy as np
+from app.embedding_cache import EmbeddingCache, DiskEmbeddingStore, embedding_cache_key
+
+
+def test_key_depends_on_model_and_prefix():
+    base = embedding_cache_key("m", "query: ", "текст")
+    assert base == embedding_cache_key("m", "query: ", "текст")
+    assert base != embedding_cache_key("m", "passage: ", "текст")
+    assert base != embedding_cache_key("other", "query: ", "текст")
+
+
+def test_memory_tier_counts_hits_misses_and_evictions():
+    cache = EmbeddingCache("m", max_entries=2)
+    keys = [cache.key("query: ", t) for t in ("a", "b", "c")]
+    cache.put_many(keys, np.eye(3, dtype=np.float32))
+
+    found = cache.get_many(keys)
+    assert found[0] is None
+    assert np.array_equal(found[2], [0, 0, 1])
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    assert stats["memory"]["evictions"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    cache = EmbeddingCache("m", max_entries=10, disk_path=str(tmp_path), disk_capacity=4)
+    key = cache.key("passage: ", "абзац")
+    cache.put_many([key], np.array([[0.6, 0.8]], dtype=np.float32))
+    cache.disk.flush()
+
+    restarted = EmbeddingCache("m", max_entries=10, disk_path=str(tmp_path), disk_capacity=4)
+    vector = restarted.get_many([key])[0]
+    assert np.allclose(vector, [0.6, 0.8])
+    assert restarted.stats()["disk"]["hits"] == 1
+
+
+def test_disk_ring_buffer_evicts_oldest(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path), capacity=2)
+    for i in range(5):
+        store.put(f"k{i}", np.full(3, i, dtype=np.float32))
+    assert store.get("k0") is None
+    assert np.allclose(store.get("k4"), 4)
+    assert store.evictions == 3
+
+    reopened = DiskEmbeddingStore(str(tmp_path), capacity=2)
+    assert reopened.get("k2") is None
+    assert np.allclose(reopened.get("k3"), 3)
+    reopened.put("k5", np.full(3, 5, dtype=np.float32))
+    assert reopened.get("k3") is None
+    assert np.allclose(reopened.get("k4"), 4)
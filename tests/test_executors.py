@@ -0,0 +1,56 @@
+# tests/test_executors.py
+import asyncio
+import inspect
+import threading
+import time
+from app.executors import StageExecutor
+
+
+def test_nested_call_runs_inline():
+    executor = StageExecutor("test", 1)
+    # С одним потоком вложенный call через очередь ждал бы сам себя
+    assert executor.call(lambda: executor.call(lambda: threading.current_thread().name)).startswith("test-stage")
+    assert executor.stats() == {"max_workers": 1, "active": 0, "queued": 0, "completed": 1}
+
+
+def test_run_keeps_event_loop_free():
+    executor = StageExecutor("test", 2)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        task = asyncio.ensure_future(ticker())
+        results = await asyncio.gather(*(executor.run(time.sleep, 0.1) for _ in range(2)))
+        task.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(main())
+    assert results == [None, None] and ticks >= 10
+
+
+def test_offload_keeps_signature_and_counts_cancelled():
+    executor = StageExecutor("test", 1)
+
+    @executor.offload
+    def handler(user_id: int, limit: int = 5):
+        return user_id * limit
+
+    assert inspect.iscoroutinefunction(handler)
+    assert list(inspect.signature(handler).parameters) == ["user_id", "limit"]
+    assert asyncio.run(handler(3, limit=2)) == 6
+
+    started, release = threading.Event(), threading.Event()
+    blocker = executor.submit(lambda: (started.set(), release.wait(5)))
+    started.wait(5)
+    queued = executor.submit(lambda: None)
+    assert executor.stats()["queued"] == 1
+    queued.cancel()
+    release.set()
+    blocker.result()
+    assert executor.stats()["queued"] == 0
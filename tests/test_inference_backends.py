@@ -0,0 +1,97 @@
+# tests/test_inference_backends.py
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+import app.inference_backends as inference_backends
+import app.worker_pool as worker_pool
+from app.inference_backends import OnnxEmbeddingBackend, create_embedding_backend, create_rerank_backend
+
+
+class _Session:
+    """InferenceSession: отдаёт заданный last_hidden_state и запоминает входы"""
+
+    def __init__(self, hidden):
+        self.hidden = hidden
+        self.inputs = None
+
+    def run(self, output_names, inputs):
+        self.inputs = inputs
+        return [self.hidden]
+
+
+def _onnx_backend(hidden):
+    backend = OnnxEmbeddingBackend.__new__(OnnxEmbeddingBackend)
+    backend.session = _Session(hidden)
+    return backend
+
+
+def test_factories_pick_backend_by_name(monkeypatch):
+    created = []
+
+    def fake(kind):
+        return lambda model_name, **kwargs: created.append((kind, model_name, kwargs)) or kind
+
+    for name in ("TorchEmbeddingBackend", "OnnxEmbeddingBackend", "TorchRerankBackend", "OnnxRerankBackend"):
+        monkeypatch.setattr(inference_backends, name, fake(name))
+    for name in ("PooledEmbeddingBackend", "PooledRerankBackend"):
+        monkeypatch.setattr(worker_pool, name, fake(name))
+
+    assert [create_embedding_backend(name, "m") for name in ("torch", "onnx", "onnx-int8", "pool")] == [
+        "TorchEmbeddingBackend", "OnnxEmbeddingBackend", "OnnxEmbeddingBackend", "PooledEmbeddingBackend"
+    ]
+    assert [create_rerank_backend(name, "m") for name in ("torch", "onnx", "onnx-int8", "pool")] == [
+        "TorchRerankBackend", "OnnxRerankBackend", "OnnxRerankBackend", "PooledRerankBackend"
+    ]
+    assert [kwargs for kind, _, kwargs in created if kind.startswith("Onnx")] == [
+        {"quantized": False}, {"quantized": True}, {"quantized": False}, {"quantized": True}
+    ]
+    with pytest.raises(ValueError):
+        create_embedding_backend("tensorrt", "m")
+    with pytest.raises(ValueError):
+        create_rerank_backend("tensorrt", "m")
+
+
+def test_onnx_mean_pooling_ignores_padding_and_normalizes():
+    hidden = np.array([
+        [[0.0, 0.0], [6.0, 8.0], [100.0, 0.0]],  # третий токен — паддинг
+        [[0.0, 2.0], [0.0, 2.0], [0.0, 2.0]],
+    ], dtype=np.float32)
+    attention_mask = np.array([[1, 1, 0], [1, 1, 1]], dtype=np.int32)
+    backend = _onnx_backend(hidden)
+
+    out = backend.encode_padded(np.ones((2, 3), dtype=np.int32), attention_mask)
+    assert out.dtype == np.float32
+    np.testing.assert_allclose(out, [[0.6, 0.8], [0.0, 1.0]], atol=1e-6)
+    # ONNX-граф экспортирован с входами int64
+    assert all(value.dtype == np.int64 for value in backend.session.inputs.values())
+
+
+def test_onnx_cls_pooling_takes_first_token(monkeypatch):
+    monkeypatch.setattr(inference_backends, "embedding_pooling", "cls")
+    hidden = np.array([[[0.0, 5.0], [1.0, 0.0]]], dtype=np.float32)
+    out = _onnx_backend(hidden).encode_padded(np.ones((1, 2)), np.ones((1, 2)))
+    np.testing.assert_allclose(out, [[0.0, 1.0]])
+
+
+def test_pooled_reranker_splits_pairs_and_keeps_order():
+    class _Pool:
+        def __init__(self):
+            self.batches = []
+
+        def shared_weights(self, kind, model_name):
+            return f"/tmp/{model_name}.{kind}.pt"
+
+        def submit(self, fn, model_name, weights_path, pairs, batch_size):
+            self.batches.append(len(pairs))
+            future = Future()
+            future.set_result(np.array([float(doc) for _, doc in pairs], dtype=np.float32))
+            return future
+
+    pool = _Pool()
+    backend = worker_pool.PooledRerankBackend("reranker", pool=pool)
+    scores = backend.predict([("q", str(i)) for i in range(5)], batch_size=2)
+    assert pool.batches == [2, 2, 1]
+    np.testing.assert_array_equal(scores, [0, 1, 2, 3, 4])
+    assert backend.predict([]).shape == (0,)
@@ -0,0 +1,112 @@
+# tests/test_pg_pool.py
+import threading
+import psycopg2
+import pytest
+from app.pg_pool import ConnectionPool, PoolTimeout
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.connection = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.connection.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.connection.executed.append(sql.split(" (")[0])
+
+
+class _Connection:
+    opened = 0
+
+    def __init__(self):
+        _Connection.opened += 1
+        self.closed = 0
+        self.broken = False
+        self.executed = []
+        self.commits = 0
+
+    def cursor(self, cursor_factory=None):
+        return _Cursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture(autouse=True)
+def _reset_counter():
+    _Connection.opened = 0
+
+
+def test_connections_are_reused_and_committed():
+    pool = ConnectionPool(_Connection, min_size=1, max_size=2)
+    for _ in range(3):
+        with pool.connection() as conn:
+            pass
+    assert _Connection.opened == 1 and conn.commits == 3
+    assert pool.stats()["acquired"] == 3 and pool.stats()["idle"] == 1
+
+
+def test_saturated_pool_waits_then_times_out():
+    pool = ConnectionPool(_Connection, min_size=0, max_size=1, timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+
+    def hold():
+        with pool.connection():
+            started.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    started.wait(5)
+    assert pool.stats()["saturation"] == 1.0
+    with pytest.raises(PoolTimeout):
+        with pool.connection():
+            pass
+
+    threading.Timer(0.02, release.set).start()
+    pool.timeout = 5
+    with pool.connection():
+        pass
+    holder.join()
+    stats = pool.stats()
+    assert stats["timeouts"] == 1 and stats["waited"] == 1 and stats["wait_ms_max"] > 0
+    assert _Connection.opened == 1
+
+
+def test_idle_connection_failing_health_check_is_replaced():
+    pool = ConnectionPool(_Connection, min_size=1, max_size=1, health_check_idle=0)
+    with pool.connection() as first:
+        first.broken = True
+    with pool.connection() as second:
+        assert second is not first and first.closed
+    assert pool.stats()["health_check_failures"] == 1 and pool.stats()["size"] == 1
+
+
+def test_statement_is_prepared_once_per_connection_and_reset_after_error():
+    pool = ConnectionPool(_Connection, min_size=1, max_size=1)
+    for _ in range(2):
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                pool.execute_prepared(cur, "by_user", "SELECT 1 WHERE $1 > 0", (1,), types=("integer",))
+    assert conn.executed == ["PREPARE by_user(integer) AS SELECT 1 WHERE $1 > 0", "EXECUTE by_user", "EXECUTE by_user"]
+
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError
+    # После ошибки подготовленные запросы сброшены и готовятся заново
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            pool.execute_prepared(cur, "by_user", "SELECT 1 WHERE $1 > 0", (1,), types=("integer",))
+    assert conn.executed[-3:] == ["DEALLOCATE ALL", "PREPARE by_user(integer) AS SELECT 1 WHERE $1 > 0", "EXECUTE by_user"]
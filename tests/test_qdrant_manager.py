@@ -0,0 +1,100 @@
+# tests/test_qdrant_manager.py
+from types import SimpleNamespace
+from qdrant_client.models import (
+    CollectionParams, Disabled, HnswConfig, ScalarQuantization, KeywordIndexParams, OptimizersConfig, PayloadIndexInfo,
+    PayloadSchemaType, VectorParams, Distance
+)
+import app.qdrant_manager as qdrant_manager
+from app.qdrant_manager import PAYLOAD_INDEXES, QdrantManager, query_requests, search_params
+
+
+class _Client:
+    """Существующая коллекция со старыми параметрами; запоминает изменения"""
+
+    def __init__(self):
+        self.config = SimpleNamespace(
+            params=CollectionParams(vectors={"dense": VectorParams(size=4, distance=Distance.COSINE)}, on_disk_payload=False),
+            hnsw_config=HnswConfig(m=16, ef_construct=100, full_scan_threshold=10000),
+            optimizer_config=OptimizersConfig(deleted_threshold=0.2, vacuum_min_vector_number=1000,
+                                              default_segment_number=0, flush_interval_sec=5),
+            quantization_config=None
+        )
+        self.payload_schema = {}
+        self.calls = []
+
+    def collection_exists(self, name):
+        return True
+
+    def get_collection(self, name):
+        return SimpleNamespace(config=self.config, payload_schema=self.payload_schema)
+
+    def update_collection(self, collection_name, hnsw_config=None, optimizers_config=None, collection_params=None,
+                          vectors_config=None, quantization_config=None):
+        self.calls.append("update")
+        if quantization_config is not None:
+            self.config.quantization_config = None if quantization_config == Disabled.DISABLED else quantization_config
+        for target, diff in ((self.config.hnsw_config, hnsw_config), (self.config.optimizer_config, optimizers_config),
+                             (self.config.params, collection_params)):
+            for key, value in (diff.model_dump(exclude_none=True) if diff else {}).items():
+                setattr(target, key, value)
+
+    def create_payload_index(self, collection_name, field_name, field_schema, wait=True):
+        self.calls.append(("create", field_name))
+        self.payload_schema[field_name] = PayloadIndexInfo(data_type=field_schema.type.value, params=field_schema, points=0)
+
+    def upsert(self, collection_name, points):
+        self.calls.append(("upsert", len(points)))
+
+    def delete_payload_index(self, collection_name, field_name, wait=True):
+        self.calls.append(("delete", field_name))
+        del self.payload_schema[field_name]
+
+
+def test_migration_is_idempotent():
+    client = _Client()
+    manager = QdrantManager(vector_size=4, client=client)
+    assert client.calls == ["update"] + [("create", field) for field in PAYLOAD_INDEXES]
+    assert client.config.params.on_disk_payload is True and client.config.hnsw_config.payload_m == 16
+    assert not manager.sparse_enabled  # у старой коллекции нет sparse-вектора
+
+    client.calls.clear()
+    QdrantManager(vector_size=4, client=client)
+    assert client.calls == []
+
+    # Индекс другого типа пересоздаётся, остальные не трогаются
+    client.payload_schema["user_id"] = PayloadIndexInfo(data_type=PayloadSchemaType.KEYWORD,
+                                                        params=KeywordIndexParams(type="keyword"), points=0)
+    QdrantManager(vector_size=4, client=client)
+    assert client.calls == [("delete", "user_id"), ("create", "user_id")]
+
+
+def test_quantization_is_migrated_and_reaches_dense_queries(monkeypatch):
+    client = _Client()
+    QdrantManager(vector_size=4, client=client)
+    client.calls.clear()
+
+    monkeypatch.setattr(qdrant_manager, "qdrant_quantization", "scalar")
+    QdrantManager(vector_size=4, client=client)
+    assert client.calls == ["update"] and isinstance(client.config.quantization_config, ScalarQuantization)
+    QdrantManager(vector_size=4, client=client)
+    assert client.calls == ["update"]
+
+    monkeypatch.setattr(qdrant_manager, "qdrant_quantization", "")
+    QdrantManager(vector_size=4, client=client)
+    assert client.calls == ["update", "update"] and client.config.quantization_config is None
+
+    params = search_params(oversampling=3.0, rescore=True)
+    [rrf] = query_requests([1.0, 0.0], {"indices": [1], "values": [1.0]}, fusion="rrf", params=params)
+    # Квантизация только у dense-векторов
+    assert rrf.prefetch[0].params.quantization.oversampling == 3.0 and rrf.prefetch[1].params is None
+
+
+def test_large_saves_are_split_into_parallel_batches(monkeypatch):
+    client = _Client()
+    manager = QdrantManager(vector_size=4, client=client)
+    client.calls.clear()
+    monkeypatch.setattr(qdrant_manager, "qdrant_upsert_batch_size", 2)
+    chunks = [{"chunk_id": f"00000000-0000-0000-0000-00000000000{i}", "dense_vector": [1.0, 0, 0, 0]} for i in range(5)]
+    assert len(manager.save_chunks(chunks)) == 5
+    assert sorted(client.calls) == [("upsert", 1), ("upsert", 2), ("upsert", 2)]
+    assert manager.upsert_executor.stats()["completed"] == 3
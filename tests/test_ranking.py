@@ -0,0 +1,45 @@
+# tests/test_ranking.py
+import numpy as np
+from app.ranking import best_per_group, rank_groups, top_k_indices
+
+
+def _naive(group_ids, scores, threshold, k):
+    best = {}
+    for gid, score in zip(group_ids.tolist(), scores.tolist()):
+        if score > threshold and score > best.get(gid, -np.inf):
+            best[gid] = score
+    return sorted(best.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+def test_rank_groups_matches_naive():
+    rnd = np.random.default_rng(0)
+    for n in (0, 1, 7, 300, 5000):
+        group_ids = rnd.integers(0, max(1, n // 5), size=n).astype(np.int64) * 10**12
+        scores = rnd.random(n).astype(np.float32)
+        for k in (1, 5, 1000):
+            ids, best = rank_groups(group_ids, scores, 0.15, k)
+            expected = _naive(group_ids, scores, 0.15, k)
+            assert list(zip(ids.tolist(), best.tolist())) == expected
+
+
+def test_best_per_group_and_top_k():
+    ids, best = best_per_group(np.array([3, 1, 3, 2, 1]), np.array([0.1, 0.5, 0.9, 0.2, 0.4]))
+    assert ids.tolist() == [1, 2, 3] and np.allclose(best, [0.5, 0.2, 0.9])
+    assert top_k_indices(np.array([0.2, 0.9, 0.2, 0.5]), 3).tolist() == [1, 3, 0]
+    assert top_k_indices(np.array([0.2, 0.9]), 5).tolist() == [1, 0]
+    assert len(top_k_indices(np.zeros(0), 3)) == 0
+
+
+def test_weighted_fusion_normalizes_each_list():
+    from types import SimpleNamespace
+    from app.ranking import weighted_fusion
+
+    def points(*pairs):
+        return [SimpleNamespace(id=i, score=s, model_copy=lambda update, i=i: SimpleNamespace(id=i, **update))
+                for i, s in pairs]
+
+    dense = points(("a", 0.9), ("b", 0.8), ("c", 0.7))
+    sparse = points(("c", 12.0), ("d", 2.0))
+    fused = weighted_fusion([dense, sparse], [0.7, 0.3], limit=3)
+    assert [p.id for p in fused] == ["a", "b", "c"]
+    assert np.allclose([p.score for p in fused], [0.7, 0.35, 0.3])
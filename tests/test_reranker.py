@@ -0,0 +1,62 @@
+# tests/test_reranker.py
+import numpy as np
+from app import reranker as reranker_module
+from app.chunker import chunk_hash
+from app.inference_backends import RerankBackend
+from app.rerank_cache import normalize_query
+
+
+class _CountingBackend(RerankBackend):
+    def __init__(self):
+        self.pairs = []
+
+    def predict(self, pairs, batch_size=32):
+        self.pairs.extend(pairs)
+        return np.array([len(doc) / 100.0 for _, doc in pairs], dtype=np.float32)
+
+
+def _reranker(monkeypatch):
+    backend = _CountingBackend()
+    monkeypatch.setattr(reranker_module, "create_rerank_backend", lambda name, model: backend)
+    return reranker_module.Reranker(backend="torch", cache=True), backend
+
+
+def test_scores_are_aligned_and_cached(monkeypatch):
+    reranker, backend = _reranker(monkeypatch)
+    docs = ["ccc", "a", "bb", "a"]
+    scores = reranker.score("вернуть товар", docs)
+    assert np.allclose(scores, [0.03, 0.01, 0.02, 0.01])
+    assert len(backend.pairs) == 3  # повтор "a" — одна пара
+
+    # Тот же запрос с другими пробелами: в модель уходит только новый чанк
+    scores = reranker.score("  вернуть   товар ", docs + ["dddd"])
+    assert np.allclose(scores, [0.03, 0.01, 0.02, 0.01, 0.04])
+    assert len(backend.pairs) == 4
+    stats = reranker.cache.stats()
+    assert stats["size"] == 4 and stats["hits"] == 4
+
+
+def test_score_pairs_mixes_queries_in_one_pass(monkeypatch):
+    reranker, backend = _reranker(monkeypatch)
+    scores = reranker.score_pairs(["доставка", "оплата ", "доставка"], ["a", "a", "a"])
+    assert np.allclose(scores, [0.01, 0.01, 0.01])
+    assert backend.pairs == [("доставка", "a"), ("оплата", "a")]
+    reranker.score("оплата", ["a"])
+    assert len(backend.pairs) == 2
+
+
+
+def test_payload_chunk_hash_and_computed_hash_share_cache_entry(monkeypatch):
+    # Поиск передаёт chunk_hash из payload, остальные вызовы считают хеш сами — ключ один
+    reranker, backend = _reranker(monkeypatch)
+    reranker.score_pairs(["доставка"], ["текст чанка"], doc_hashes=[chunk_hash("текст чанка")])
+    reranker.score("доставка", ["текст чанка"])
+    assert len(backend.pairs) == 1
+
+def test_rerank_keeps_sorted_output(monkeypatch):
+    reranker, _ = _reranker(monkeypatch)
+    assert [doc for _, doc in reranker.rerank("q", ["a", "ccc", "bb"], top_k=2)] == ["ccc", "bb"]
+
+
+def test_normalize_query():
+    assert normalize_query(" как\tвернуть  товар\n") == "как вернуть товар"
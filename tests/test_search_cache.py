@@ -0,0 +1,45 @@
+# tests/test_search_cache.py
+import time
+import pytest
+from app.search_cache import SearchResultCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    path = str(tmp_path / "search.db") if request.param == "sqlite" else ""
+    return lambda **kwargs: SearchResultCache(path=path, **kwargs)
+
+
+def test_generation_bump_invalidates_only_that_user(make_cache):
+    cache = make_cache()
+    results = [{"content_id": 1, "rerank_score": 0.9}]
+    cache.put(cache.key(1, "вернуть  товар", None, 5), results)
+    cache.put(cache.key(2, "вернуть товар", None, 5), results)
+
+    assert cache.get(cache.key(1, " вернуть товар", None, 5)) == results
+    assert cache.get(cache.key(1, "вернуть товар", "0", 5)) is None
+    assert cache.get(cache.key(1, "вернуть товар", None, 3)) is None
+
+    cache.bump(1)
+    assert cache.get(cache.key(1, "вернуть товар", None, 5)) is None
+    assert cache.get(cache.key(2, "вернуть товар", None, 5)) == results
+
+
+def test_ttl_expiry(make_cache):
+    cache = make_cache(ttl_seconds=0.05)
+    key = cache.key(1, "запрос", None, 5)
+    cache.put(key, [])
+    assert cache.get(key) == []
+    time.sleep(0.1)
+    assert cache.get(key) is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_sqlite_store_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "search.db")
+    worker_a, worker_b = SearchResultCache(path=path), SearchResultCache(path=path)
+    worker_a.put(worker_a.key(1, "запрос", None, 5), [{"content_id": 7}])
+    assert worker_b.get(worker_b.key(1, "запрос", None, 5)) == [{"content_id": 7}]
+    # Сохранение документа в одном воркере сбрасывает кэш другого
+    worker_b.bump(1)
+    assert worker_a.get(worker_a.key(1, "запрос", None, 5)) is None
@@ -0,0 +1,233 @@
+# tests/test_search_service.py
+from types import SimpleNamespace
+import numpy as np
+from app.services.search_service import SearchService
+
+
+class _Embedder:
+    def __init__(self):
+        self.calls = []
+
+    def embed_array(self, texts, emb_type="passage"):
+        self.calls.append(list(texts))
+        return np.array([[1.0, 0.0] for _ in texts], dtype=np.float32)
+
+
+class _Client:
+    """query_points отдаёт заранее заданные точки по убыванию dense-скора"""
+
+    def __init__(self, points):
+        self.points = points
+        self.limits = []
+
+    def query_batch_points(self, collection_name, requests):
+        self.limits.append([r.limit for r in requests])
+        return [SimpleNamespace(points=self._points(r.filter.must[0].match.value)[:r.limit]) for r in requests]
+
+    def _points(self, user_id):
+        return [p for p in self.points if p.payload.get("user_id", user_id) == user_id]
+
+
+class _Reranker:
+    """Оценка — число после «#» в тексте чанка"""
+
+    def __init__(self):
+        self.seen = []
+
+    def score_pairs(self, queries, documents, doc_hashes=None):
+        self.seen.append(list(documents))
+        return np.array([float(doc.split("#")[1]) for doc in documents], dtype=np.float32)
+
+
+class _Postgres:
+    def __init__(self):
+        self.calls = 0
+
+    def get_documents_by_keys(self, keys):
+        self.calls += 1
+        return [{"content_id": cid, "user_id": user_id} for cid, user_id in keys]
+
+
+def _point(content_id, dense, rerank, **payload):
+    return SimpleNamespace(score=dense, payload={"content_id": content_id, "chunk_text": f"чанк {content_id} #{rerank}", **payload})
+
+
+def _service(points, **kwargs):
+    kwargs.setdefault("group_size", 0)
+    client, reranker = _Client(points), _Reranker()
+    qdrant = SimpleNamespace(client=client, collection_name="chunks")
+    return SearchService(_Embedder(), reranker, qdrant, _Postgres(), **kwargs), client, reranker
+
+
+def test_candidate_budget_scales_with_limit():
+    service, client, _ = _service([], candidates_per_result=20, min_candidates=50, max_candidates=300)
+    assert [service.candidate_budget(n) for n in (1, 5, 100)] == [50, 100, 300]
+    service.search(1, "запрос", limit=5)
+    assert client.limits == [[100]]
+
+
+def test_scores_stay_aligned_with_chunks():
+    # Порядок reranker противоположен dense: оценка должна достаться своему документу
+    points = [_point(i, 1.0 - i / 10, i / 10) for i in range(6)]
+    service, _, _ = _service(points)
+    results = service.search(1, "запрос", limit=3)
+    assert [(r["content_id"], round(r["rerank_score"], 2)) for r in results] == [(5, 0.5), (4, 0.4), (3, 0.3)]
+
+
+def test_dense_gap_and_first_pass_cut_heavy_rerank():
+    points = [_point(i, 0.9 - i / 100, 0.9 - i / 100) for i in range(40)]
+    service, _, heavy = _service(points, dense_max_gap=0.1)
+    service.search(1, "запрос", limit=2)
+    assert len(heavy.seen[0]) == 11  # 0.90 … 0.80
+
+    # Отсечка не оставляет меньше limit кандидатов
+    service, _, heavy = _service(points, dense_max_gap=0.001)
+    service.search(1, "запрос", limit=3)
+    assert len(heavy.seen[0]) == 3
+
+    first_pass = _Reranker()
+    service, _, heavy = _service(points, first_pass_reranker=first_pass, first_pass_per_result=4)
+    results = service.search(1, "запрос", limit=2)
+    assert len(first_pass.seen[0]) == 40 and len(heavy.seen[0]) == 8
+    # Первая ступень сохраняет исходный порядок отобранных кандидатов
+    assert heavy.seen[0] == first_pass.seen[0][:8]
+    assert [r["content_id"] for r in results] == [0, 1]
+
+
+def test_batch_shares_every_stage():
+    points = [_point(i, 1.0 - i / 100, i / 10, user_id=1 + i % 2) for i in range(10)]
+    service, client, reranker = _service(points)
+    searches = [
+        {"user_id": 1, "query": "доставка", "limit": 2},
+        {"user_id": 2, "query": "оплата", "limit": 3, "include_text": True},
+        {"user_id": 3, "query": "возврат", "limit": 2, "include_text": True},
+    ]
+    results = service.search_batch(searches)
+    assert len(service.embedder.calls) == 1 and len(client.limits) == 1
+    assert len(reranker.seen) == 1 and service.postgres_processor.calls == 1
+    assert [[r["content_id"] for r in found] for found in results] == [[8, 6], [9, 7, 5], []]
+    assert all(r["user_id"] == s["user_id"] for s, found in zip(searches, results) for r in found)
+    assert results[1] == service.search(2, "оплата", limit=3, include_text=True)
+    # Без include_text PostgreSQL не нужен
+    assert results[0] == service.search(1, "доставка", limit=2)
+    assert service.postgres_processor.calls == 2
+
+
+def test_hybrid_finds_keyword_match_beyond_dense_budget():
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, Modifier, PointStruct, SparseVector, SparseVectorParams, VectorParams
+    from app.sparse_encoder import SparseEncoder
+
+    encoder = SparseEncoder()
+    client = QdrantClient(location=":memory:")
+    client.create_collection(
+        "chunks",
+        vectors_config={"dense": VectorParams(size=2, distance=Distance.COSINE)},
+        sparse_vectors_config={"sparse": SparseVectorParams(modifier=Modifier.IDF)}
+    )
+    texts = [f"Общий раздел {i} про заказы #0.5" for i in range(60)] + ["Возврат подарочного сертификата #0.9"]
+    client.upsert("chunks", points=[
+        # Dense-вектор нужного чанка — самый далёкий от запроса [1, 0]
+        PointStruct(id=i, vector={"dense": [1.0, i / 10], "sparse": SparseVector(**encoder.encode_document(text))},
+                    payload={"content_id": i, "user_id": 1, "chunk_text": text})
+        for i, text in enumerate(texts)
+    ])
+    qdrant = SimpleNamespace(client=client, collection_name="chunks", sparse_enabled=True)
+
+    class _Documents:
+        def get_documents_by_keys(self, keys):
+            return [{"content_id": cid, "user_id": user_id} for cid, user_id in keys]
+
+    # Только dense: нужный чанк не попадает в 10 кандидатов
+    for fusion, expected in (("dense", 0), ("rrf", 60), ("weighted", 60)):
+        service = SearchService(_Embedder(), _Reranker(), qdrant, _Documents(), candidates_per_result=10,
+                                min_candidates=10, sparse_encoder=encoder, fusion=fusion)
+        assert service.search(1, "сертификаты возврат", limit=1)[0]["content_id"] == expected
+
+
+def test_cached_searches_skip_the_pipeline():
+    from app.search_cache import SearchResultCache
+
+    points = [_point(i, 1.0 - i / 10, i / 10, user_id=1) for i in range(6)]
+    cache = SearchResultCache()
+    service, client, reranker = _service(points, search_cache=cache)
+    first = service.search(1, "запрос", limit=2)
+    assert service.search_batch([{"user_id": 1, "query": "запрос", "limit": 2},
+                                 {"user_id": 1, "query": "другой", "limit": 2}])[0] == first
+    # Второй вызов посчитал только новый запрос
+    assert client.limits == [[50], [50]] and len(reranker.seen) == 2
+
+    cache.bump(1)
+    service.search(1, "запрос", limit=2)
+    assert len(reranker.seen) == 3
+
+
+def _memory_collection(chunks):
+    """Коллекция Qdrant в памяти: chunks — (content_id, dense-вектор, текст)"""
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, PointStruct, VectorParams
+
+    client = QdrantClient(location=":memory:")
+    client.create_collection("chunks", vectors_config={"dense": VectorParams(size=2, distance=Distance.COSINE)})
+    client.upsert("chunks", points=[
+        PointStruct(id=i, vector={"dense": vector},
+                    payload={"content_id": content_id, "user_id": 1, "chunk_text": text, "url": f"/doc/{content_id}",
+                             "header": f"Документ {content_id}", "chunk_start": i * 100, "chunk_end": i * 100 + len(text)})
+        for i, (content_id, vector, text) in enumerate(chunks)
+    ])
+    return SimpleNamespace(client=client, collection_name="chunks", sparse_enabled=False)
+
+
+def test_grouping_keeps_long_document_from_filling_the_budget():
+    # У документа 0 тридцать чанков ближе к запросу, чем любой чанк остальных
+    chunks = [(0, [1.0, i / 1000], f"Раздел {i} #0.5") for i in range(30)]
+    chunks += [(cid, [1.0, 0.5 + cid / 10], f"Доставка курьером {cid} #0.{9 - cid}") for cid in range(1, 4)]
+    qdrant = _memory_collection(chunks)
+
+    def top(group_size):
+        service = SearchService(_Embedder(), _Reranker(), qdrant, _Postgres(), candidates_per_result=10,
+                                min_candidates=10, group_size=group_size)
+        return [r["content_id"] for r in service.search(1, "доставка", limit=3)]
+
+    assert top(0) == [0]
+    assert top(2) == [1, 2, 3]
+
+
+
+def test_grouped_batch_queries_qdrant_concurrently():
+    import threading
+
+    chunks = [(cid, [1.0, cid / 10], f"Доставка {cid} #0.{cid}") for cid in range(1, 5)]
+    qdrant = _memory_collection(chunks)
+    client = qdrant.client
+    # Каждый запрос ждёт остальные: при последовательных вызовах барьер не дождался бы второго
+    barrier = threading.Barrier(3, timeout=5)
+
+    class _Concurrent:
+        def __getattr__(self, name):
+            return getattr(client, name)
+
+        def query_points_groups(self, **kwargs):
+            barrier.wait()
+            return client.query_points_groups(**kwargs)
+
+    qdrant.client = _Concurrent()
+    service = SearchService(_Embedder(), _Reranker(), qdrant, _Postgres(), group_size=2)
+    results = service.search_batch([{"user_id": 1, "query": f"доставка {i}", "limit": 2} for i in range(3)])
+    assert [[r["content_id"] for r in found] for found in results] == [[4, 3]] * 3
+
+def test_results_carry_payload_and_highlighted_snippets():
+    chunks = [(7, [1.0, 0.0], "Курьер привезёт заказ. Доставка бесплатна от 3000 рублей #0.8"),
+              (7, [1.0, 0.1], "Самовывоз: заказ можно забрать в день оформления #0.6"),
+              (7, [1.0, 0.2], "Условия доставки в регионы #0.1")]
+    postgres = _Postgres()
+    service = SearchService(_Embedder(), _Reranker(), _memory_collection(chunks), postgres,
+                            rerank_threshold=0.15, snippets_per_result=2)
+    [result] = service.search(1, "доставка заказ", limit=1)
+    assert postgres.calls == 0
+    assert (result["url"], result["header"], round(result["rerank_score"], 2)) == ("/doc/7", "Документ 7", 0.8)
+    assert [s["text"] for s in result["snippets"]] == [
+        "Курьер привезёт <mark>заказ</mark>. <mark>Доставка</mark> бесплатна от 3000 рублей #0.8",
+        "Самовывоз: <mark>заказ</mark> можно забрать в день оформления #0.6",
+    ]
+    assert result["snippets"][0]["start"] == 0 and "content_text" not in result
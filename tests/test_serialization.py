@@ -0,0 +1,37 @@
+# tests/test_serialization.py
+import io
+import numpy as np
+from app import serialization
+
+
+def test_negotiation():
+    assert serialization.negotiate_format(None) == "json"
+    assert serialization.negotiate_format("application/json", "base64") == "base64"
+    assert serialization.negotiate_format("application/octet-stream") == "octet-stream"
+    assert serialization.negotiate_format("application/x-npy;q=0.9, */*") == "npy"
+
+
+def test_base64_roundtrip():
+    matrix = np.random.rand(3, 8).astype(np.float32)
+    data = serialization.encode_base64(matrix)
+    assert np.array_equal(serialization.decode_base64(data, 8), matrix)
+    half = serialization.decode_base64(serialization.encode_base64(matrix, "float16"), 8, "float16")
+    assert np.allclose(half, matrix, atol=1e-3)
+
+
+def test_octet_stream_roundtrip_with_meta():
+    matrix = np.random.rand(2, 4).astype(np.float32)
+    body = serialization.encode_octet_stream(matrix, meta={"chunks": ["а", "б"], "positions": [[0, 1], [1, 2]]})
+    decoded, meta = serialization.decode_octet_stream(body)
+    assert np.array_equal(decoded, matrix)
+    assert meta["chunks"] == ["а", "б"]
+
+    plain = serialization.encode_octet_stream(matrix)
+    assert len(plain) == serialization.HEADER.size + matrix.nbytes
+    assert serialization.decode_octet_stream(plain)[1] is None
+
+
+def test_npy_is_loadable():
+    matrix = np.random.rand(5, 3).astype(np.float32)
+    loaded = np.load(io.BytesIO(serialization.encode_npy(matrix, "float16")))
+    assert loaded.dtype == np.float16 and loaded.shape == (5, 3)
@@ -0,0 +1,32 @@
+# tests/test_snippets.py
+from app.snippets import highlight_snippet
+from app.sparse_encoder import SparseEncoder
+
+terms = SparseEncoder().terms
+
+
+def test_window_moves_to_matches_and_keeps_words_whole():
+    text = "Общие положения договора. " * 20 + "Возврат товара надлежащего качества возможен в течение 14 дней. " + "Прочее. " * 20
+    snippet = highlight_snippet(text, "возврат в течение 14 дней", terms, max_chars=120)
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert "<mark>Возврат</mark>" in snippet and "<mark>14</mark>" in snippet
+    # Предлог «в» не подсвечивается, слова на краях окна не обрезаны
+    assert "<mark>в</mark>" not in snippet
+    body = snippet.strip("…").replace("<mark>", "").replace("</mark>", "")
+    assert len(body) <= 120 and body in text and text[text.index(body) - 1] == " "
+
+
+def test_short_text_without_matches_is_returned_as_is():
+    assert highlight_snippet("Короткий чанк", "доставка", terms, tags=("[", "]")) == "Короткий чанк"
+    assert highlight_snippet("Доставка завтра", "доставку", terms, tags=("[", "]")) == "[Доставка] завтра"
+
+
+def test_text_without_separators_is_cut_by_characters():
+    assert highlight_snippet("x" * 1000, "zzz", terms, max_chars=300) == "x" * 300 + "…"
+    snippet = highlight_snippet("数据" * 400, "数据", terms, max_chars=300)
+    assert snippet == "数据" * 150 + "…"
+    token = "См. " + "QmFzZTY0" * 100
+    snippet = highlight_snippet(token, "base64", terms, max_chars=100)
+    assert snippet.strip("…") == "См."
+    # Совпадение после длинного токена: обрезанный токен отбрасывается, фрагмент не пустой
+    assert highlight_snippet("QmFzZTY0" * 100 + " конец", "конец", terms, max_chars=100) == "…<mark>конец</mark>"
@@ -0,0 +1,87 @@
+# tests/test_streaming.py
+import json
+import anyio
+import numpy as np
+from app.chunker import iter_semantic_chunks, semantic_chunk
+from app.streaming import stream_chunk_embeddings, stream_embeddings
+
+
+async def _body(data: bytes, piece: int):
+    for i in range(0, len(data), piece):
+        yield data[i:i + piece]
+
+
+def _collect(data: bytes, embed_fn, batch_size=4):
+    async def run():
+        out = []
+        async for part in stream_chunk_embeddings(
+            _body(data, 333),
+            lambda pieces: ((*c, None) for c in iter_semantic_chunks(pieces, 200, 20)),
+            embed_fn,
+            batch_size=batch_size
+        ):
+            out.append(part)
+        return b"".join(out)
+    return [json.loads(line) for line in anyio.run(run).decode("utf-8").splitlines()]
+
+
+def test_chunks_stream_in_order_with_positions():
+    text = "Предложение про доставку. Ещё одно предложение!\n\n" * 100
+    lines = _collect(text.encode("utf-8"), lambda batch: np.array([[len(c[0]), c[1]] for c in batch], dtype=np.float32))
+    expected = semantic_chunk(text, 200, 20)
+    assert [(l["chunk"], l["start"], l["end"]) for l in lines] == expected
+    assert [l["index"] for l in lines] == list(range(len(expected)))
+    assert all(l["embedding"] == [len(l["chunk"]), l["start"]] for l in lines)
+
+
+def test_embedding_error_is_last_line():
+    def failing(batch):
+        raise RuntimeError("boom")
+    lines = _collect(("Текст. " * 200).encode("utf-8"), failing)
+    assert lines == [{"index": 0, "error": "boom"}]
+
+
+def _collect_texts(lines, embed_fn, batch_size=3, piece=7, fmt="json"):
+    data = "".join(line + "\n" for line in lines).encode("utf-8")
+
+    async def run():
+        out = []
+        async for part in stream_embeddings(_body(data, piece), embed_fn, batch_size=batch_size, fmt=fmt):
+            out.append(part)
+        return b"".join(out)
+    return [json.loads(line) for line in anyio.run(run).decode("utf-8").splitlines()]
+
+
+def _lengths(texts):
+    return np.array([[len(t), 0.0] for t in texts], dtype=np.float32)
+
+
+def test_texts_keep_order_and_offsets_across_batches():
+    texts = [f"текст {'x' * i}" for i in range(8)]
+    batches = []
+    lines = _collect_texts([json.dumps(t) for t in texts], lambda batch: batches.append(list(batch)) or _lengths(batch))
+    assert [len(b) for b in batches] == [3, 3, 2]
+    assert [l["index"] for l in lines] == list(range(8))
+    assert [l["embedding"][0] for l in lines] == [len(t) for t in texts]
+
+
+def test_invalid_line_ends_stream_after_embedding_earlier_texts():
+    lines = _collect_texts(['"а"', '{"text": "бб"}', "не json", '"ггг"'], _lengths)
+    assert [l["embedding"][0] for l in lines[:2]] == [1, 2]
+    assert lines[2]["index"] == 2 and "Некорректный JSON" in lines[2]["error"]
+    assert len(lines) == 3
+
+
+def test_embedder_error_mid_stream_is_last_line():
+    calls = []
+
+    def flaky(batch):
+        calls.append(len(batch))
+        if len(calls) == 2:
+            raise RuntimeError("boom")
+        return _lengths(batch)
+
+    lines = _collect_texts([json.dumps(str(i)) for i in range(8)], flaky)
+    assert [l["index"] for l in lines[:-1]] == [0, 1, 2]
+    assert lines[-1] == {"index": 3, "error": "boom"}
+    assert calls == [3, 3]
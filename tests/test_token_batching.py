@@ -0,0 +1,21 @@
+# tests/test_token_batching.py
+from app.token_batching import plan_token_batches
+
+
+def test_batches_cover_all_inputs_and_respect_budget():
+    lengths = [500, 8, 12, 490, 9, 10, 300, 7]
+    batches = plan_token_batches(lengths, max_batch_tokens=1000, max_batch_size=4)
+    assert sorted(i for b in batches for i in b) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) <= 4
+        assert len(batch) == 1 or len(batch) * max(lengths[i] for i in batch) <= 1000
+
+
+def test_short_inputs_are_not_padded_to_long_ones():
+    lengths = [510, 10, 10, 510, 10]
+    batches = plan_token_batches(lengths, max_batch_tokens=1024, max_batch_size=64)
+    assert [sorted(b) for b in batches] == [[1, 2, 4], [0, 3]]
+
+
+def test_oversized_input_gets_its_own_batch():
+    assert plan_token_batches([2000, 5], max_batch_tokens=100, max_batch_size=8) == [[1], [0]]